@@ -0,0 +1,174 @@
+"""Compact on-disk archive of games, read through mmap with random access by game id.
+
+The file is a header, then the packed moves of every game back to back (see `move.pack`),
+and last an index with a fixed size entry per game pointing into the moves:
+
+    header:  magic "PYCA", version, reserved, game count, offset of the index    (24 bytes)
+    moves:   uint16 little-endian packed moves of game 0, game 1, ...
+    index:   moves offset, plies, result (see `pgn.RESULTS`), padding             (16 bytes per game)
+
+Opening an archive only maps the file, and reading game #N touches just its index entry and its moves,
+so only the pages actually read count towards the memory use, however big the archive is.
+
+    python3 archive.py build games.pgn games.arc
+    python3 archive.py show games.arc 1234 --ply 40
+"""
+
+import argparse
+import mmap
+import struct
+import sys
+from array import array
+from typing import BinaryIO, Iterable, List, Optional, Sequence, Tuple
+
+from game import Game
+from pgn import RESULTS, PgnGame, read_games
+from utils import InvalidMoveError
+
+MAGIC: bytes = b"PYCA"
+VERSION: int = 1
+
+_HEADER: struct.Struct = struct.Struct("<4sHHQQ")
+_ENTRY: struct.Struct = struct.Struct("<QIB3x")
+_RESULT_NAMES: List[str] = sorted(RESULTS, key=RESULTS.__getitem__)
+
+
+class ArchiveWriter:
+    """Writes a new archive game by game, so that the moves of the whole archive are never in memory."""
+
+    def __init__(self, path: str) -> None:
+        self.path: str = path
+        self._file: BinaryIO = open(path, "wb")
+        self._file.write(_HEADER.pack(MAGIC, VERSION, 0, 0, 0))
+        self._index: List[bytes] = []
+
+    def __enter__(self) -> 'ArchiveWriter':
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def add(self, moves: Sequence[int], result: str = "*") -> int:
+        """Add a game of packed moves, and return its id in the archive."""
+        data = array("H", moves)
+        if sys.byteorder == "big":
+            data.byteswap()
+        self._index.append(_ENTRY.pack(self._file.tell(), len(data), RESULTS[result]))
+        self._file.write(data.tobytes())
+        return len(self._index) - 1
+
+    def close(self) -> None:
+        if self._file.closed:
+            return
+        index_offset = self._file.tell()
+        self._file.write(b"".join(self._index))
+        self._file.seek(0)
+        self._file.write(_HEADER.pack(MAGIC, VERSION, 0, len(self._index), index_offset))
+        self._file.close()
+
+
+class Archive:
+    """A read-only archive mapped into memory. Use as a context manager, or call `close` when done."""
+
+    def __init__(self, path: str) -> None:
+        self.path: str = path
+        with open(path, "rb") as f:
+            self._mmap: mmap.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view: memoryview = memoryview(self._mmap)
+        magic, version, _, self._count, self._index_offset = _HEADER.unpack_from(self._view)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f"Not a version {VERSION} game archive: {path}")
+
+    def __enter__(self) -> 'Archive':
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def close(self) -> None:
+        """Unmap the file. Views returned by `moves` must have been released before this."""
+        self._view.release()
+        self._mmap.close()
+
+    def moves(self, game_id: int) -> Sequence[int]:
+        """Return the packed moves of the game, as a view into the mapped file without copying them."""
+        offset, plies, _ = self._entry(game_id)
+        data = self._view[offset:offset + 2 * plies]
+        if sys.byteorder == "big":
+            # The file is little-endian, so the moves have to be copied to swap their bytes.
+            moves = array("H", data)
+            moves.byteswap()
+            return moves
+        return data.cast("H")
+
+    def result(self, game_id: int) -> str:
+        return _RESULT_NAMES[self._entry(game_id)[2]]
+
+    def game(self, game_id: int, ply: Optional[int] = None) -> Game:
+        """Return a new Game in the position after `ply` plies of the game, or after all of them by default."""
+        moves = self.moves(game_id)
+        if ply is None:
+            ply = len(moves)
+        if not 0 <= ply <= len(moves):
+            raise IndexError(f"Ply out of range: {ply}")
+        game = Game()
+        game.apply_moves(moves[:ply], validate=False)
+        return game
+
+    def _entry(self, game_id: int) -> Tuple[int, int, int]:
+        if not 0 <= game_id < self._count:
+            raise IndexError(f"Game id out of range: {game_id}")
+        return _ENTRY.unpack_from(self._view, self._index_offset + game_id * _ENTRY.size)
+
+
+def build(path: str, games: Iterable[PgnGame]) -> Tuple[int, int]:
+    """Write the games into a new archive in the path, and return the amount of games written and skipped.
+
+    Games with illegal moves or a custom starting position are skipped.
+    """
+    skipped = 0
+    with ArchiveWriter(path) as writer:
+        for pgn_game in games:
+            try:
+                moves = pgn_game.packed_moves()
+            except InvalidMoveError:
+                skipped += 1
+                continue
+            writer.add(moves, pgn_game.result)
+        return len(writer), skipped
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Build and read game archives.")
+    commands = parser.add_subparsers(dest="command")
+    build_parser = commands.add_parser("build", help="convert a PGN file into an archive")
+    build_parser.add_argument("pgn")
+    build_parser.add_argument("archive")
+    show_parser = commands.add_parser("show", help="print a position of a game in an archive")
+    show_parser.add_argument("archive")
+    show_parser.add_argument("game_id", type=int)
+    show_parser.add_argument("--ply", type=int, help="show the position after this many plies instead of the end")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        with open(args.pgn, encoding="utf-8", errors="replace") as f:
+            written, skipped = build(args.archive, read_games(f))
+        print(f"{written} games written, {skipped} skipped")
+    elif args.command == "show":
+        with Archive(args.archive) as archive:
+            game = archive.game(args.game_id, args.ply)
+            print(game._board)
+            print(f"{len(archive.moves(args.game_id))} plies, result {archive.result(args.game_id)}")
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
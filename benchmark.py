@@ -0,0 +1,196 @@
+"""Microbenchmarks for the chess core, with JSON results and comparison against a saved baseline.
+
+    python benchmark.py --save baseline.json      # Record a baseline.
+    python benchmark.py --compare baseline.json   # Compare a new run against it.
+
+Each scenario is timed `--repeat` times, and every repeat runs the scenario enough times to last
+about 0.2 seconds. The median per-call time is compared against the baseline. A scenario regressed
+when it got slower by more than the threshold, or more than 3 times the measured noise if that is larger.
+The comparison exits with status 1 if any scenario regressed. Only the standard library is used.
+The scenarios that generate moves empty the legal move cache on every call, except the `_cached` one.
+"""
+
+import argparse
+import json
+import pickle
+import platform
+import statistics
+import sys
+import time
+import timeit
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from board import Board
+from game import Game
+from move_cache import LEGAL_MOVES
+from utils import COORDS, InvalidMoveError
+
+# Closed Ruy Lopez, a busy middlegame with all the pieces still on the board.
+MIDDLEGAME: str = ("e2e4 e7e5 g1f3 b8c6 f1b5 a7a6 b5a4 g8f6 e1g1 f8e7 "
+                   "f1e1 b7b5 a4b3 d7d6 c2c3 e8g8 h2h3 c6a5 b3c2 c7c5")
+
+# A fixed 100 ply game of random legal moves, which ends with 20 pieces on the board.
+REPLAY_100: str = (
+    "f2f3 f7f6 a2a4 d7d5 g2g3 d8d6 e2e3 d6c5 f1a6 c8g4 e1e2 c5c4 d2d3 c4e4 a6b7 c7c6 d3e4 e7e6 b7a8 e8d8 "
+    "a8b7 g8e7 b1c3 h7h5 e2d2 f6f5 d1f1 b8d7 e4f5 e7c8 d2e2 f8c5 c3b5 h8e8 f1g2 d7b8 a4a5 g4f5 a1a2 c5b6 "
+    "e3e4 e8h8 a2a1 h8h6 c1g5 d8d7 g5h6 c6b5 a1c1 b6d8 h6g5 d5d4 e2d1 c8b6 g5h6 d8c7 b7a8 b6a4 d1d2 g7g6 "
+    "h6g5 d4d3 c1a1 c7b6 g5f4 b6d8 a1f1 d8g5 f1f2 g5d8 d2e3 h5h4 f4d6 d8f6 e3d2 f5e4 b2b3 f6d8 d6e7 e4b7 "
+    "d2c1 b7c8 c2c4 b5c4 e7a3 a4b6 c1d1 d8f6 a3d6 b6a8 f3f4 g6g5 d6b8 c4c3 g3h4 a8b6 b8d6 f6g7 g2a8 g7d4"
+)
+
+NOISE_FACTOR: float = 3.0
+
+
+def replay(moves: str) -> Game:
+    game = Game()
+    for move in moves.split():
+        player = game.current_player
+        player.move(move[:2], move[2:4])
+        if player.promotion:
+            player.promote("queen")
+        game.next_player()
+    return game
+
+
+def _all_allowed_moves(game: Game, cached: bool = False) -> Callable[[], None]:
+    """Generate the moves of every square. Unless `cached`, the legal move cache is emptied first,
+    so that every call measures the move generation instead of the cache hits of the previous calls.
+    """
+    player = game.current_player
+
+    def run() -> None:
+        if not cached:
+            LEGAL_MOVES.clear()
+        for coord in COORDS:
+            try:
+                for _ in player.allowed_moves(coord):
+                    pass
+            except InvalidMoveError:
+                pass
+    return run
+
+
+def _uncached(func: Callable[[], Any]) -> Callable[[], Any]:
+    """Empty the legal move cache before every call, the same positions are visited on every call otherwise."""
+    def run() -> Any:
+        LEGAL_MOVES.clear()
+        return func()
+    return run
+
+
+def _pickle_game(game: Game) -> Callable[[], None]:
+    def run() -> None:
+        # How `main.py` saved games before the journal, for comparing against `journal.Journal`.
+        pickle.loads(pickle.dumps(game))
+    return run
+
+
+def scenarios() -> Dict[str, Callable[[], Any]]:
+    middlegame = replay(MIDDLEGAME)
+    return {
+        "board_construction": Board,
+        "allowed_moves_opening": _all_allowed_moves(Game()),
+        "allowed_moves_middlegame": _all_allowed_moves(middlegame),
+        "allowed_moves_middlegame_cached": _all_allowed_moves(middlegame, cached=True),
+        "is_checked": middlegame.current_player.is_checked,
+        "replay_100_plies": _uncached(lambda: replay(REPLAY_100)),
+        "apply_moves_100_plies": _uncached(lambda: Game().apply_moves(REPLAY_100.split(), validate=False)),
+        "pickle_game": _pickle_game(middlegame),
+        "board_str": middlegame._board.__str__,
+    }
+
+
+def measure(func: Callable[[], Any], repeat: int, target: float = 0.2) -> Dict[str, float]:
+    timer = timeit.Timer(func)
+    loops, elapsed = timer.autorange()
+    loops = max(1, int(loops * target / max(elapsed, 1e-9)))
+    times = [t / loops for t in timer.repeat(repeat=repeat, number=loops)]
+    return {
+        "median": statistics.median(times),
+        "min": min(times),
+        "stdev": statistics.stdev(times) if len(times) > 1 else 0.0,
+        "loops": loops,
+        "repeat": repeat,
+    }
+
+
+def run(names: Optional[Sequence[str]] = None, repeat: int = 7, verbose: bool = True) -> Dict[str, Any]:
+    results = {}
+    for name, func in scenarios().items():
+        if names and name not in names:
+            continue
+        results[name] = measure(func, repeat)
+        if verbose:
+            print(f"{name:<32} {_format_time(results[name]['median']):>10}  "
+                  f"+/- {results[name]['stdev'] / results[name]['median'] * 100:.1f}%")
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "platform": platform.platform(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": results,
+    }
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any],
+            threshold: float = 0.05) -> Tuple[List[str], bool]:
+    """Return the lines of a comparison report, and whether any scenario regressed."""
+    lines = [f"{'scenario':<32} {'baseline':>10} {'current':>10} {'change':>8}  verdict"]
+    regressed = False
+    for name, new in current["results"].items():
+        old = baseline["results"].get(name)
+        if not old:
+            lines.append(f"{name:<32} {'-':>10} {_format_time(new['median']):>10} {'':>8}  new")
+            continue
+
+        change = new["median"] / old["median"] - 1
+        noise = max(old["stdev"] / old["median"], new["stdev"] / new["median"])
+        limit = max(threshold, NOISE_FACTOR * noise)
+        if change > limit:
+            verdict = "REGRESSION"
+            regressed = True
+        elif change < -limit:
+            verdict = "faster"
+        else:
+            verdict = "same"
+        lines.append(f"{name:<32} {_format_time(old['median']):>10} {_format_time(new['median']):>10} "
+                     f"{change * 100:>+7.1f}%  {verdict} (limit {limit * 100:.1f}%)")
+    return lines, regressed
+
+
+def _format_time(seconds: float) -> str:
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.2f}{unit}"
+    return f"{seconds / 1e-9:.0f}ns"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Chess core microbenchmarks.")
+    parser.add_argument("--save", help="write the results as JSON to this file")
+    parser.add_argument("--compare", help="compare the results against this saved JSON baseline")
+    parser.add_argument("--threshold", type=float, default=0.05, help="smallest slowdown counted as a regression")
+    parser.add_argument("--repeat", type=int, default=7)
+    parser.add_argument("scenarios", nargs="*", help="only run these scenarios")
+    args = parser.parse_args()
+
+    # Pickling the whole Square graph of a Game needs more than the iOS default of 256.
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 1000))
+
+    current = run(args.scenarios, args.repeat)
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(current, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        lines, regressed = compare(baseline, current, args.threshold)
+        print("\n" + "\n".join(lines))
+        if regressed:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
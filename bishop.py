@@ -1,7 +1,8 @@
-from typing import Iterator
+from typing import Iterator, Optional
 
 from move import Move
 from piece import Piece
+from square import Square
 
         
 class Bishop(Piece):
@@ -10,3 +11,6 @@ class Bishop(Piece):
     
     def _all_moves(self) -> Iterator[Move]:
         yield from self._traverse("ne", "se", "sw", "nw")
+    
+    def _move_to(self, to: Square) -> Optional[Move]:
+        return self._slide_to(to, "ne", "se", "sw", "nw")
@@ -1,71 +1,113 @@
-import itertools
-from typing import Dict, Optional
+from typing import Dict, Iterator, List, Optional, Tuple, Union, TYPE_CHECKING
 
 from bishop import Bishop
 from color import Color
 from king import King
 from knight import Knight
 from pawn import Pawn
+from piece import Piece
 from queen import Queen
 from rook import Rook
-from square import Square
-from utils import idx_to_coord
+from square import KNIGHT_JUMPS, RAYS, Square
+from utils import COORDS
+import zobrist
+
+if TYPE_CHECKING:
+    from nnue import Accumulator
+
+# Type codes used in the compact byte encoding of pieces.
+_PIECE_TYPES: Tuple[type, ...] = (Pawn, Knight, Bishop, Rook, Queen, King)
+_TYPE_CODES: Dict[type, int] = {piece_type: code for code, piece_type in enumerate(_PIECE_TYPES, 1)}
+_BLACK_BIT: int = 8
+_MOVED_BIT: int = 16
+_NO_SQUARE: int = 64
+
+
+def encode_piece(piece: Optional[Piece]) -> int:
+    """Encode a piece's type, color and moved flag into one byte, 0 for no piece."""
+    if not piece:
+        return 0
+    code = _TYPE_CODES[piece.__class__]
+    if piece.color == Color.BLACK:
+        code |= _BLACK_BIT
+    if piece.moved:
+        code |= _MOVED_BIT
+    return code
+
+
+def decode_piece(code: int) -> Optional[Piece]:
+    if not code:
+        return None
+    if not 1 <= code & 7 <= len(_PIECE_TYPES) or code & ~(7 | _BLACK_BIT | _MOVED_BIT):
+        raise ValueError(f"Invalid piece code: {code}")
+    piece = _PIECE_TYPES[(code & 7) - 1](Color.BLACK if code & _BLACK_BIT else Color.WHITE)
+    piece.moved = bool(code & _MOVED_BIT)
+    return piece
+
+
+# Pieces of the first rank from a to h, the eighth rank mirrors this.
+_BACK_RANK: Tuple[type, ...] = (Rook, Knight, Bishop, Queen, King, Bishop, Knight, Rook)
 
 
 class Board:
-    """Models a chess board. The board is a dictionary of Squares, which act as graph nodes."""
+    """Models a chess board. The board is a dictionary of Squares, which act as graph nodes.
+    
+    Squares can be looked up both by their coordinate string, e.g. "e4", and by their 0-63 index.
+    Code that handles many moves should use the indices, the strings are for parsing user input.
+    """
     
     _FILES: str = "abcdefgh"
-    _RANKS: str = "87654321"
+    
+    # Length of the `to_bytes` encoding: one byte per square, then the en passant square and color.
+    SNAPSHOT_SIZE: int = 66
+    
+    # Cached `position_key`, cleared whenever a piece is placed or the en passant target changes.
+    # Defined on the class too, so Boards pickled before it existed still load.
+    _key: Optional[int] = None
+    
+    # The feature layers of an evaluation network, `nnue.Accumulator`, which `Square.piece` reports changes to.
+    _accumulator: Optional['Accumulator'] = None
     
     def __init__(self) -> None:
         """Setup the board with all the pieces on the starting positions."""
-        self._squares: Dict[str, Square] = {coord: Square(coord) for coord in map("".join, itertools.product(self._FILES, self._RANKS))}
-        
-        self["a8"].piece = Rook(Color.BLACK)
-        self["b8"].piece = Knight(Color.BLACK)
-        self["c8"].piece = Bishop(Color.BLACK)
-        self["d8"].piece = Queen(Color.BLACK)
-        self["e8"].piece = King(Color.BLACK)
-        self["f8"].piece = Bishop(Color.BLACK)
-        self["g8"].piece = Knight(Color.BLACK)
-        self["h8"].piece = Rook(Color.BLACK)
-        self["a1"].piece = Rook(Color.WHITE)
-        self["b1"].piece = Knight(Color.WHITE)
-        self["c1"].piece = Bishop(Color.WHITE)
-        self["d1"].piece = Queen(Color.WHITE)
-        self["e1"].piece = King(Color.WHITE)
-        self["f1"].piece = Bishop(Color.WHITE)
-        self["g1"].piece = Knight(Color.WHITE)
-        self["h1"].piece = Rook(Color.WHITE)
-        
-        for file in self._FILES:            
-            self[f"{file}7"].piece = Pawn(Color.BLACK)
-            self[f"{file}2"].piece = Pawn(Color.WHITE)
+        self._by_index: List[Square] = [Square(coord, self) for coord in COORDS]
+        self._squares: Dict[Union[str, int], Square] = self._lookup(self._by_index)
+
+        # The Square a Pawn skipped over with a double move, and the color of that Pawn.
+        # Only one Pawn can be captured en passant at a time, so this is all the en passant state of the position.
+        self.en_passant: Optional[Square] = None
+        self.en_passant_color: Optional[Color] = None
         
-        # Set the adjacent Square nodes for each Square.
-        for i in range(8):
-            for j in range(8):
-                sq = self._get(i, j)
-                sq["n"] = self._get(i, j + 1)
-                sq["e"] = self._get(i + 1, j)
-                sq["s"] = self._get(i, j - 1)
-                sq["w"] = self._get(i - 1, j)
-                sq["ne"] = self._get(i + 1, j + 1)
-                sq["se"] = self._get(i + 1, j - 1)
-                sq["sw"] = self._get(i - 1, j - 1)
-                sq["nw"] = self._get(i - 1, j + 1)
+        for file, piece_type in enumerate(_BACK_RANK):
+            self[file].piece = piece_type(Color.WHITE)
+            self[8 + file].piece = Pawn(Color.WHITE)
+            self[48 + file].piece = Pawn(Color.BLACK)
+            self[56 + file].piece = piece_type(Color.BLACK)
     
-    def __iter__(self) -> 'Board':
-        self.__iter = iter(self._squares.values())
-        return self
-        
-    def __next__(self) -> Square:
-        self.__val = next(self.__iter)
-        return self.__val
+    @classmethod
+    def _empty(cls) -> 'Board':
+        """Create a Board with no pieces on it."""
+        board = cls.__new__(cls)
+        board._by_index = [Square._new(coord, index, board) for index, coord in enumerate(COORDS)]
+        board._squares = cls._lookup(board._by_index)
+        board.en_passant = None
+        board.en_passant_color = None
+        return board
+    
+    def __iter__(self) -> Iterator[Square]:
+        # A new iterator every time, so nested loops over the same Board don't interfere with each other.
+        return iter(self._by_index)
+    
+    @staticmethod
+    def _lookup(squares: List[Square]) -> Dict[Union[str, int], Square]:
+        """Map both the coordinates and the indices to the Squares, so `__getitem__` needs no type checks."""
+        rv: Dict[Union[str, int], Square] = dict(zip(COORDS, squares))
+        rv.update(enumerate(squares))
+        return rv
     
-    def __getitem__(self, coord: str) -> Square:
-        return self._squares[coord]
+    def __getitem__(self, key: Union[str, int]) -> Square:
+        """Return the Square at a coordinate like "e4", or at a 0-63 index like 28."""
+        return self._squares[key]
     
     def __repr__(self) -> str:
         return f"{self.__class__.__name__}()"
@@ -74,14 +116,155 @@ class Board:
         file_labels = f"  {' '.join(list(self._FILES))} \n"
         
         rv = file_labels
-        for rank in self._RANKS:
-            rv += rank
-            for file in self._FILES:
-                rv += f" {self[file + rank]}"
-            rv += f" {rank}\n"
+        for rank in range(7, -1, -1):
+            rv += str(rank + 1)
+            for square in self._by_index[8 * rank:8 * rank + 8]:
+                rv += f" {square}"
+            rv += f" {rank + 1}\n"
         rv += file_labels
         return rv
 
-    def _get(self, x: int, y: int) -> Optional[Square]:
-        coord = idx_to_coord(x, y)
-        return self._squares.get(coord)
+    def set_en_passant(self, square: Square, color: Color) -> None:
+        self.en_passant = square
+        self.en_passant_color = color
+        self._key = None
+
+    def clear_en_passant(self) -> None:
+        if self.en_passant:
+            self._key = None
+        self.en_passant = None
+        self.en_passant_color = None
+
+    def copy(self) -> 'Board':
+        """Return an independent copy of the Board.
+
+        Only the pieces and the en passant state are duplicated, the Square topology is shared.
+        This is much cheaper than `copy.deepcopy` or pickling, which both walk the whole Square graph.
+        """
+        board = self._empty()
+        for square, new in zip(self._by_index, board._by_index):
+            piece = square._piece
+            if piece:
+                # Same as `new.piece = piece.copy()`, without going through the property.
+                new._piece = piece = piece.copy()
+                piece.square = new
+        if self.en_passant:
+            board.en_passant = board._by_index[self.en_passant.index]
+            board.en_passant_color = self.en_passant_color
+        board._key = self._key
+        if self._accumulator is not None:
+            board._accumulator = self._accumulator.copy(board)
+        return board
+
+    def to_bytes(self) -> bytes:
+        """Return a compact snapshot of the Board, which `from_bytes` can rebuild in any process."""
+        data = bytearray(self.SNAPSHOT_SIZE)
+        for index, square in enumerate(self._by_index):
+            piece = square._piece
+            if piece is not None:
+                # Same as `encode_piece`, inlined because snapshots are taken of every position in bulk exports.
+                code = _TYPE_CODES[piece.__class__]
+                if piece.color == Color.BLACK:
+                    code |= _BLACK_BIT
+                if piece.moved:
+                    code |= _MOVED_BIT
+                data[index] = code
+        if self.en_passant:
+            data[64] = self.en_passant.index
+            data[65] = 1 if self.en_passant_color == Color.WHITE else 2
+        else:
+            data[64] = _NO_SQUARE
+        return bytes(data)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'Board':
+        if len(data) != cls.SNAPSHOT_SIZE:
+            raise ValueError(f"Invalid Board snapshot length: {len(data)}")
+
+        board = cls._empty()
+        for square, code in zip(board._by_index, data):
+            if code:
+                square.piece = decode_piece(code)
+        if data[64] != _NO_SQUARE:
+            board.en_passant = board._by_index[data[64]]
+            board.en_passant_color = Color.WHITE if data[65] == 1 else Color.BLACK
+        return board
+
+    def is_attacked(self, square: Square, color: Color) -> bool:
+        """Return True if any piece of `color` attacks the square.
+        
+        This looks outwards from the square instead of generating the moves of every piece of `color`.
+        """
+        squares = self._by_index
+        index = square.index
+        
+        for i in KNIGHT_JUMPS[index]:
+            piece = squares[i]._piece
+            if piece and piece.color == color and isinstance(piece, Knight):
+                return True
+        
+        for direction, ray in RAYS[index].items():
+            diagonal = len(direction) == 2
+            for distance, i in enumerate(ray):
+                piece = squares[i]._piece
+                if not piece:
+                    continue
+                if piece.color == color:
+                    # Queen is both a Bishop and a Rook.
+                    if isinstance(piece, Bishop if diagonal else Rook):
+                        return True
+                    if distance == 0:
+                        if isinstance(piece, King):
+                            return True
+                        if isinstance(piece, Pawn) and diagonal and direction[0] != piece.forward:
+                            # The Pawn is diagonally behind the square from its own point of view.
+                            return True
+                break
+        return False
+
+    def position_key(self) -> int:
+        """Return a 64-bit Zobrist key of the piece placement, castling rights and the en passant target.
+        
+        The en passant target is only part of the key when a Pawn can actually capture there.
+        
+        The key is cached until the position changes. Setting `Piece.moved` directly doesn't clear the cache,
+        but every move sets it together with the pieces.
+        """
+        if self._key is not None:
+            return self._key
+        
+        key = 0
+        piece_square = zobrist.PIECE_SQUARE
+        for index, square in enumerate(self._by_index):
+            piece = square._piece
+            if piece:
+                key ^= piece_square[piece.__class__.__name__, piece.color][index]
+
+        # e1 and h1, e1 and a1, e8 and h8, e8 and a8.
+        for i, (king, rook) in enumerate(((4, 7), (4, 0), (60, 63), (60, 56))):
+            if self._unmoved(king, King) and self._unmoved(rook, Rook):
+                key ^= zobrist.CASTLING[i]
+
+        if self.en_passant and self._en_passant_capturable():
+            key ^= zobrist.EN_PASSANT[self.en_passant.index]
+        self._key = key
+        return key
+
+    def _en_passant_capturable(self) -> bool:
+        """Return True if a Pawn stands next to the Pawn that made the double move, ready to capture it en passant.
+
+        Otherwise the target doesn't change what can be played, so transpositions with and without it are the same.
+        """
+        # The Pawn that made the double move is one step past the square it skipped.
+        index = self.en_passant.index + (8 if self.en_passant_color == Color.WHITE else -8)
+        for neighbour in (index - 1, index + 1):
+            if neighbour // 8 != index // 8:
+                continue
+            piece = self._by_index[neighbour]._piece
+            if isinstance(piece, Pawn) and piece.color != self.en_passant_color:
+                return True
+        return False
+
+    def _unmoved(self, index: int, piece_type: type) -> bool:
+        piece = self._by_index[index].piece
+        return isinstance(piece, piece_type) and not piece.moved
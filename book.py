@@ -0,0 +1,245 @@
+"""Opening book of the moves played in a collection of games, read through mmap and looked up by binary search.
+
+The file is a header and then fixed size records sorted by position key and move:
+
+    header:  magic "PYCB", version, reserved, record count              (16 bytes)
+    record:  Zobrist key, packed move, padding, weight, count            (20 bytes each)
+
+The moves are packed like in `move.pack`, but only promotions keep their flag, because the other flags
+follow from the position. So the same move counts as one whether or not its source had the flags.
+
+The weight of a move is two points for every win and a point for every draw of the side that played it,
+and its count is how many times it was played. A lookup reads about log2(records) records of the file,
+so it takes microseconds and only the touched pages of the book are ever loaded into memory.
+
+    python3 book.py build games.pgn book.bin --plies 20
+    python3 book.py probe book.bin e2e4 e7e5
+"""
+
+import argparse
+import heapq
+import mmap
+import os
+import random
+import struct
+import tempfile
+from typing import BinaryIO, Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+from game import Game
+from move import PROMOTION, flag_of, to_uci
+from pgn import read_games
+from utils import InvalidMoveError
+
+MAGIC: bytes = b"PYCB"
+VERSION: int = 2
+
+_HEADER: struct.Struct = struct.Struct("<4sHHQ")
+_RECORD: struct.Struct = struct.Struct("<QHxxII")
+_KEY: struct.Struct = struct.Struct("<Q")
+# The chunks of the builder hold uncapped weights and counts.
+_CHUNK_RECORD: struct.Struct = struct.Struct("<QHQQ")
+_MAX_WEIGHT: int = 0xFFFFFFFF
+_MAX_COUNT: int = 0xFFFFFFFF
+# Points of the side to move for each result, white first.
+_POINTS: Dict[str, Tuple[int, int]] = {"1-0": (2, 0), "0-1": (0, 2), "1/2-1/2": (1, 1), "*": (0, 0)}
+
+
+class BookEntry(NamedTuple):
+    move: int  # Packed move, see `move.pack`.
+    weight: int
+    count: int
+
+
+class OpeningBook:
+    """A read-only opening book mapped into memory. Use as a context manager, or call `close` when done.
+
+    Lookups only read the mapped file, so a book can be shared by any number of threads.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path: str = path
+        with open(path, "rb") as f:
+            self._mmap: mmap.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, _, self._count = _HEADER.unpack_from(self._mmap)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f"Not a version {VERSION} opening book: {path}")
+
+    def __enter__(self) -> 'OpeningBook':
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        """The amount of (position, move) records in the book."""
+        return self._count
+
+    def close(self) -> None:
+        self._mmap.close()
+
+    def entries(self, key: int) -> List[BookEntry]:
+        """Return the book moves of the position with the Zobrist key, see `Game.position_key`."""
+        rv = []
+        i = self._lower_bound(key)
+        while i < self._count:
+            record_key, move, weight, count = _RECORD.unpack_from(self._mmap, _HEADER.size + i * _RECORD.size)
+            if record_key != key:
+                break
+            rv.append(BookEntry(move, weight, count))
+            i += 1
+        return rv
+
+    def choose(self, key: int, rng: Optional[random.Random] = None) -> Optional[int]:
+        """Return a random book move of the position, weighted by how well it has scored, None if there's none."""
+        entries = self.entries(key)
+        if not entries:
+            return None
+        weights = [entry.weight for entry in entries]
+        if not any(weights):
+            # Every game with the position was lost or unfinished, so fall back to how often each move was played.
+            weights = [entry.count for entry in entries]
+        return (rng or random).choices(entries, weights)[0].move
+
+    def move(self, game: Game, rng: Optional[random.Random] = None) -> Optional[int]:
+        """Return a random legal book move of the side to move in the Game, None when the position isn't in the book.
+
+        The move is checked to be legal, so a rare collision of the 64-bit keys can't produce an illegal move.
+        """
+        move = self.choose(game.position_key(), rng)
+        if move is None:
+            return None
+        for legal in game.current_player.legal_move_codes():
+            if _book_move(legal) == move:
+                return legal
+        return None
+
+    def _lower_bound(self, key: int) -> int:
+        """Return the index of the first record with a key of at least `key`."""
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if _KEY.unpack_from(self._mmap, _HEADER.size + mid * _RECORD.size)[0] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+
+def build(path: str, games: Iterable[Tuple[Sequence[int], str]], plies: int = 20, min_count: int = 1,
+          chunk_size: int = 1000000) -> int:
+    """Write a book of the first `plies` moves of the (packed moves, result) games, and return its record count.
+
+    The moves are counted in memory up to `chunk_size` distinct (position, move) pairs at a time,
+    and each full chunk is sorted and written into a temporary file. The chunks are finally merged
+    into the book, so inputs of any size can be built with bounded memory.
+    Moves played fewer than `min_count` times are left out.
+    """
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(path))) as directory:
+        chunks: List[str] = []
+        counts: Dict[Tuple[int, int], List[int]] = {}
+        for moves, result in games:
+            points = _POINTS.get(result, (0, 0))
+            game = Game()
+            for ply, move in enumerate(moves[:plies]):
+                entry = counts.setdefault((game.position_key(), _book_move(move)), [0, 0])
+                entry[0] += points[ply % 2]
+                entry[1] += 1
+                game.apply_moves((move,), validate=False)
+            if len(counts) >= chunk_size:
+                chunks.append(_write_chunk(directory, len(chunks), counts))
+                counts = {}
+        if counts or not chunks:
+            chunks.append(_write_chunk(directory, len(chunks), counts))
+
+        files = [open(chunk, "rb") for chunk in chunks]
+        try:
+            with open(path, "wb") as f:
+                f.write(_HEADER.pack(MAGIC, VERSION, 0, 0))
+                written = 0
+                for key, move, weight, count in _merged(heapq.merge(*(_read_chunk(chunk) for chunk in files))):
+                    if count >= min_count:
+                        f.write(_RECORD.pack(key, move, min(weight, _MAX_WEIGHT), min(count, _MAX_COUNT)))
+                        written += 1
+                f.seek(0)
+                f.write(_HEADER.pack(MAGIC, VERSION, 0, written))
+        finally:
+            for chunk in files:
+                chunk.close()
+    return written
+
+
+def _book_move(move: int) -> int:
+    return move if flag_of(move) >= PROMOTION else move & 0xFFF
+
+
+def _write_chunk(directory: str, number: int, counts: Dict[Tuple[int, int], List[int]]) -> str:
+    """Write the counts sorted by key and move into a new chunk file, and return its path."""
+    path = os.path.join(directory, f"chunk{number}")
+    with open(path, "wb") as f:
+        for (key, move), (weight, count) in sorted(counts.items()):
+            f.write(_CHUNK_RECORD.pack(key, move, weight, count))
+    return path
+
+
+def _read_chunk(f: BinaryIO) -> Iterator[Tuple[int, int, int, int]]:
+    while True:
+        data = f.read(_CHUNK_RECORD.size * 4096)
+        if not data:
+            return
+        yield from _CHUNK_RECORD.iter_unpack(data)
+
+
+def _merged(records: Iterator[Tuple[int, int, int, int]]) -> Iterator[Tuple[int, int, int, int]]:
+    """Sum the weights and counts of the sorted records with the same key and move."""
+    last = None
+    for key, move, weight, count in records:
+        if last is not None and last[0] == key and last[1] == move:
+            last[2] += weight
+            last[3] += count
+            continue
+        if last is not None:
+            yield tuple(last)
+        last = [key, move, weight, count]
+    if last is not None:
+        yield tuple(last)
+
+
+def _pgn_games(path: str) -> Iterator[Tuple[Sequence[int], str]]:
+    with open(path, encoding="utf-8", errors="replace") as f:
+        for pgn_game in read_games(f):
+            try:
+                yield pgn_game.packed_moves(), pgn_game.result
+            except InvalidMoveError:
+                continue
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Build and probe opening books.")
+    commands = parser.add_subparsers(dest="command")
+    build_parser = commands.add_parser("build", help="build a book from the games of a PGN file")
+    build_parser.add_argument("pgn")
+    build_parser.add_argument("book")
+    build_parser.add_argument("--plies", type=int, default=20, help="how many plies of each game go into the book")
+    build_parser.add_argument("--min-count", type=int, default=1, help="leave out moves played fewer times")
+    build_parser.add_argument("--chunk-size", type=int, default=1000000, help="(position, move) pairs per chunk")
+    probe_parser = commands.add_parser("probe", help="list the book moves of the position after the moves")
+    probe_parser.add_argument("book")
+    probe_parser.add_argument("moves", nargs="*", help='moves from the starting position, like "e2e4"')
+    args = parser.parse_args()
+
+    if args.command == "build":
+        written = build(args.book, _pgn_games(args.pgn), args.plies, args.min_count, args.chunk_size)
+        print(f"{written} book moves written")
+    elif args.command == "probe":
+        game = Game()
+        game.apply_moves(args.moves)
+        with OpeningBook(args.book) as book:
+            for entry in sorted(book.entries(game.position_key()), key=lambda entry: -entry.weight):
+                print(f"{to_uci(entry.move)} weight {entry.weight} count {entry.count}")
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Flag-fall detection for many running clocks at once, without polling every clock."""
+
+import asyncio
+import heapq
+import itertools
+import time
+from typing import Callable, List, Optional, Tuple
+
+from player import Player
+
+TimeoutCallback = Callable[[Player], None]
+# Seconds until the deadlines are read again, after reading them failed.
+_RETRY_AFTER: float = 1.0
+
+
+class ClockManager:
+    """Keeps the flag-fall deadline of every watched running clock in a priority queue.
+
+    Call `watch` every time a clock is started, e.g. right after `Game.next_player`. Stopping a clock
+    needs no call: a queued deadline that doesn't match the Player's current `flag_deadline` anymore
+    is just skipped when it comes up. Each move thus costs O(log n), and finding out the timeouts
+    costs nothing until a deadline actually passes.
+    """
+
+    def __init__(self) -> None:
+        self._queue: List[Tuple[float, int, Player, TimeoutCallback]] = []
+        # Breaks ties between equal deadlines, so Players never need to be compared.
+        self._counter = itertools.count()
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def __len__(self) -> int:
+        return len(self._queue)
+
+    def watch(self, player: Player, on_timeout: TimeoutCallback) -> None:
+        """Call `on_timeout(player)` when the currently running clock of the Player runs out."""
+        deadline = player.flag_deadline()
+        if deadline is None:
+            return
+        earliest = self._queue[0][0] if self._queue else None
+        heapq.heappush(self._queue, (deadline, next(self._counter), player, on_timeout))
+        if self._wakeup and (earliest is None or deadline < earliest):
+            self._wakeup.set()
+
+    def next_deadline(self) -> Optional[float]:
+        """Return the `time.monotonic()` time of the next flag-fall, None if no clocks are watched."""
+        while self._queue:
+            deadline, _, player, _ = self._queue[0]
+            if player.flag_deadline() == deadline:
+                return deadline
+            heapq.heappop(self._queue)
+        return None
+
+    def poll(self, now: Optional[float] = None) -> List[Player]:
+        """Fire the callbacks of every clock that has run out by now, and return those Players."""
+        if now is None:
+            now = time.monotonic()
+
+        timed_out = []
+        while self._queue and self._queue[0][0] <= now:
+            deadline, _, player, on_timeout = heapq.heappop(self._queue)
+            if player.flag_deadline() != deadline:
+                # The clock has been stopped or restarted since.
+                continue
+            timed_out.append(player)
+            on_timeout(player)
+        return timed_out
+
+    async def run(self) -> None:
+        """Fire the timeout callbacks as the deadlines pass, until cancelled.
+
+        An exception from a callback, or from reading a clock, is passed to the event loop's exception handler,
+        and the loop goes on. The clocks that ran out after the failed callback are handled on the next round.
+        """
+        loop = asyncio.get_event_loop()
+        self._wakeup = asyncio.Event()
+        try:
+            while True:
+                try:
+                    deadline = self.next_deadline()
+                    timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+                except Exception as e:
+                    _report(loop, e)
+                    timeout = _RETRY_AFTER
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                try:
+                    self.poll()
+                except Exception as e:
+                    _report(loop, e)
+        finally:
+            self._wakeup = None
+
+
+def _report(loop: asyncio.AbstractEventLoop, exception: Exception) -> None:
+    loop.call_exception_handler({"message": "Clock timeout handling failed", "exception": exception})
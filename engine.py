@@ -0,0 +1,185 @@
+"""A simple computer player: iterative deepening alpha-beta search over copies of the Game."""
+
+from typing import Callable, List, Optional, Tuple
+
+from bishop import Bishop
+from book import OpeningBook
+from game import Game
+from knight import Knight
+from move import Move, from_index, promotion_of, to_index
+from pawn import Pawn
+from time_manager import TimeManager
+
+MATE: int = 100000
+# A score this close to MATE means that a forced mate has been found.
+_MATE_THRESHOLD: int = MATE - 1000
+
+
+def _centrality(index: int) -> int:
+    x, y = index % 8, index // 8
+    return int(6 - abs(3.5 - x) - abs(3.5 - y))
+
+
+_CENTRALITY: Tuple[int, ...] = tuple(_centrality(i) for i in range(64))
+
+
+def evaluate(game: Game) -> int:
+    """Return the score of the position in centipawns, from the point of view of the side to move."""
+    player = game.current_player
+    score = 100 * player.value_diff()
+    for square in game.iter_squares():
+        piece = square.piece
+        if not piece:
+            continue
+        if isinstance(piece, Pawn):
+            bonus = 5 * (square.rank - 2 if piece.forward == "n" else 7 - square.rank)
+        elif type(piece) in (Knight, Bishop):
+            bonus = 4 * _CENTRALITY[square.index]
+        else:
+            continue
+        score += bonus if piece.color == player.color else -bonus
+    return score
+
+
+class SearchResult:
+    # Could be Python 3.7 @dataclass
+
+    def __init__(self, move: Optional[int], score: int = 0, depth: int = 0, nodes: int = 0) -> None:
+        self.move: Optional[int] = move  # Packed move, see `move.pack`.
+        self.score: int = score
+        self.depth: int = depth
+        self.nodes: int = nodes
+
+    def __repr__(self) -> str:
+        return (f"{self.__class__.__name__}({self.move!r}, score={self.score}, "
+                f"depth={self.depth}, nodes={self.nodes})")
+
+
+class _SearchAborted(Exception):
+    pass
+
+
+class Engine:
+    def __init__(self, max_depth: int = 64, evaluate: Callable[[Game], int] = evaluate,
+                 book: Optional[OpeningBook] = None) -> None:
+        self.max_depth: int = max_depth
+        self.evaluate: Callable[[Game], int] = evaluate
+        # Positions in the book are played from it without searching.
+        self.book: Optional[OpeningBook] = book
+        self._time_manager: Optional[TimeManager] = None
+        self._nodes: int = 0
+
+    def search(self, game: Game, time_manager: Optional[TimeManager] = None, depth: Optional[int] = None) -> SearchResult:
+        """Search the best move for the side to move, deepening one ply at a time.
+
+        The search stops when `depth` is reached, or when the deadlines of `time_manager` pass.
+        The result then comes from the deepest iteration that was fully searched.
+        """
+        if time_manager is None and depth is None:
+            raise ValueError("Either a time manager or a depth is needed")
+
+        if self.book is not None:
+            move = self.book.move(game)
+            if move is not None:
+                return SearchResult(move)
+
+        moves = list(game.current_player.legal_move_codes())
+        if not moves:
+            return SearchResult(None)
+        if len(moves) == 1:
+            # Nothing to think about.
+            return SearchResult(moves[0])
+
+        if time_manager:
+            time_manager.start(game.current_player)
+        self._time_manager = time_manager
+        self._nodes = 0
+        # The nodes are copies of this private copy of the Game. Evaluating it first lets evaluations that keep
+        # incremental state on the Board, like `nnue.Network.evaluate`, set it up once for all the nodes.
+        game = game.copy()
+        self.evaluate(game)
+
+        best = SearchResult(moves[0])
+        for current_depth in range(1, (depth or self.max_depth) + 1):
+            if current_depth > 1 and time_manager and not time_manager.can_start_iteration():
+                break
+            try:
+                move, score = self._search_root(game, moves, current_depth)
+            except _SearchAborted:
+                break
+            best = SearchResult(move, score, current_depth)
+            # Searching the best move first makes the next iteration cut off more.
+            moves.remove(move)
+            moves.insert(0, move)
+            if abs(score) >= _MATE_THRESHOLD:
+                break
+
+        best.nodes = self._nodes
+        self._time_manager = None
+        return best
+
+    def play(self, game: Game, time_manager: Optional[TimeManager] = None, depth: Optional[int] = None) -> SearchResult:
+        """Search and make the best move for the side to move. The caller still has to call `Game.next_player`."""
+        result = self.search(game, time_manager, depth)
+        if result.move is not None:
+            player = game.current_player
+            player.move(from_index(result.move), to_index(result.move))
+            promotion = promotion_of(result.move)
+            if promotion:
+                player.promote(promotion)
+        return result
+
+    def _search_root(self, game: Game, moves: List[int], depth: int) -> Tuple[int, int]:
+        alpha = -MATE - 1
+        best = moves[0]
+        for move in moves:
+            score = -self._negamax(_child(game, move), depth - 1, -MATE - 1, -alpha, 1)
+            if score > alpha:
+                alpha = score
+                best = move
+        return best, alpha
+
+    def _negamax(self, game: Game, depth: int, alpha: int, beta: int, ply: int) -> int:
+        self._nodes += 1
+        # Reading the clock is cheap next to copying the Game for a node, so it's checked at every node.
+        if self._time_manager and self._time_manager.out_of_time():
+            raise _SearchAborted
+
+        if depth == 0:
+            return self.evaluate(game)
+
+        player = game.current_player
+        moves = player.legal_move_codes()
+        if not moves:
+            # Prefer the quickest mate.
+            return -MATE + ply if player.is_checked() else 0
+
+        for move in _ordered(game, moves):
+            score = -self._negamax(_child(game, move), depth - 1, -beta, -alpha, ply + 1)
+            if score >= beta:
+                return score
+            if score > alpha:
+                alpha = score
+        return alpha
+
+
+def _ordered(game: Game, moves: List[int]) -> List[int]:
+    """Order the moves so that promotions and captures of valuable pieces come first."""
+    def key(move: int) -> int:
+        captured = game._board[to_index(move)].piece
+        return -(captured.value if captured else 0) - (10 if promotion_of(move) == "queen" else 0)
+    return sorted(moves, key=key)
+
+
+def _child(game: Game, move: int) -> Game:
+    """Return a copy of the Game with the already validated move made."""
+    child = game.copy()
+    player = child.current_player
+    player._apply(from_index(move), to_index(move), Move.from_int(move, child._board))
+    promotion = promotion_of(move)
+    if promotion:
+        player.promote(promotion)
+    # The clocks of the copies aren't touched, they only have to stay as they were at the root.
+    child._switch_turn()
+    child.started = True
+    return child
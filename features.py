@@ -0,0 +1,181 @@
+"""Export positions as stacks of 8x8 feature planes in NumPy arrays, e.g. for training evaluation models.
+
+The planes of a position are indexed [rank, file], a1 being [0, 0]:
+
+    0-5     white pawns, knights, bishops, rooks, queens and kings
+    6-11    black pawns, knights, bishops, rooks, queens and kings
+    12      all ones when white is to move
+    13-16   castling rights: white kingside, white queenside, black kingside, black queenside
+    17      the en passant target square of the side to move
+
+Positions are first taken as compact snapshots (see `snapshot`), which only cost a `Board.to_bytes` call,
+and a whole batch of snapshots is then decoded into the planes with a few vectorized NumPy operations,
+instead of visiting the Squares of every position one by one.
+
+    python3 features.py games.arc shards --shard-size 1000000
+
+NumPy is only needed for the export, the rest of the project works without it.
+"""
+
+import argparse
+import os
+from typing import Iterable, Iterator, List, Optional
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from archive import Archive
+from bishop import Bishop
+from board import Board, encode_piece
+from color import Color
+from game import Game
+from king import King
+from knight import Knight
+from pawn import Pawn
+from queen import Queen
+from rook import Rook
+
+PLANES: int = 18
+# A `Board.to_bytes` snapshot and a byte for the side to move, 1 for white.
+SNAPSHOT_SIZE: int = Board.SNAPSHOT_SIZE + 1
+
+# Codes of the unmoved white pieces in the snapshots, in the order of the planes.
+_CODES: List[int] = [encode_piece(piece_type(Color.WHITE)) for piece_type in (Pawn, Knight, Bishop, Rook, Queen, King)]
+_BLACK: int = encode_piece(Pawn(Color.BLACK)) ^ encode_piece(Pawn(Color.WHITE))
+# The type bits of the codes, like in `board.decode_piece`.
+_KIND_MASK: int = 7
+# (plane, King square, Rook square, color bit) of each castling right.
+_CASTLING = (
+    (13, 4, 7, 0),
+    (14, 4, 0, 0),
+    (15, 60, 63, _BLACK),
+    (16, 60, 56, _BLACK),
+)
+
+
+def snapshot(game: Game) -> bytes:
+    """Return the compact snapshot of the position of the Game, which `encode` turns into planes."""
+    return game._board.to_bytes() + (b"\x01" if game.current_player.color == Color.WHITE else b"\x00")
+
+
+def encode(snapshots: bytes, out: Optional['np.ndarray'] = None) -> 'np.ndarray':
+    """Return the planes of the concatenated snapshots, as an (N, PLANES, 8, 8) uint8 array.
+
+    The planes are written into `out` when it's given, e.g. a slice of a preallocated array or of a memmap,
+    which has to be C-contiguous and have room for exactly the N positions.
+    """
+    _require_numpy()
+    data = np.frombuffer(snapshots, dtype=np.uint8).reshape(-1, SNAPSHOT_SIZE)
+    n = len(data)
+    if out is None:
+        out = np.empty((n, PLANES, 8, 8), dtype=np.uint8)
+    elif out.shape != (n, PLANES, 8, 8) or not out.flags.c_contiguous:
+        raise ValueError(f"Expected a C-contiguous output of shape {(n, PLANES, 8, 8)}, got {out.shape}")
+    planes = out.reshape(n, PLANES, 64)
+
+    codes = data[:, :64]
+    kinds = codes & _KIND_MASK
+    black = (codes & _BLACK) != 0
+    for plane, code in enumerate(_CODES):
+        is_kind = kinds == code
+        planes[:, plane] = is_kind & ~black
+        planes[:, plane + 6] = is_kind & black
+
+    white_to_move = data[:, 66] == 1
+    planes[:, 12] = white_to_move[:, None]
+    for plane, king, rook, color in _CASTLING:
+        # Unmoved pieces don't have the moved bit, so their codes are exact.
+        rights = (codes[:, king] == _CODES[5] | color) & (codes[:, rook] == _CODES[3] | color)
+        planes[:, plane] = rights[:, None]
+
+    planes[:, 17] = 0
+    target, moved_by = data[:, 64], data[:, 65]
+    # The target is only for the opponent of the side that made the double move.
+    available = (target < 64) & ((moved_by == 1) != white_to_move)
+    rows = np.nonzero(available)[0]
+    planes[rows, 17, target[rows]] = 1
+    return out
+
+
+def game_snapshots(archive: Archive, game_ids: Optional[Iterable[int]] = None) -> Iterator[bytes]:
+    """Yield the snapshot of every position of the archived games, the starting positions included."""
+    for game_id in range(len(archive)) if game_ids is None else game_ids:
+        game = Game()
+        yield snapshot(game)
+        for move in archive.moves(game_id):
+            game.apply_moves((move,), validate=False)
+            yield snapshot(game)
+
+
+class ShardWriter:
+    """Streams positions into `.npy` shards of `shard_size` positions each, so datasets of any size fit on disk.
+
+    Only the compact snapshots of the current shard are kept in memory, about 70 bytes a position.
+    A full shard is written into a NumPy memmap `batch_size` positions at a time.
+    """
+
+    def __init__(self, directory: str, shard_size: int = 1000000, batch_size: int = 4096) -> None:
+        _require_numpy()
+        self.directory: str = directory
+        self.shard_size: int = shard_size
+        self.batch_size: int = batch_size
+        self.paths: List[str] = []
+        self._snapshots: bytearray = bytearray()
+        os.makedirs(directory, exist_ok=True)
+
+    def __enter__(self) -> 'ShardWriter':
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def add(self, data: bytes) -> None:
+        """Add the snapshot of a position, see `snapshot`."""
+        if len(data) != SNAPSHOT_SIZE:
+            raise ValueError(f"Expected a snapshot of {SNAPSHOT_SIZE} bytes, got {len(data)}")
+        self._snapshots += data
+        if len(self._snapshots) >= self.shard_size * SNAPSHOT_SIZE:
+            self._write_shard()
+
+    def close(self) -> None:
+        """Write the last, possibly smaller shard."""
+        if self._snapshots:
+            self._write_shard()
+
+    def _write_shard(self) -> None:
+        path = os.path.join(self.directory, f"positions-{len(self.paths):05d}.npy")
+        n = len(self._snapshots) // SNAPSHOT_SIZE
+        shard = np.lib.format.open_memmap(path, mode="w+", dtype=np.uint8, shape=(n, PLANES, 8, 8))
+        snapshots = memoryview(self._snapshots)
+        for start in range(0, n, self.batch_size):
+            stop = min(start + self.batch_size, n)
+            encode(snapshots[start * SNAPSHOT_SIZE:stop * SNAPSHOT_SIZE], out=shard[start:stop])
+        snapshots.release()
+        shard.flush()
+        del shard
+        self.paths.append(path)
+        self._snapshots = bytearray()
+
+
+def _require_numpy() -> None:
+    if np is None:
+        raise ImportError("NumPy is needed for the feature export, install it with 'pip install numpy'")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Export the positions of archived games as NumPy feature planes.")
+    parser.add_argument("archive")
+    parser.add_argument("directory", help="where the .npy shards are written")
+    parser.add_argument("--shard-size", type=int, default=1000000, help="positions per shard")
+    args = parser.parse_args()
+
+    with Archive(args.archive) as archive, ShardWriter(args.directory, args.shard_size) as writer:
+        for data in game_snapshots(archive):
+            writer.add(data)
+    print(f"{len(writer.paths)} shards written")
+
+
+if __name__ == "__main__":
+    main()
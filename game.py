@@ -1,24 +1,59 @@
+import struct
 from itertools import cycle
-from typing import Iterator, Optional
+from typing import Iterable, Iterator, Optional, Union
 
-from board import Board
+from board import Board, decode_piece, encode_piece
 from color import Color
+from king import King
+from move import from_index, from_uci, promotion_of, to_index, to_uci
+from pawn import Pawn
 from utils import InvalidMoveError
 from player import Player
+from position import Position
 from square import Square
 from time_control import TimeControl
 
 
 class Game:
+    # Board snapshot, black to move, started, promotion square, has time control, time, increment, delay.
+    _HEADER: struct.Struct = struct.Struct(f"<{Board.SNAPSHOT_SIZE}sBBBBddd")
+    # Time left, clock running, amount of taken pieces, which follow as one byte each.
+    _PLAYER: struct.Struct = struct.Struct("<d?B")
+    _NO_SQUARE: int = 64
+    
+    # The starting position every new Game is copied from, see `_starting_position`.
+    _template: Optional['Game'] = None
+    
     def __init__(self, time_control: Optional[TimeControl] = None) -> None:
-        self._board: Board = Board()
-        self.white: Player = Player(Color.WHITE, self._board, time_control)
-        self.black: Player = Player(Color.BLACK, self._board, time_control)
+        # Copying skips validating the coordinates of the Squares, creating the pieces and counting the material.
+        template = self._starting_position()
+        board = template._board.copy()
+        white = template.white._copy(board)
+        black = template.black._copy(board)
+        white._set_time_control(time_control)
+        black._set_time_control(time_control)
+        self._setup(board, white, black)
+
+    @staticmethod
+    def _starting_position() -> 'Game':
+        if not Game._template:
+            game = Game.__new__(Game)
+            board = Board()
+            game._setup(board, Player(Color.WHITE, board), Player(Color.BLACK, board))
+            Game._template = game
+        return Game._template
+
+    def _setup(self, board: Board, white: Player, black: Player, to_move: Color = Color.WHITE) -> None:
+        self._board: Board = board
+        self.white: Player = white
+        self.black: Player = black
         self.white.opponent = self.black
         self.black.opponent = self.white
         
         self._players: Iterator[Player] = cycle((self.white, self.black))
         self.current_player: Player = next(self._players)
+        if to_move == Color.BLACK:
+            self.current_player = next(self._players)
 
         self.started = False
         
@@ -35,17 +70,160 @@ class Game:
         if self.current_player.time_control:
             self.current_player.stop_clock()
         
-        self.current_player = next(self._players)
+        self._switch_turn()
         
         if self.current_player.time_control:
             self.current_player.start_clock()
         
-        # Clear own en passant ghost markings
-        rank = "3" if self.current_player.color == Color.WHITE else "6"
-        for file in "abcdefgh":
-            self._board[file + rank].ghost = None
-        
         return self.current_player
+
+    def _switch_turn(self) -> None:
+        self.current_player = next(self._players)
+        
+        # Clear own en passant target, the opponent has had their chance to capture it.
+        if self._board.en_passant_color == self.current_player.color:
+            self._board.clear_en_passant()
+
+    def apply_moves(self, moves: Iterable[Union[str, int]], validate: Union[bool, str] = True) -> None:
+        """Make a sequence of moves, given as strings like "e2e4" and "e7e8q" or packed like in `move.pack`.
+        
+        validate=True checks every move like `Player.move` does.
+        validate="end" checks how the pieces move, and only after making each move that its King isn't in check,
+        which is cheaper than trying every move out first.
+        validate=False trusts the moves completely, e.g. when replaying moves that were validated when played.
+        
+        An illegal move raises InvalidMoveError, and the moves before it stay made.
+        With validate="end", a move that left its King in check stays made too.
+        The clocks are switched only once, as if the whole sequence was one move,
+        and not at all when no move was made.
+        """
+        # Compared by identity, so that 1 and 0 aren't taken for True and False.
+        if validate is not True and validate is not False and validate != "end":
+            raise ValueError(f"Invalid validate mode: {validate!r}")
+        if self.current_player.promotion:
+            raise InvalidMoveError
+        
+        time_control = self.current_player.time_control
+        if time_control and self.current_player.read_clock() == 0:
+            raise InvalidMoveError
+        self._apply_moves(moves, validate, bool(time_control))
+
+    def _apply_moves(self, moves: Iterable[Union[str, int]], validate: Union[bool, str], clocks: bool) -> None:
+        applied = False
+        try:
+            for ply, move in enumerate(moves, 1):
+                if isinstance(move, str):
+                    try:
+                        move = from_uci(move)
+                    except ValueError:
+                        raise InvalidMoveError(f"Invalid move {ply}: {move!r}") from None
+                fr, to, promotion = from_index(move), to_index(move), promotion_of(move)
+                
+                player = self.current_player
+                if validate is True:
+                    made = player._legal_move(fr, to, promotion)
+                elif validate:
+                    made = player._possible_move(fr, to, promotion)
+                    if made and (isinstance(made.square.piece, King) or made.castle and not player._keeps_king_safe(fr, made)):
+                        made = None
+                else:
+                    made = player._trusted_move(fr, to)
+                if made is None or (not promotion and isinstance(self._board[fr].piece, Pawn) and not 8 <= to < 56):
+                    raise InvalidMoveError(f"Illegal move {ply}: {to_uci(move)}")
+                
+                if clocks and not applied:
+                    # Stopped only once the first move is known to be legal, so a rejected call costs no time.
+                    player.stop_clock()
+                applied = True
+                player._apply(fr, to, made)
+                if promotion:
+                    player.promote(promotion)
+                self._switch_turn()
+                self.started = True
+                if validate == "end" and player.is_checked():
+                    raise InvalidMoveError(f"Illegal move {ply}: {to_uci(move)} left its King in check")
+        finally:
+            if clocks and applied:
+                self.current_player.start_clock()
+
+    def copy(self) -> 'Game':
+        """Return an independent copy of the Game, e.g. for exploring moves without touching this one."""
+        game = self.__class__.__new__(self.__class__)
+        board = self._board.copy()
+        game._setup(board, self.white._copy(board), self.black._copy(board), self.current_player.color)
+        game.started = self.started
+        return game
+
+    def to_bytes(self) -> bytes:
+        """Return a compact snapshot of the Game, which `from_bytes` can rebuild in any process."""
+        time_control = self.white.time_control
+        data = bytearray(self._HEADER.pack(
+            self._board.to_bytes(),
+            self.current_player.color == Color.BLACK,
+            self.started,
+            self.current_player.promotion.index if self.current_player.promotion else self._NO_SQUARE,
+            time_control is not None,
+            time_control.time if time_control else 0,
+            time_control.increment if time_control else 0,
+            time_control.delay if time_control else 0,
+        ))
+        for player in (self.white, self.black):
+            data += self._PLAYER.pack(player.read_clock() if time_control else 0, player._running, len(player._taken))
+            data += bytes(encode_piece(piece) for piece in player._taken)
+        return bytes(data)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'Game':
+        try:
+            board_data, black_to_move, started, promotion, has_time_control, time, increment, delay = cls._HEADER.unpack_from(data)
+            board = Board.from_bytes(board_data)
+            time_control = TimeControl(time, increment, delay) if has_time_control else None
+            
+            game = cls.__new__(cls)
+            game._setup(board, Player(Color.WHITE, board, time_control), Player(Color.BLACK, board, time_control),
+                        Color.BLACK if black_to_move else Color.WHITE)
+            game.started = bool(started)
+            if promotion != cls._NO_SQUARE:
+                game.current_player.promotion = board[promotion]
+            
+            offset = cls._HEADER.size
+            for player in (game.white, game.black):
+                time_left, running, taken = cls._PLAYER.unpack_from(data, offset)
+                offset += cls._PLAYER.size
+                codes = data[offset:offset + taken]
+                if len(codes) != taken:
+                    raise ValueError("Truncated taken pieces")
+                if 0 in codes:
+                    raise ValueError("Empty taken piece")
+                player._taken = [decode_piece(code) for code in codes]
+                offset += taken
+                if time_control:
+                    player._time_left = time_left
+                    if running:
+                        player.start_clock()
+            if offset != len(data):
+                raise ValueError("Trailing data")
+        except (struct.error, ValueError, KeyError):
+            # KeyError is an invalid promotion square, ValueError an invalid piece code or one of the checks above.
+            raise ValueError("Invalid Game snapshot") from None
+        return game
+
+    def position_key(self) -> int:
+        """Return a 64-bit Zobrist key of the position, including the side to move."""
+        return self.current_player._position_key()
+
+    def position(self) -> Position:
+        """Return an immutable snapshot of the current position, e.g. for analysing it in another thread."""
+        return Position(self._board.to_bytes(), self.current_player.color, self.position_key())
+
+    @classmethod
+    def from_position(cls, position: Position, time_control: Optional[TimeControl] = None) -> 'Game':
+        """Create a new Game, which continues from the position. The taken pieces are not known."""
+        board = Board.from_bytes(position.board)
+        game = cls.__new__(cls)
+        game._setup(board, Player(Color.WHITE, board, time_control), Player(Color.BLACK, board, time_control),
+                    position.to_move)
+        return game
             
     # The two methods under this are used exclusively for the iOS GUI.
     
@@ -0,0 +1,67 @@
+from array import array
+from typing import Iterable, List, Union
+
+from game import Game
+from move import from_uci, to_uci
+from utils import InvalidMoveError
+
+
+class GameRecord:
+    """The moves of a game, with a snapshot of the position every `interval` plies.
+
+    Seeking to any ply restores the nearest earlier snapshot and replays at most `interval - 1` moves from it,
+    instead of replaying the whole game from the start. The snapshots are `Game.to_bytes` strings of
+    about a hundred bytes each, so the memory use grows by one snapshot per `interval` plies.
+    """
+
+    def __init__(self, interval: int = 16) -> None:
+        if interval < 1:
+            raise ValueError(f"Invalid checkpoint interval: {interval}")
+        self.interval: int = interval
+        # Packed moves, see `move.pack`.
+        self._moves: array = array("H")
+        self._checkpoints: List[bytes] = []
+        # The position after the last move, which the next move is made on.
+        self._last: Game = Game()
+        self._checkpoints.append(self._last.to_bytes())
+
+    @classmethod
+    def from_moves(cls, moves: Iterable[Union[str, int]], interval: int = 16, validate: bool = True) -> 'GameRecord':
+        record = cls(interval)
+        for move in moves:
+            record.append(move, validate)
+        return record
+
+    def __len__(self) -> int:
+        """The amount of plies in the record."""
+        return len(self._moves)
+
+    @property
+    def moves(self) -> List[str]:
+        return [to_uci(move) for move in self._moves]
+
+    def append(self, move: Union[str, int], validate: bool = True) -> None:
+        """Add the next move, given like in `Game.apply_moves`. An illegal move raises InvalidMoveError."""
+        if isinstance(move, str):
+            try:
+                move = from_uci(move)
+            except ValueError:
+                raise InvalidMoveError from None
+
+        # A single move is validated before anything is changed, so an illegal move leaves the record as it was.
+        self._last.apply_moves((move,), validate)
+        self._moves.append(move)
+        if len(self._moves) % self.interval == 0:
+            self._checkpoints.append(self._last.to_bytes())
+
+    def seek(self, ply: int) -> Game:
+        """Return a new Game in the position after `ply` plies, 0 being the starting position."""
+        if not 0 <= ply <= len(self._moves):
+            raise IndexError(f"Ply out of range: {ply}")
+        if ply == len(self._moves):
+            return self._last.copy()
+
+        checkpoint = ply // self.interval
+        game = Game.from_bytes(self._checkpoints[checkpoint])
+        game.apply_moves(self._moves[checkpoint * self.interval:ply], validate=False)
+        return game
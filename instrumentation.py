@@ -0,0 +1,120 @@
+"""Opt-in call counters and timers for the move generation hot paths.
+
+    import instrumentation
+    instrumentation.enable()
+    ...
+    print(instrumentation.report())
+
+Enabling replaces the instrumented methods on their classes with counting and timing wrappers,
+and disabling puts the original methods back, so the instrumentation costs nothing when it's disabled.
+Times are inclusive, e.g. the time of `Player.allowed_moves` includes the `Player._opens_check` calls it makes.
+For methods returning iterators, the time spent producing each item is counted too.
+"""
+
+import time
+from contextlib import contextmanager
+from functools import wraps
+from typing import Any, Callable, Dict, Iterator, List, Tuple
+
+from board import Board
+from piece import Piece
+from player import Player
+
+# Class, method name, and whether the method returns an iterator that should be timed as it's consumed.
+_TARGETS: Tuple[Tuple[type, str, bool], ...] = (
+    (Piece, "allowed_moves", True),
+    (Player, "allowed_moves", True),
+    (Player, "is_checked", False),
+    (Player, "_opens_check", False),
+    (Player, "move", False),
+    (Player, "_legal_move", False),
+    (Board, "__iter__", True),
+)
+
+# Label -> [calls, seconds]
+_stats: Dict[str, List[float]] = {}
+_originals: Dict[Tuple[type, str], Callable] = {}
+
+
+def _label(cls: type, name: str) -> str:
+    return f"{cls.__name__}.{name}"
+
+
+def _timed_iter(stat: List[float], iterator: Iterator) -> Iterator:
+    perf_counter = time.perf_counter
+    while True:
+        start = perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            stat[1] += perf_counter() - start
+            return
+        stat[1] += perf_counter() - start
+        yield item
+
+
+def _wrap(func: Callable, stat: List[float], returns_iterator: bool) -> Callable:
+    perf_counter = time.perf_counter
+
+    @wraps(func)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        stat[0] += 1
+        start = perf_counter()
+        try:
+            rv = func(*args, **kwargs)
+        finally:
+            stat[1] += perf_counter() - start
+        if returns_iterator:
+            return _timed_iter(stat, rv)
+        return rv
+    return wrapper
+
+
+def enable() -> None:
+    if _originals:
+        return
+    for cls, name, returns_iterator in _TARGETS:
+        stat = _stats.setdefault(_label(cls, name), [0, 0.0])
+        original = cls.__dict__[name]
+        _originals[cls, name] = original
+        setattr(cls, name, _wrap(original, stat, returns_iterator))
+
+
+def disable() -> None:
+    for (cls, name), original in _originals.items():
+        setattr(cls, name, original)
+    _originals.clear()
+
+
+def is_enabled() -> bool:
+    return bool(_originals)
+
+
+@contextmanager
+def enabled() -> Iterator[None]:
+    enable()
+    try:
+        yield
+    finally:
+        disable()
+
+
+def reset() -> None:
+    for stat in _stats.values():
+        stat[0] = 0
+        stat[1] = 0.0
+
+
+def snapshot() -> Dict[str, Dict[str, float]]:
+    """Return the current counts and total seconds per instrumented method, e.g. for exporting as JSON."""
+    return {label: {"calls": int(calls), "seconds": seconds} for label, (calls, seconds) in _stats.items()}
+
+
+def report() -> str:
+    """Return a text table of the counters, the most time consuming method first."""
+    rows = sorted(snapshot().items(), key=lambda item: item[1]["seconds"], reverse=True)
+    lines = [f"{'method':<22} {'calls':>10} {'total ms':>12} {'per call us':>12}"]
+    for label, stat in rows:
+        per_call = stat["seconds"] / stat["calls"] * 1e6 if stat["calls"] else 0
+        lines.append(f"{label:<22} {stat['calls']:>10} {stat['seconds'] * 1000:>12.2f} {per_call:>12.2f}")
+    return "\n".join(lines)
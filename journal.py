@@ -0,0 +1,203 @@
+"""Append-only journal of a game in progress, which survives crashes between any two moves.
+
+The journal is a sequence of records: a snapshot of the game when the journal was started or last compacted,
+and after it every move, promotion, turn change and clock reading, each written and fsync'd as it happens.
+A record is a kind byte, a payload length, the payload and a CRC32 of them, so a record cut short by a crash
+is noticed and dropped when the journal is resumed.
+"""
+
+import os
+import struct
+import zlib
+from typing import BinaryIO, Iterator, Tuple
+
+from game import Game
+from move import PROMOTION_PIECES, from_index, pack, to_index
+from utils import InvalidMoveError
+
+SNAPSHOT: int = 1
+MOVE: int = 2
+PROMOTE: int = 3
+TURN: int = 4
+CLOCKS: int = 5
+
+_HEAD: struct.Struct = struct.Struct("<BH")
+_CRC: struct.Struct = struct.Struct("<I")
+_MOVE: struct.Struct = struct.Struct("<H")
+_PROMOTE: struct.Struct = struct.Struct("<B")
+_CLOCKS: struct.Struct = struct.Struct("<dd")
+
+
+class Journal:
+    """Writes the journal of one Game. Use `create` for a new journal and `resume` to continue an old one."""
+
+    def __init__(self, path: str, game: Game, file: BinaryIO, compact_every: int = 200) -> None:
+        self.path: str = path
+        self.game: Game = game
+        self.compact_every: int = compact_every
+        self._file: BinaryIO = file
+        # Records written since the last snapshot.
+        self._records: int = 0
+
+    @classmethod
+    def create(cls, path: str, game: Game, compact_every: int = 200) -> 'Journal':
+        """Start a new journal of the Game, replacing any old journal in the path."""
+        return cls(path, game, _write_snapshot(path, game), compact_every)
+
+    @classmethod
+    def resume(cls, path: str, compact_every: int = 200) -> Tuple[Game, 'Journal']:
+        """Rebuild the Game from the journal, and return it with the journal for continuing it.
+
+        The clocks are stopped, and hold the times of the last clock reading in the journal.
+        The moves are replayed with the clocks stopped, so a clock that was about to run out
+        when the journal was written can't run out during the replay.
+        """
+        with open(path, "rb") as f:
+            data = f.read()
+
+        game = None
+        clocks = None
+        last_kind = None
+        records = 0
+        end = 0
+        for kind, payload, end in _records(data):
+            if kind == SNAPSHOT:
+                game = Game.from_bytes(payload)
+                if game.white.time_control:
+                    clocks = game.white._time_left, game.black._time_left
+                    # The clocks are set from the journal when the replay is done.
+                    game.current_player.stop_clock()
+                records = 0
+                continue
+            if game is None:
+                break
+
+            records += 1
+            if kind == MOVE:
+                move, = _MOVE.unpack(payload)
+                _replay_move(game, from_index(move), to_index(move))
+            elif kind == PROMOTE:
+                piece, = _PROMOTE.unpack(payload)
+                game.current_player.promote(PROMOTION_PIECES[piece])
+            elif kind == TURN:
+                _replay_turn(game)
+                clocks = _CLOCKS.unpack(payload)
+            elif kind == CLOCKS:
+                clocks = _CLOCKS.unpack(payload)
+            last_kind = kind
+
+        if game is None:
+            raise ValueError(f"No game in the journal: {path}")
+
+        if last_kind in (MOVE, PROMOTE) and not game.current_player.promotion:
+            # The crash came between the move and the turn change, which always follows it.
+            _replay_turn(game)
+        if clocks:
+            game.white._time_left, game.black._time_left = clocks
+
+        f = open(path, "r+b")
+        # Drop a record cut short by a crash, so that the new records follow the last complete one.
+        f.truncate(end)
+        f.seek(end)
+        journal = cls(path, game, f, compact_every)
+        journal._records = records
+        return game, journal
+
+    def move(self, fr: int, to: int) -> None:
+        self._write(MOVE, _MOVE.pack(pack(fr, to)))
+
+    def promotion(self, piece: str) -> None:
+        self._write(PROMOTE, _PROMOTE.pack(PROMOTION_PIECES.index(piece.lower())))
+
+    def turn(self) -> None:
+        """Record a `Game.next_player` call, and compact the journal if it has grown long."""
+        self._write(TURN, _CLOCKS.pack(*self._clocks()))
+        if self._records >= self.compact_every:
+            self.compact()
+
+    def clocks(self) -> None:
+        """Record the current clock readings, e.g. when the game is paused."""
+        self._write(CLOCKS, _CLOCKS.pack(*self._clocks()))
+
+    def compact(self) -> None:
+        """Replace the journal with a snapshot of the current position."""
+        self._file.close()
+        self._file = _write_snapshot(self.path, self.game)
+        self._records = 0
+
+    def close(self) -> None:
+        self._file.close()
+
+    def _clocks(self) -> Tuple[float, float]:
+        if not self.game.white.time_control:
+            return 0.0, 0.0
+        return self.game.white.read_clock(), self.game.black.read_clock()
+
+    def _write(self, kind: int, payload: bytes) -> None:
+        self._file.write(_record(kind, payload))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._records += 1
+
+
+def _replay_move(game: Game, fr: int, to: int) -> None:
+    """Make the move like `Player.move` does, but without looking at the clock."""
+    player = game.current_player
+    move = None if player.promotion else player._legal_move(fr, to)
+    if move is None:
+        raise InvalidMoveError
+    player._apply(fr, to, move)
+
+
+def _replay_turn(game: Game) -> None:
+    """Change the turn like `Game.next_player` does, but without running the clocks."""
+    if game.current_player.promotion:
+        raise InvalidMoveError
+    game._switch_turn()
+    game.started = True
+
+
+def _record(kind: int, payload: bytes) -> bytes:
+    data = _HEAD.pack(kind, len(payload)) + payload
+    return data + _CRC.pack(zlib.crc32(data))
+
+
+def _records(data: bytes) -> Iterator[Tuple[int, bytes, int]]:
+    """Yield the kind, payload and end offset of each complete and intact record."""
+    offset = 0
+    while offset + _HEAD.size <= len(data):
+        kind, length = _HEAD.unpack_from(data, offset)
+        end = offset + _HEAD.size + length + _CRC.size
+        if end > len(data):
+            return
+        crc, = _CRC.unpack_from(data, end - _CRC.size)
+        if zlib.crc32(data[offset:end - _CRC.size]) != crc:
+            return
+        yield kind, data[offset + _HEAD.size:end - _CRC.size], end
+        offset = end
+
+
+def _write_snapshot(path: str, game: Game) -> BinaryIO:
+    """Atomically replace the file in the path with a snapshot of the Game, and return it opened for appending."""
+    temporary = path + ".tmp"
+    with open(temporary, "wb") as f:
+        f.write(_record(SNAPSHOT, game.to_bytes()))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporary, path)
+    _fsync_directory(path)
+    return open(path, "ab")
+
+
+def _fsync_directory(path: str) -> None:
+    """Make the rename of the file in the path durable too, where the platform allows it."""
+    try:
+        fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
@@ -1,7 +1,8 @@
-from typing import Iterator, List
+from typing import Iterator, List, Optional
 
 from move import Move
 from piece import Piece
+from square import KNIGHT_JUMPS, Square
 
         
 class Knight(Piece):
@@ -19,6 +20,11 @@ class Knight(Piece):
             else:
                 yield Move(sq)      
                 
+    def _move_to(self, to: Square) -> Optional[Move]:
+        if to.index in KNIGHT_JUMPS[self.square.index]:
+            return Move(to)
+        return None
+    
     def _all_moves(self) -> Iterator[Move]:
         yield from self._traverse(
             ["n", "n", "e"],
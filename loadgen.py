@@ -0,0 +1,103 @@
+"""Load generator for `server.py`.
+
+Plays many concurrent random games against the server and reports the move throughput and latencies.
+Every game uses its own connection, asks the server for the legal moves, and submits a random one of them.
+Only the "move" requests are timed.
+
+Usage: `python loadgen.py --games 200 --plies 60`
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from typing import Any, Dict, List
+
+
+class _Client:
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.reader = reader
+        self.writer = writer
+
+    async def request(self, **request: Any) -> Dict[str, Any]:
+        self.writer.write(json.dumps(request).encode() + b"\n")
+        await self.writer.drain()
+        while True:
+            response = json.loads((await self.reader.readline()).decode())
+            if "event" not in response:
+                return response
+
+
+async def play_game(host: str, port: int, plies: int, rng: random.Random, latencies: List[float]) -> int:
+    reader, writer = await asyncio.open_connection(host, port)
+    client = _Client(reader, writer)
+    moves_made = 0
+    try:
+        game_id = (await client.request(op="new"))["game"]
+        for _ in range(plies):
+            legal = await client.request(op="moves", game=game_id)
+            if not legal["moves"]:
+                break
+
+            start = time.perf_counter()
+            response = await client.request(op="move", game=game_id, move=rng.choice(legal["moves"]))
+            latencies.append(time.perf_counter() - start)
+            if not response["ok"]:
+                raise RuntimeError(f"Server rejected a legal move: {response}")
+            moves_made += 1
+        await client.request(op="close", game=game_id)
+    finally:
+        writer.close()
+    return moves_made
+
+
+async def run(host: str, port: int, games: int, plies: int, seed: int) -> Dict[str, float]:
+    rng = random.Random(seed)
+    latencies: List[float] = []
+    start = time.perf_counter()
+    moves = await asyncio.gather(*(play_game(host, port, plies, random.Random(rng.random()), latencies)
+                                   for _ in range(games)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "games": games,
+        "moves": sum(moves),
+        "seconds": elapsed,
+        "moves_per_second": sum(moves) / elapsed,
+        "p50_ms": _percentile(latencies, 50) * 1000,
+        "p99_ms": _percentile(latencies, 99) * 1000,
+        "max_ms": latencies[-1] * 1000 if latencies else 0,
+    }
+
+
+def _percentile(ordered: List[float], percent: float) -> float:
+    if not ordered:
+        return 0
+    index = min(len(ordered) - 1, int(round(percent / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Load generator for the chess server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--games", type=int, default=100, help="concurrent games")
+    parser.add_argument("--plies", type=int, default=60, help="maximum plies per game")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    loop = asyncio.new_event_loop()
+    try:
+        result = loop.run_until_complete(run(args.host, args.port, args.games, args.plies, args.seed))
+    finally:
+        loop.close()
+
+    print(f"{result['games']} games, {result['moves']} moves in {result['seconds']:.2f}s")
+    print(f"{result['moves_per_second']:.1f} moves/s, "
+          f"latency p50 {result['p50_ms']:.2f}ms, p99 {result['p99_ms']:.2f}ms, max {result['max_ms']:.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
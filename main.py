@@ -3,14 +3,13 @@ This game uses 2 Pythonista specific Python modules made for iOS: `scene` and `u
 """
 
 import os
-import pickle
-import sys
 from typing import Iterator, List, Optional
 
 import scene
 
 import game
-from utils import InvalidMoveError
+from journal import Journal
+from utils import coord_to_index, InvalidMoveError
 from gui_components import SquareShape, PieceSprite, SelectedShape, MoveShape, InfoBox, PromoteMenu
 from gui_pause_menu import ContinueMenu, ResumeMenu
 from player import Player
@@ -20,10 +19,7 @@ CLOCK_TIME = 300
 CLOCK_INCREMENT = 0
 CLOCK_DELAY = 0
 
-SAVE_FILE = os.path.join(os.path.dirname(__file__), ".save")
-
-# Default is 256 on iOS, higher limit is needed for pickling.
-sys.setrecursionlimit(1000)
+SAVE_FILE = os.path.join(os.path.dirname(__file__), ".journal")
 
             
 class Main(scene.Scene):
@@ -41,6 +37,8 @@ class Main(scene.Scene):
         self.root: Optional[scene.Node] = None
         self.game: Optional[game.Game] = None
         self.player: Optional[Player] = None
+        # Every move is written to the journal as it's made, so the game can be resumed even after a crash.
+        self.journal: Optional[Journal] = None
 
         super().__init__()
 
@@ -55,7 +53,12 @@ class Main(scene.Scene):
         if os.path.isfile(SAVE_FILE):
             self.show_resume_menu()       
             
-    def new_game(self, loaded: Optional[game.Game] = None) -> None:        
+    def new_game(self, loaded: Optional[game.Game] = None, journal: Optional[Journal] = None) -> None:        
+        if self.journal:
+            self.journal.close()
+        # A new game's journal is only created on its first move, so that a saved game can still be resumed.
+        self.journal = journal
+        
         if loaded is None:            
             self.game = game.Game(TimeControl(CLOCK_TIME, CLOCK_INCREMENT, CLOCK_DELAY))
         else:
@@ -74,20 +77,25 @@ class Main(scene.Scene):
         self.render_pieces()
     
     def save_game(self) -> None:
-        try:
-            with open(SAVE_FILE, "wb") as f:
-                pickle.dump(self.game, f)
-        except AttributeError:
-            pass
+        # The moves are already in the journal, only the clocks have changed since the last move.
+        if self.journal:
+            self.journal.clocks()
     
     def load_save(self) -> None:
         try:
-            with open(SAVE_FILE, "rb") as f:
-                loaded = pickle.load(f)
-                os.remove(SAVE_FILE)
-        except FileNotFoundError:
-            loaded = None
-        self.new_game(loaded=loaded)
+            loaded, journal = Journal.resume(SAVE_FILE)
+        except (FileNotFoundError, ValueError, InvalidMoveError):
+            loaded, journal = None, None
+        self.new_game(loaded=loaded, journal=journal)
+    
+    def _journal(self) -> Journal:
+        if not self.journal:
+            self.journal = Journal.create(SAVE_FILE, self.game)
+        return self.journal
+    
+    def next_turn(self) -> None:
+        self.player = self.game.next_player()
+        self._journal().turn()
 
     def render_pieces(self) -> None:
         self.clear_allowed_moves()
@@ -128,7 +136,8 @@ class Main(scene.Scene):
             return
 
         self.player.promote(node.piece_name)
-        self.player = self.game.next_player()
+        self._journal().promotion(node.piece_name)
+        self.next_turn()
 
         del self.promote_menu
         self.promote_menu = None
@@ -169,15 +178,20 @@ class Main(scene.Scene):
             self.render_allowed_moves()
         else:
             try:
+                if not self.player.is_legal(self.fr, pos):
+                    raise InvalidMoveError
+                # A new journal starts from the position before its first move.
+                journal = self._journal()
                 self.player.move(self.fr, pos)
             except InvalidMoveError:
                 pass
             else:
+                journal.move(coord_to_index(self.fr), coord_to_index(pos))
                 self.render_pieces()
                 if self.player.promotion:
                     self.promote_menu = PromoteMenu(self, self.player.promotion, node)
                 else:
-                    self.player = self.game.next_player()
+                    self.next_turn()
     
     def show_resume_menu(self) -> None:
         self.pause_menu = ResumeMenu()
@@ -1,6 +1,23 @@
-from typing import Optional
+import re
+from typing import Optional, Pattern, Tuple, TYPE_CHECKING
 
 from square import Square
+from utils import COORDS, coord_to_index
+
+if TYPE_CHECKING:
+    from board import Board
+
+# Moves can also be packed into 16-bit integers, e.g. to store them in `array("H")` buffers:
+# bits 0-5 are the index of the from Square, bits 6-11 the index of the to Square, and bits 12-15 the flag.
+NORMAL: int = 0
+PAWN_DOUBLE_MOVE: int = 1
+CASTLE: int = 2
+ENPASSANT: int = 3
+# Flag of a promotion is PROMOTION + the index of the piece in PROMOTION_PIECES.
+PROMOTION: int = 4
+PROMOTION_PIECES: Tuple[str, ...] = ("knight", "bishop", "rook", "queen")
+
+_UCI_PATTERN: Pattern = re.compile(r"^([a-h][1-8])([a-h][1-8])([nbrq]?)$")
 
 
 class Move:
@@ -17,3 +34,75 @@ class Move:
         return (f"{self.__class__.__name__}({self.square!r}, "
                 f"castle={self.castle}, enpassant={self.enpassant}, "
                 f"pawn_double_move={self.pawn_double_move})")
+
+    def to_int(self, fr: Square, promotion: Optional[str] = None) -> int:
+        """Pack the Move made from `fr` into an integer, see `pack`."""
+        if promotion:
+            flag = PROMOTION + PROMOTION_PIECES.index(promotion)
+        elif self.castle:
+            flag = CASTLE
+        elif self.enpassant:
+            flag = ENPASSANT
+        elif self.pawn_double_move:
+            flag = PAWN_DOUBLE_MOVE
+        else:
+            flag = NORMAL
+        return pack(fr.index, self.square.index, flag)
+
+    @classmethod
+    def from_int(cls, move: int, board: 'Board') -> 'Move':
+        """Unpack the Move from an integer. The from Square is given by `from_index`."""
+        flag = move >> 12
+        return cls(
+            board[to_index(move)],
+            castle=flag == CASTLE,
+            enpassant=flag == ENPASSANT,
+            pawn_double_move=flag == PAWN_DOUBLE_MOVE,
+        )
+
+
+def pack(fr: int, to: int, flag: int = NORMAL) -> int:
+    return fr | to << 6 | flag << 12
+
+
+def from_index(move: int) -> int:
+    return move & 63
+
+
+def to_index(move: int) -> int:
+    return move >> 6 & 63
+
+
+def flag_of(move: int) -> int:
+    return move >> 12
+
+
+def promotion_of(move: int) -> Optional[str]:
+    flag = move >> 12
+    if flag >= PROMOTION:
+        return PROMOTION_PIECES[flag - PROMOTION]
+    return None
+
+
+def to_uci(move: int) -> str:
+    """Return the move as a string like "e2e4", or "e7e8q" for promotions."""
+    rv = COORDS[move & 63] + COORDS[move >> 6 & 63]
+    promotion = promotion_of(move)
+    if promotion:
+        rv += "n" if promotion == "knight" else promotion[0]
+    return rv
+
+
+def from_uci(text: str) -> int:
+    """Parse a string like "e2e4" or "e7e8q" into a packed move.
+    
+    The string doesn't tell whether the move is e.g. castling, so those flags are not set.
+    The fully flagged move can be found with `Player.legal_move_code`.
+    """
+    match = re.match(_UCI_PATTERN, text.lower())
+    if not match:
+        raise ValueError(f"Invalid move: '{text}'")
+    
+    fr, to, promotion = match.groups()
+    flag = PROMOTION + "nbrq".index(promotion) if promotion else NORMAL
+    return pack(coord_to_index(fr), coord_to_index(to), flag)
@@ -0,0 +1,63 @@
+"""Bounded least recently used cache of legal moves, shared by every Game in the process."""
+
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional
+
+
+class MoveCache:
+    """Maps position keys to packed legal moves, see `move.pack`.
+
+    The keys include the Zobrist key of the position and the side to move, so any change to the position,
+    e.g. by `Player.move`, `Player.promote` or `Game.next_player`, simply leads to a different key
+    and nothing ever has to be invalidated. The cache is safe to use from many threads.
+    """
+
+    def __init__(self, maxsize: int = 4096) -> None:
+        self.maxsize: int = maxsize
+        self.hits: int = 0
+        self.misses: int = 0
+        self._entries: 'OrderedDict[Hashable, array]' = OrderedDict()
+        self._lock: threading.Lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Optional[array]:
+        with self._lock:
+            try:
+                moves = self._entries[key]
+            except KeyError:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return moves
+
+    def put(self, key: Hashable, moves: array) -> None:
+        """Store the moves, which must not be modified afterwards."""
+        with self._lock:
+            self._entries[key] = moves
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+        }
+
+
+LEGAL_MOVES: MoveCache = MoveCache()
@@ -0,0 +1,229 @@
+"""An NNUE style evaluation: a piece-square feature layer updated incrementally, and a small output layer.
+
+Each side has its own perspective of the position, with 768 binary features:
+
+    feature = (6 * relative color + piece type) * 64 + relative square
+
+where the relative color is 0 for the pieces of the perspective's side and 1 for the opponent's,
+the piece types are pawn, knight, bishop, rook, queen and king, and black's squares are mirrored vertically.
+The feature layer of a perspective is the sum of the int16 weight rows of its active features and a bias,
+so it's kept up to date by adding and subtracting the rows of the pieces that change squares.
+
+The output is the dot product of the clipped feature layers, the side to move's first, with the output weights,
+plus the output bias, floor divided by the scale into centipawns from the point of view of the side to move.
+So evaluating a position costs the same small amount of work no matter how many pieces there are on the board.
+
+The weights are loaded from a `.npz` file with the arrays:
+
+    feature_weights   (768, H) int16
+    feature_bias      (H,) int16
+    output_weights    (2 * H,) int16
+    output_bias       () int32
+    scale             () int32
+
+The sums are wrapping int16 arithmetic like in the usual NNUE implementations, so the weights have to be trained
+small enough for the feature layers not to overflow.
+
+    python3 nnue.py weights.npz e2e4 e7e5
+
+NumPy is only needed for this evaluation, the rest of the project works without it.
+"""
+
+import argparse
+from typing import Dict, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from bishop import Bishop
+from board import Board
+from color import Color
+from game import Game
+from king import King
+from knight import Knight
+from pawn import Pawn
+from piece import Piece
+from queen import Queen
+from rook import Rook
+
+FEATURES: int = 768
+# Upper bound of the clipped ReLU between the feature layer and the output layer.
+CLIP: int = 127
+
+_ARRAYS: Tuple[str, ...] = ("feature_weights", "feature_bias", "output_weights", "output_bias", "scale")
+# Feature planes of the pieces from white's perspective.
+_PLANES: Dict[Tuple[type, Color], int] = {
+    (piece_type, color): 6 * side + kind
+    for side, color in enumerate((Color.WHITE, Color.BLACK))
+    for kind, piece_type in enumerate((Pawn, Knight, Bishop, Rook, Queen, King))
+}
+
+
+def _plane(piece: Optional[Piece]) -> int:
+    """The feature plane of the piece from white's perspective, -1 for no piece."""
+    return -1 if piece is None else _PLANES[piece.__class__, piece.color]
+
+
+class Network:
+    """The weights of an evaluation network. Use `evaluate` as the evaluation function of an `engine.Engine`."""
+
+    def __init__(self, feature_weights: 'np.ndarray', feature_bias: 'np.ndarray', output_weights: 'np.ndarray',
+                 output_bias: int, scale: int) -> None:
+        _require_numpy()
+        feature_weights = _integers("feature_weights", feature_weights, np.int16)
+        feature_bias = _integers("feature_bias", feature_bias, np.int16)
+        output_weights = _integers("output_weights", output_weights, np.int16)
+        hidden = len(feature_bias)
+        if feature_weights.shape != (FEATURES, hidden) or output_weights.shape != (2 * hidden,):
+            raise ValueError(f"Expected weights of the shapes {(FEATURES, hidden)} and {(2 * hidden,)}, "
+                             f"got {feature_weights.shape} and {output_weights.shape}")
+        if int(scale) <= 0:
+            raise ValueError(f"The scale has to be positive, got {scale}")
+
+        self.hidden: int = hidden
+        self.feature_weights: np.ndarray = feature_weights
+        self.feature_bias: np.ndarray = feature_bias
+        self.output_weights: np.ndarray = output_weights
+        self.output_bias: int = int(output_bias)
+        self.scale: int = int(scale)
+
+        # The rows of both perspectives of each piece on each square, indexed [plane, square, perspective],
+        # so a piece is added to or removed from both feature layers with a single operation.
+        planes = feature_weights.reshape(12, 64, hidden)
+        black = planes[[6, 7, 8, 9, 10, 11, 0, 1, 2, 3, 4, 5]][:, np.arange(64) ^ 56]
+        self._rows: np.ndarray = np.ascontiguousarray(np.stack((planes, black), axis=2))
+        self._bias: np.ndarray = np.stack((feature_bias, feature_bias))
+        # The output weights of the (white, black) feature layers, for white and for black to move.
+        output = output_weights.astype(np.int32).reshape(2, hidden)
+        self._output: Dict[Color, np.ndarray] = {Color.WHITE: output, Color.BLACK: output[::-1].copy()}
+
+    @classmethod
+    def load(cls, path: str) -> 'Network':
+        _require_numpy()
+        with np.load(path) as data:
+            missing = [name for name in _ARRAYS if name not in data]
+            if missing:
+                raise ValueError(f"Missing arrays in {path}: {', '.join(missing)}")
+            return cls(*(data[name] for name in _ARRAYS))
+
+    def save(self, path: str) -> None:
+        np.savez(path, feature_weights=self.feature_weights, feature_bias=self.feature_bias,
+                 output_weights=self.output_weights, output_bias=np.int32(self.output_bias),
+                 scale=np.int32(self.scale))
+
+    def attach(self, board: Board) -> 'Accumulator':
+        """Compute the feature layers of the Board, and keep them up to date as its pieces change."""
+        accumulator = Accumulator(self, board)
+        board._accumulator = accumulator
+        return accumulator
+
+    def evaluate(self, game: Game) -> int:
+        """Return the score of the position in centipawns, from the point of view of the side to move.
+
+        The network is attached to the Board of the Game on the first call, see `attach`, and copies of the Game
+        inherit the feature layers. `engine.Engine` evaluates the root of its search first, so a search computes
+        them only once.
+        """
+        accumulator = game._board._accumulator
+        if accumulator is None or accumulator.network is not self:
+            accumulator = self.attach(game._board)
+        clipped = np.clip(accumulator.values, 0, CLIP)
+        return (int((clipped * self._output[game.current_player.color]).sum()) + self.output_bias) // self.scale
+
+    def evaluate_batch(self, planes: 'np.ndarray') -> 'np.ndarray':
+        """Return the scores of a batch of positions, given as the (N, 18, 8, 8) planes of `features.encode`.
+
+        The feature layers of the whole batch are computed with one matrix product per perspective,
+        and the scores are the same as `evaluate` would give one position at a time.
+        """
+        n = len(planes)
+        white = planes[:, :12].reshape(n, FEATURES)
+        # Black's own pieces come first, on vertically mirrored squares.
+        black = planes[:, [6, 7, 8, 9, 10, 11, 0, 1, 2, 3, 4, 5], ::-1].reshape(n, FEATURES)
+        weights = self.feature_weights.astype(np.float32)
+        layers = []
+        for active in (white, black):
+            # The sums are small integers, so they're exact in float32, and the product can use BLAS.
+            # The wrap to int16 matches the wrapping of the incremental updates.
+            values = (active.astype(np.float32) @ weights).astype(np.int32).astype(np.int16) + self.feature_bias
+            layers.append(np.clip(values, 0, CLIP).astype(np.int64))
+        white_to_move = planes[:, 12, 0, 0] == 1
+        own = np.where(white_to_move[:, None], layers[0], layers[1])
+        other = np.where(white_to_move[:, None], layers[1], layers[0])
+        output = self.output_weights.astype(np.int64)
+        scores = own @ output[:self.hidden] + other @ output[self.hidden:] + self.output_bias
+        return scores // self.scale
+
+
+class Accumulator:
+    """The feature layers of both perspectives of a Board, as a (2, H) int16 array with white's first.
+
+    Every piece placed on the Board is reported by `Square.piece` into `changed`, which maps
+    the changed squares to their pieces before the first change. The rows of the pieces are subtracted
+    and added when `values` is next read, so a move that's made and taken back, like when checking
+    whether a move would leave the King in check, cancels out without touching the feature layers.
+    """
+
+    def __init__(self, network: Network, board: Board, values: Optional['np.ndarray'] = None) -> None:
+        self.network: Network = network
+        self.board: Board = board
+        self.changed: Dict[int, Optional[Piece]] = {}
+        if values is None:
+            values = network._bias.copy()
+            rows = network._rows
+            for index, square in enumerate(board._by_index):
+                if square._piece is not None:
+                    values += rows[_plane(square._piece), index]
+        self._values: np.ndarray = values
+
+    @property
+    def values(self) -> 'np.ndarray':
+        if self.changed:
+            rows = self.network._rows
+            squares = self.board._by_index
+            for index, old in self.changed.items():
+                before, after = _plane(old), _plane(squares[index]._piece)
+                if before != after:
+                    if before >= 0:
+                        self._values -= rows[before, index]
+                    if after >= 0:
+                        self._values += rows[after, index]
+            self.changed.clear()
+        return self._values
+
+    def copy(self, board: Board) -> 'Accumulator':
+        """Return the feature layers for a copy of the Board, see `Board.copy`."""
+        return self.__class__(self.network, board, self.values.copy())
+
+
+def _integers(name: str, array: 'np.ndarray', dtype: type) -> 'np.ndarray':
+    array = np.asarray(array)
+    if not np.issubdtype(array.dtype, np.integer):
+        raise ValueError(f"Expected integer {name}, got {array.dtype}")
+    info = np.iinfo(dtype)
+    if array.size and (array.min() < info.min or array.max() > info.max):
+        raise ValueError(f"The {name} don't fit into {np.dtype(dtype).name}")
+    return array.astype(dtype)
+
+
+def _require_numpy() -> None:
+    if np is None:
+        raise ImportError("NumPy is needed for the network evaluation, install it with 'pip install numpy'")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Evaluate a position with a network.")
+    parser.add_argument("weights", help="the .npz file of the network")
+    parser.add_argument("moves", nargs="*", help='moves from the starting position, like "e2e4"')
+    args = parser.parse_args()
+
+    network = Network.load(args.weights)
+    game = Game()
+    game.apply_moves(args.moves)
+    print(f"{network.evaluate(game)} centipawns for {game.current_player.color.name.lower()}")
+
+
+if __name__ == "__main__":
+    main()
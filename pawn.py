@@ -25,11 +25,12 @@ class Pawn(Piece):
                 yield Move(self.square[fwd][fwd], pawn_double_move=True)
             
         # Capturing
+        board = self.square.board
         for direction in ("e", "w"):
             sq = self.square[fwd + direction]
             if sq and sq.piece:
                 # Capture normally
                 yield Move(sq)
-            elif sq and sq.ghost and sq.ghost != self.color:
+            elif sq and sq is board.en_passant and board.en_passant_color != self.color:
                 # Capture en passant
                 yield Move(sq, enpassant=True)
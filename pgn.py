@@ -0,0 +1,134 @@
+"""Reading games in the Portable Game Notation, e.g. for building the archive, position index and opening book."""
+
+import re
+from array import array
+from typing import Dict, Iterable, Iterator, List, Pattern
+
+from game import Game
+from move import PROMOTION, PROMOTION_PIECES, flag_of, from_index, to_index
+from player import Player
+from utils import COORDS, InvalidMoveError
+
+RESULTS: Dict[str, int] = {"*": 0, "1-0": 1, "0-1": 2, "1/2-1/2": 3}
+
+_TAG: Pattern = re.compile(r'^\[(\w+)\s+"(.*)"\]\s*$')
+_SAN: Pattern = re.compile(r"^([NBRQK])?([a-h])?([1-8])?x?([a-h][1-8])(?:=?([NBRQ]))?$")
+_PIECE_LETTERS: Dict[str, str] = {"N": "Knight", "B": "Bishop", "R": "Rook", "Q": "Queen", "K": "King"}
+# Numeric annotation glyphs and move numbers, which are skipped like comments and variations.
+_NOISE: Pattern = re.compile(r"\$\d+|\d+\.(?:\.\.)?")
+
+
+class PgnGame:
+    # Could be Python 3.7 @dataclass
+
+    def __init__(self, headers: Dict[str, str], moves: List[str], result: str) -> None:
+        self.headers: Dict[str, str] = headers
+        self.moves: List[str] = moves  # In standard algebraic notation, e.g. "Nf3".
+        self.result: str = result
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({self.headers!r}, <{len(self.moves)} moves>, {self.result!r})"
+
+    def packed_moves(self) -> array:
+        """Return the moves packed into an `array("H")`, see `move.pack`. Illegal moves raise InvalidMoveError."""
+        if self.headers.get("SetUp") == "1" or "FEN" in self.headers:
+            # Games from a custom starting position are not supported.
+            raise InvalidMoveError("Game doesn't start from the standard position")
+        game = Game()
+        rv = array("H")
+        for san in self.moves:
+            move = san_to_move(game.current_player, san)
+            game.apply_moves((move,), validate=False)
+            rv.append(move)
+        return rv
+
+
+def read_games(lines: Iterable[str]) -> Iterator[PgnGame]:
+    """Yield the games of a PGN file one by one, so that files of any size can be read."""
+    headers: Dict[str, str] = {}
+    movetext: List[str] = []
+    for line in lines:
+        line = line.strip()
+        match = re.match(_TAG, line)
+        if match:
+            if movetext:
+                yield _parse(headers, movetext)
+                headers, movetext = {}, []
+            headers[match.group(1)] = match.group(2)
+        elif not line:
+            # The movetext of a game ends in an empty line.
+            if movetext:
+                yield _parse(headers, movetext)
+                headers, movetext = {}, []
+        elif not line.startswith("%"):
+            # Drop a rest of line comment.
+            movetext.append(line.split(";", 1)[0])
+    if headers or movetext:
+        yield _parse(headers, movetext)
+
+
+def _parse(headers: Dict[str, str], movetext: List[str]) -> PgnGame:
+    text = _strip_variations(" ".join(movetext))
+    result = headers.get("Result", "*")
+    moves = []
+    for token in re.sub(_NOISE, " ", text).split():
+        if token in RESULTS:
+            result = token
+        else:
+            moves.append(token)
+    return PgnGame(headers, moves, result)
+
+
+def _strip_variations(text: str) -> str:
+    rv = []
+    depth = 0
+    for part in re.split(r"([()])", re.sub(r"\{[^}]*\}", " ", text)):
+        if part == "(":
+            depth += 1
+        elif part == ")":
+            depth = max(0, depth - 1)
+        elif not depth:
+            rv.append(part)
+    return " ".join(rv)
+
+
+def san_to_move(player: Player, san: str) -> int:
+    """Return the packed legal move of the Player, which a move like "Nbd2", "exd8=Q" or "O-O" stands for."""
+    san = san.rstrip("+#!?")
+    moves = player.legal_move_codes()
+    board = player._board
+
+    if san in ("O-O", "0-0", "O-O-O", "0-0-0"):
+        king = player._king.square.index
+        step = 2 if len(san) == 3 else -2
+        for move in moves:
+            if from_index(move) == king and to_index(move) == king + step:
+                return move
+        raise InvalidMoveError(f"Illegal move: {san!r}")
+
+    match = re.match(_SAN, san)
+    if not match:
+        raise InvalidMoveError(f"Invalid move: {san!r}")
+    letter, file, rank, to, promotion = match.groups()
+    name = _PIECE_LETTERS[letter] if letter else "Pawn"
+    promotion_flag = PROMOTION + PROMOTION_PIECES.index(_PIECE_LETTERS[promotion].lower()) if promotion else None
+
+    found = None
+    for move in moves:
+        fr = COORDS[from_index(move)]
+        if COORDS[to_index(move)] != to or (file and fr[0] != file) or (rank and fr[1] != rank):
+            continue
+        if board[fr].piece.__class__.__name__ != name:
+            continue
+        if flag_of(move) >= PROMOTION:
+            # A promotion without the piece letter is taken to be to a Queen.
+            if flag_of(move) != (promotion_flag if promotion else PROMOTION + PROMOTION_PIECES.index("queen")):
+                continue
+        elif promotion:
+            continue
+        if found is not None:
+            raise InvalidMoveError(f"Ambiguous move: {san!r}")
+        found = move
+    if found is None:
+        raise InvalidMoveError(f"Illegal move: {san!r}")
+    return found
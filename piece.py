@@ -4,7 +4,7 @@ from typing import Any, Iterator, Optional
 
 from color import Color
 from move import Move
-from square import Square
+from square import RAYS, Square
 
 
 @total_ordering
@@ -43,9 +43,38 @@ class Piece(ABC):
         else:
             return chr(ord(self._symbol) + 6)
 
+    def copy(self) -> 'Piece':
+        """Return a copy of the Piece that isn't placed on any Square yet."""
+        piece = self.__class__.__new__(self.__class__)
+        piece.__dict__.update(self.__dict__)
+        piece.square = None
+        return piece
+
     def allowed_moves(self) -> Iterator[Move]:
         return (move for move in self._all_moves() if move.square and (not move.square.piece or move.square.piece.color != self.color))
         
+    def _move_to(self, to: Square) -> Optional[Move]:
+        """Return the Move to the Square if the piece can make it, without checking whether it exposes the King.
+        
+        Pieces with a simple geometry override this, so that no other moves have to be generated.
+        """
+        for move in self.allowed_moves():
+            if move.square is to:
+                return move
+        return None
+    
+    def _slide_to(self, to: Square, *directions: str) -> Optional[Move]:
+        """Return the Move to the Square if it's along one of the directions and nothing is in between."""
+        board = to.board
+        for direction in directions:
+            ray = RAYS[self.square.index][direction]
+            if to.index in ray:
+                for index in ray[:ray.index(to.index)]:
+                    if board[index].piece:
+                        return None
+                return Move(to)
+        return None
+        
     def _traverse(self, *directions: str, max_depth: int = 7) -> Iterator[Move]:
         for direction in directions:
             sq = self.square[direction]
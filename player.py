@@ -1,7 +1,7 @@
-import collections
 import time
+from array import array
 from functools import wraps
-from typing import Counter, Iterator, List, Optional, Any
+from typing import Iterator, List, Optional, Set, Tuple, Any, Union
 
 from bishop import Bishop
 from board import Board
@@ -9,13 +9,15 @@ from color import Color
 from utils import InvalidMoveError
 from king import King
 from knight import Knight
-from move import Move
+from move import Move, PROMOTION_PIECES, from_uci, promotion_of
+from move_cache import LEGAL_MOVES
 from pawn import Pawn
 from piece import Piece
 from queen import Queen
 from square import Square
 from rook import Rook
 from time_control import TimeControl
+import zobrist
 
 
 def _validate_move(func):
@@ -38,20 +40,32 @@ def _validate_move(func):
     return wrapper
 
 
+def _en_passant_capture(fr: int, to: int) -> int:
+    """Return the index of the Pawn captured en passant by the move from `fr` to `to`.
+    
+    The captured Pawn is on the rank of `fr` and the file of `to`, e.g. moving from d5 to e6 captures on e5.
+    """
+    return fr - fr % 8 + to % 8
+
+
 class Player:
+    # `time.monotonic()` when the running clock was started, None when it's stopped.
+    # Defined on the class too, so Players pickled before it was kept while stopped still load.
+    __timer: Optional[float] = None
+
     def __init__(self, color: Color, board: Board, time_control: Optional[TimeControl] = None):
         self.color: Color = color
         self._board: Board = board
-        
-        self.starting_pieces: Counter[Piece] = collections.Counter(self.pieces)
+
+        # Kept up to date by `move` and `promote`, so that reading them never needs to scan the board.
+        self._material: int = sum(piece.value for piece in self.pieces)
+        self._taken: List[Piece] = []
 
         self.opponent: Optional[Player] = None
         self.__king: Optional[King] = None
         self.promotion: Optional[Square] = None
 
-        self.time_control: Optional[TimeControl] = time_control
-        if self.time_control:
-            self._time_left: Optional[float] = self.time_control.time
+        self._set_time_control(time_control)
         self._running: bool = False
 
     def __eq__(self, other: Any) -> bool:
@@ -66,29 +80,159 @@ class Player:
         return self.color.name.capitalize()
     
     @_validate_move
-    def allowed_moves(self, fr: str) -> Iterator[Move]:
+    def allowed_moves(self, fr: Union[str, int]) -> Iterator[Move]:
+        """Yield the legal moves of the piece at `fr`, a coordinate like "e2" or a 0-63 index.
+        
+        The moves are cached per position, so asking again before the position changes costs only a lookup.
+        """
+        fr = self._board[fr].index
+        key = (self._position_key(), fr)
+        moves = LEGAL_MOVES.get(key)
+        if moves is None:
+            square = self._board[fr]
+            moves = array("H", (move.to_int(square) for move in self._allowed_moves(fr)))
+            LEGAL_MOVES.put(key, moves)
+        board = self._board
+        return (Move.from_int(move, board) for move in moves)
+    
+    def _allowed_moves(self, fr: int) -> Iterator[Move]:
         for move in self._board[fr].piece.allowed_moves():
-            to = move.square.coord
-            if move.enpassant:
-                if not self._opens_check(fr, to, captured=to[0]+fr[1]):
-                    yield move
-            elif move.castle:
-                if self.is_checked():
-                    continue
-                if to > fr:
-                    # Castled to the east
-                    if not self.is_checked(self._king.square.e) and not self.is_checked(self._king.square.e.e):
-                        yield move
+            if self._keeps_king_safe(fr, move):
+                yield move
+    
+    def _keeps_king_safe(self, fr: int, move: Move) -> bool:
+        """Return True if the otherwise possible move from `fr` doesn't leave or pass the King in check."""
+        to = move.square.index
+        if move.enpassant:
+            return not self._opens_check(fr, to, captured=_en_passant_capture(fr, to))
+        if move.castle:
+            if self.is_checked():
+                return False
+            if to > fr:
+                # Castled to the east
+                return not self.is_checked(self._king.square.e) and not self.is_checked(self._king.square.e.e)
+            # Castled to the west
+            return not self.is_checked(self._king.square.w) and not self.is_checked(self._king.square.w.w)
+        return not self._opens_check(fr, to)
+    
+    def is_legal(self, fr: Union[str, int], to: Union[str, int], promotion: Optional[str] = None) -> bool:
+        """Return True if the Player can now move from `fr` to `to`, and promote to `promotion` if it's given.
+        
+        Only this one move is tried, so this is much cheaper than looking for it in `allowed_moves`.
+        """
+        return self._legal_move(fr, to, promotion) is not None
+    
+    def _legal_move(self, fr: Union[str, int], to: Union[str, int], promotion: Optional[str] = None) -> Optional[Move]:
+        move = self._possible_move(fr, to, promotion)
+        if move is None or not self._keeps_king_safe(self._board[fr].index, move):
+            return None
+        return move
+    
+    def _possible_move(self, fr: Union[str, int], to: Union[str, int], promotion: Optional[str] = None) -> Optional[Move]:
+        """Return the Move if the piece can make it, without checking whether it exposes the King."""
+        try:
+            fr_square = self._board[fr]
+            to_square = self._board[to]
+        except (KeyError, TypeError):
+            return None
+        
+        piece = fr_square.piece
+        if not piece or piece.color != self.color:
+            return None
+        if to_square.piece and to_square.piece.color == self.color:
+            return None
+        if promotion is not None:
+            if not isinstance(piece, Pawn) or 8 <= to_square.index < 56:
+                return None
+            if not isinstance(promotion, str) or promotion.lower() not in PROMOTION_PIECES:
+                return None
+        
+        return piece._move_to(to_square)
+    
+    def _trusted_move(self, fr: int, to: int) -> Move:
+        """Return the Move between the indices with its flags set, assuming that the move is legal."""
+        piece = self._board[fr].piece
+        to_square = self._board[to]
+        if isinstance(piece, Pawn):
+            if abs(to - fr) == 16:
+                return Move(to_square, pawn_double_move=True)
+            if (to - fr) % 8 and not to_square.piece:
+                # Moved diagonally to an empty Square.
+                return Move(to_square, enpassant=True)
+        elif isinstance(piece, King) and abs(to - fr) == 2:
+            return Move(to_square, castle=True)
+        return Move(to_square)
+                
+    def legal_moves(self) -> List[Tuple[str, Move]]:
+        """Return all the legal moves of the Player as (from coordinate, Move) pairs.
+        
+        This is one pass over the Player's pieces. Whether the King is in check and which pieces are pinned
+        is computed once for all of them, so most moves don't have to be tried out on the board.
+        """
+        king = self._king
+        checked = self.is_checked()
+        pinned = self._pinned()
+        
+        rv = []
+        for piece in list(self.pieces):
+            fr = piece.square
+            for move in piece.allowed_moves():
+                to = move.square
+                if move.castle:
+                    if checked:
+                        continue
+                    step = fr.e if to.index > fr.index else fr.w
+                    if not self.is_checked(step) and not self.is_checked(to):
+                        rv.append((fr.coord, move))
+                elif move.enpassant:
+                    if not self._opens_check(fr.index, to.index, captured=_en_passant_capture(fr.index, to.index)):
+                        rv.append((fr.coord, move))
+                elif checked or piece is king or fr.index in pinned:
+                    if not self._opens_check(fr.index, to.index):
+                        rv.append((fr.coord, move))
                 else:
-                    # Castled to the west
-                    if not self.is_checked(self._king.square.w) and not self.is_checked(self._king.square.w.w):
-                        yield move
+                    # Not in check and not pinned, so the move can't expose the King.
+                    rv.append((fr.coord, move))
+        return rv
+
+    def legal_move_codes(self) -> array:
+        """Return all the legal moves of the Player packed into an `array("H")`, see `move.pack`.
+        
+        A Pawn moving to the last rank gives one move for each piece it can be promoted to.
+        The moves are cached per position like in `allowed_moves`.
+        """
+        key = self._position_key()
+        moves = LEGAL_MOVES.get(key)
+        if moves is None:
+            moves = self._legal_move_codes()
+            LEGAL_MOVES.put(key, moves)
+        return array("H", moves)
+    
+    def _legal_move_codes(self) -> array:
+        rv = array("H")
+        for fr, move in self.legal_moves():
+            square = self._board[fr]
+            to = move.square.index
+            if isinstance(square.piece, Pawn) and (to < 8 or to >= 56):
+                rv.extend(move.to_int(square, promotion) for promotion in PROMOTION_PIECES)
             else:
-                if not self._opens_check(fr, to):
-                    yield move
-                
-    @_validate_move
-    def move(self, fr: str, to: str) -> None:
+                rv.append(move.to_int(square))
+        return rv
+    
+    def legal_move_code(self, uci: str) -> int:
+        """Return the packed legal move matching a string like "e2e4" or "e7e8q", with all of its flags set."""
+        try:
+            wanted = from_uci(uci)
+        except ValueError:
+            raise InvalidMoveError from None
+        
+        for move in self.legal_move_codes():
+            if move & 0xFFF == wanted & 0xFFF and promotion_of(move) == promotion_of(wanted):
+                return move
+        raise InvalidMoveError
+
+    def move(self, fr: Union[str, int], to: Union[str, int]) -> None:
+        """Move the piece at `fr` to `to`, both given as coordinates like "e2" or as 0-63 indices."""
         if self.promotion:
             raise InvalidMoveError
             
@@ -96,39 +240,44 @@ class Player:
             # Can't move after time has run out.
             raise InvalidMoveError
         
-        for move in self.allowed_moves(fr):
-            if move.square.coord == to:
-                break
-        else:
+        move = self._legal_move(fr, to)
+        if move is None:
             raise InvalidMoveError
-             
-        self._board[to].piece = self._board[fr].piece
-        self._board[fr].piece = None
-        self._board[to].piece.moved = True       
-        
+
+        self._apply(self._board[fr].index, move.square.index, move)
+
+    def _apply(self, fr: int, to: int, move: Move) -> None:
+        """Make the move between the Square indices `fr` and `to` without checking that it's legal."""
+        board = self._board
         if move.enpassant:
-            # to[0] + fr[1] is the square where the double moved pawn sits when we capture it en passant via `to` square.
-            # E.g. we move from d5 to e6, the pawn we capture en passant is in c5.
-            self._board[to[0] + fr[1]].piece = None
+            captured = board[_en_passant_capture(fr, to)]
+            self._capture(captured.piece)
+            captured.piece = None
+        elif board[to].piece:
+            self._capture(board[to].piece)
+
+        piece = board[fr].piece
+        board[to].piece = piece
+        board[fr].piece = None
+        piece.moved = True
         
         if move.pawn_double_move:
-            # Save a double moved Pawn as a ghost to handle possible en passant next move.
-            self._board[f"{fr[0]}{(int(fr[1]) + int(to[1])) // 2}"].ghost = self.color
+            # Save the skipped Square as the en passant target to handle possible en passant next move.
+            board.set_en_passant(board[(fr + to) // 2], self.color)
 
-        if isinstance(self._board[to].piece, Pawn) and to[1] in {"1", "8"}:
-            # Pawn moved to the last file, so make a mark that the next thing to do is to promote the Pawn.
-            self.promotion = self._board[to]
+        if isinstance(piece, Pawn) and (to < 8 or to >= 56):
+            # Pawn moved to the last rank, so make a mark that the next thing to do is to promote the Pawn.
+            self.promotion = board[to]
                 
         if move.castle:
-            rank = to[1]             
             if to > fr:
-                # Castled to the east
-                self._board["f" + rank].piece = self._board["h" + rank].piece
-                self._board["h" + rank].piece = None
+                # Castled to the east, the Rook moves from the h file to the f file.
+                rook_fr, rook_to = to + 1, to - 1
             else:
-                # Castled to the west
-                self._board["d" + rank].piece = self._board["a" + rank].piece
-                self._board["a" + rank].piece = None
+                # Castled to the west, the Rook moves from the a file to the d file.
+                rook_fr, rook_to = to - 2, to + 1
+            board[rook_to].piece = board[rook_fr].piece
+            board[rook_fr].piece = None
       
     def promote(self, piece: str) -> None:
         if not self.promotion:
@@ -141,23 +290,49 @@ class Player:
             
         promotion_options = {"queen": Queen, "knight": Knight, "rook": Rook, "bishop": Bishop}      
         try:
-            self.promotion.piece = promotion_options[piece](self.color)
+            promoted = promotion_options[piece](self.color)
         except KeyError:
             raise InvalidMoveError from None
-        
+
+        self._material += promoted.value - self.promotion.piece.value
+        self.promotion.piece = promoted
         self.promotion = None
     
     def is_checked(self, square_to_check: Optional[Square] = None) -> bool:
         if square_to_check is None:
             square_to_check = self._king.square
 
-        for piece in self.opponent.pieces:
-            for move in piece.allowed_moves():
-                if move.square == square_to_check:
-                    return True
-        return False
+        return self._board.is_attacked(square_to_check, self.opponent.color)
     
-    def _opens_check(self, fr: str, to: str, captured: Optional[str] = None) -> bool:
+    def _position_key(self) -> int:
+        """Return the Zobrist key of the position with this Player to move."""
+        key = self._board.position_key()
+        if self.color == Color.BLACK:
+            key ^= zobrist.BLACK_TO_MOVE
+        return key
+    
+    def _pinned(self) -> Set[int]:
+        """Return the Square indices of own pieces that can't leave the line between the King and an enemy piece."""
+        pinned = set()
+        for direction in ("n", "e", "s", "w", "ne", "se", "sw", "nw"):
+            slider = Bishop if len(direction) == 2 else Rook
+            own = None
+            sq = self._king.square[direction]
+            while sq:
+                piece = sq.piece
+                if piece:
+                    if piece.color == self.color:
+                        if own:
+                            break
+                        own = sq
+                    else:
+                        if own and isinstance(piece, slider):
+                            pinned.add(own.index)
+                        break
+                sq = sq[direction]
+        return pinned
+    
+    def _opens_check(self, fr: Union[str, int], to: Union[str, int], captured: Union[str, int, None] = None) -> bool:
         if captured is not None:
             captured_backup = self._board[captured].piece
             self._board[captured].piece = None
@@ -179,22 +354,52 @@ class Player:
         
         return rv
     
+    def _copy(self, board: Board) -> 'Player':
+        """Return a copy of the Player that plays on `board`, a copy of this Player's Board.
+        
+        The caller has to set the opponent of the copy.
+        """
+        player = self.__class__.__new__(self.__class__)
+        player.__dict__.update(self.__dict__)
+        player._board = board
+        player.opponent = None
+        player.__king = None
+        player._taken = list(self._taken)
+        if self.promotion:
+            player.promotion = board[self.promotion.coord]
+        return player
+
+    def _set_time_control(self, time_control: Optional[TimeControl]) -> None:
+        self.time_control: Optional[TimeControl] = time_control
+        if self.time_control:
+            self._time_left: Optional[float] = self.time_control.time
+
+    def _capture(self, piece: Piece) -> None:
+        self.opponent._material -= piece.value
+        self._taken.append(piece)
+        # At most 15 pieces can ever be taken, so re-sorting on a capture is cheap.
+        self._taken.sort(reverse=True)
+
+    # The clock uses `time.monotonic()`, so it doesn't jump when the system time is adjusted.
     def start_clock(self) -> None:
-        self.__timer = time.time()
+        self.__timer = time.monotonic()
         self._running = True
     
     def stop_clock(self) -> None:
         if self._running:
-            diff = time.time() - self.__timer
+            diff = time.monotonic() - self.__timer
+            # Stopped before the timer is cleared, so `flag_deadline` in another thread never sees a running clock
+            # without a timer.
+            self._running = False
             if diff > self.time_control.delay:
                 self._time_left -= (diff - self.time_control.delay)
             self._time_left += self.time_control.increment
-            del self.__timer
-            self._running = False
+            self.__timer = None
     
     def read_clock(self) -> float:
-        if self._running:
-            diff = time.time() - self.__timer
+        timer = self.__timer
+        if self._running and timer is not None:
+            diff = time.monotonic() - timer
         else:
             diff = 0
             
@@ -204,11 +409,22 @@ class Player:
             res = self._time_left
             
         return res if res > 0 else 0
+
+    def flag_deadline(self) -> Optional[float]:
+        """Return the `time.monotonic()` time when the running clock will run out, None if it isn't running."""
+        # The timer is read once, a clock stopped by another thread meanwhile leaves it None.
+        timer = self.__timer
+        if timer is None or not self._running:
+            return None
+        return timer + self.time_control.delay + self._time_left
     
+    @property
+    def material(self) -> int:
+        """The total value of the Player's pieces on the board."""
+        return self._material
+
     def value_diff(self) -> int:
-        value_own = sum(piece.value for piece in self.pieces)
-        value_opp = sum(piece.value for piece in self.opponent.pieces)
-        return value_own - value_opp
+        return self._material - self.opponent._material
         
     @property
     def pieces(self) -> Iterator[Piece]:
@@ -218,8 +434,11 @@ class Player:
     
     @property
     def taken_pieces(self) -> List[Piece]:
-        diff = self.opponent.starting_pieces - collections.Counter(self.opponent.pieces)
-        return sorted(diff.elements(), reverse=True)
+        """The opponent's pieces this Player has captured, most valuable first.
+
+        This is a copy, so changing it doesn't change the Player.
+        """
+        return list(self._taken)
     
     @property
     def _king(self) -> King:
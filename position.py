@@ -0,0 +1,36 @@
+from typing import Iterator, NamedTuple, Optional, Tuple, Union
+
+from board import Board, decode_piece
+from color import Color
+from piece import Piece
+from utils import coord_to_index
+
+
+class Position(NamedTuple):
+    """An immutable snapshot of a position, made with `Game.position`.
+
+    The pieces are stored as a `Board.to_bytes` snapshot, so a Position never changes after it's made
+    and any number of threads can read it without locks, while the Game it came from keeps being played.
+    Analysis that needs move generation rebuilds a private Game from it with `Game.from_position`.
+    """
+    board: bytes
+    to_move: Color
+    # Zobrist key of the position, the same as `Game.position_key` gives.
+    key: int
+
+    def __str__(self) -> str:
+        return str(Board.from_bytes(self.board))
+
+    def piece_at(self, square: Union[str, int]) -> Optional[Piece]:
+        """Return a new Piece equal to the one at the coordinate or index, None for an empty square."""
+        if isinstance(square, str):
+            square = coord_to_index(square)
+        if not 0 <= square < 64:
+            raise IndexError(f"Invalid square index: {square}")
+        return decode_piece(self.board[square])
+
+    def pieces(self) -> Iterator[Tuple[int, Piece]]:
+        """Yield the (index, Piece) pairs of all the pieces, from a1 to h8."""
+        for index, code in enumerate(self.board[:64]):
+            if code:
+                yield index, decode_piece(code)
@@ -0,0 +1,155 @@
+"""SQLite index of the positions reached in the games of an archive, for finding every game that reached a position.
+
+    python3 position_index.py build games.arc games.idx
+    python3 position_index.py find games.idx e2e4 e7e5 g1f3
+
+Building is incremental: only the games added to the archive since the last build are indexed,
+so the nightly ingestion of new games doesn't rebuild the whole index.
+"""
+
+import argparse
+import sqlite3
+from typing import Iterable, List, Sequence, Tuple
+
+from archive import Archive
+from game import Game
+
+_SCHEMA: str = """
+CREATE TABLE IF NOT EXISTS positions (
+    key INTEGER NOT NULL,
+    game_id INTEGER NOT NULL,
+    ply INTEGER NOT NULL,
+    PRIMARY KEY (key, game_id, ply)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS meta (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO meta VALUES ('indexed_games', 0);
+"""
+
+
+class PositionIndex:
+    """Maps the Zobrist key of every position of every game, see `Game.position_key`, to the game id and ply.
+
+    The positions table is clustered on (key, game_id, ply), so it is its own covering index:
+    a lookup by key is a single B-tree range scan, which never has to visit any other table.
+    """
+
+    def __init__(self, path: str, batch_size: int = 1000) -> None:
+        self.path: str = path
+        # Games inserted per transaction.
+        self.batch_size: int = batch_size
+        self._connection: sqlite3.Connection = sqlite3.connect(path)
+        self._connection.execute("PRAGMA journal_mode = WAL")
+        self._connection.execute("PRAGMA synchronous = NORMAL")
+        with self._connection:
+            self._connection.executescript(_SCHEMA)
+
+    def __enter__(self) -> 'PositionIndex':
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._connection.close()
+
+    @property
+    def indexed_games(self) -> int:
+        """The amount of games indexed so far, all the games with smaller ids than this are in the index."""
+        row = self._connection.execute("SELECT value FROM meta WHERE name = 'indexed_games'").fetchone()
+        return row[0]
+
+    def update(self, archive: Archive) -> int:
+        """Index the games of the archive that aren't indexed yet, and return how many there were."""
+        start = self.indexed_games
+        return self.add_games((game_id, archive.moves(game_id)) for game_id in range(start, len(archive)))
+
+    def add_games(self, games: Iterable[Tuple[int, Sequence[int]]]) -> int:
+        """Index the (game id, packed moves) pairs, with the ids continuing from `indexed_games`.
+
+        Each batch of games is inserted in one transaction together with the new `indexed_games`,
+        so an interrupted build leaves a consistent index, which the next build continues from.
+        """
+        added = 0
+        rows: List[Tuple[int, int, int]] = []
+        batch = 0
+        next_id = self.indexed_games
+        for game_id, moves in games:
+            if game_id != next_id:
+                raise ValueError(f"Expected game id {next_id}, got {game_id}")
+            rows.extend(_positions(game_id, moves))
+            next_id += 1
+            batch += 1
+            if batch == self.batch_size:
+                self._insert(rows, next_id)
+                added += batch
+                rows, batch = [], 0
+        if batch:
+            self._insert(rows, next_id)
+            added += batch
+        return added
+
+    def find(self, key: int) -> List[Tuple[int, int]]:
+        """Return the (game id, ply) pairs of the games that reached the position, at the first ply it was reached."""
+        return self._connection.execute(
+            "SELECT game_id, MIN(ply) FROM positions WHERE key = ? GROUP BY game_id ORDER BY game_id",
+            (_signed(key),),
+        ).fetchall()
+
+    def count(self, key: int) -> int:
+        """Return the amount of games that reached the position."""
+        row = self._connection.execute(
+            "SELECT COUNT(DISTINCT game_id) FROM positions WHERE key = ?", (_signed(key),)
+        ).fetchone()
+        return row[0]
+
+    def _insert(self, rows: List[Tuple[int, int, int]], indexed_games: int) -> None:
+        with self._connection:
+            self._connection.executemany("INSERT OR IGNORE INTO positions VALUES (?, ?, ?)", rows)
+            self._connection.execute("UPDATE meta SET value = ? WHERE name = 'indexed_games'", (indexed_games,))
+
+
+def _positions(game_id: int, moves: Sequence[int]) -> List[Tuple[int, int, int]]:
+    """Return the (key, game id, ply) rows of every position of the game, the starting position included."""
+    game = Game()
+    rows = [(_signed(game.position_key()), game_id, 0)]
+    for ply, move in enumerate(moves, 1):
+        game.apply_moves((move,), validate=False)
+        rows.append((_signed(game.position_key()), game_id, ply))
+    return rows
+
+
+def _signed(key: int) -> int:
+    """SQLite integers are signed 64-bit, so the upper half of the unsigned keys are stored as negative numbers."""
+    return key - (1 << 64) if key >= 1 << 63 else key
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Build and query position indexes of game archives.")
+    commands = parser.add_subparsers(dest="command")
+    build_parser = commands.add_parser("build", help="index the new games of an archive")
+    build_parser.add_argument("archive")
+    build_parser.add_argument("index")
+    find_parser = commands.add_parser("find", help="list the games that reached the position after the moves")
+    find_parser.add_argument("index")
+    find_parser.add_argument("moves", nargs="*", help='moves from the starting position, like "e2e4"')
+    args = parser.parse_args()
+
+    if args.command == "build":
+        with Archive(args.archive) as archive, PositionIndex(args.index) as index:
+            added = index.update(archive)
+            print(f"{added} games indexed, {index.indexed_games} in total")
+    elif args.command == "find":
+        game = Game()
+        game.apply_moves(args.moves)
+        with PositionIndex(args.index) as index:
+            for game_id, ply in index.find(game.position_key()):
+                print(f"game {game_id} ply {ply}")
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
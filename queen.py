@@ -1,8 +1,9 @@
-from typing import Iterator
+from typing import Iterator, Optional
 
 from bishop import Bishop
 from move import Move
 from rook import Rook
+from square import Square
 
         
 class Queen(Bishop, Rook):
@@ -12,3 +13,6 @@ class Queen(Bishop, Rook):
     def _all_moves(self) -> Iterator[Move]:
         yield from Bishop._all_moves(self)
         yield from Rook._all_moves(self)
+    
+    def _move_to(self, to: Square) -> Optional[Move]:
+        return self._slide_to(to, "ne", "se", "sw", "nw", "n", "e", "s", "w")
@@ -1,5 +1,6 @@
-from typing import Iterator
+from typing import Iterator, Optional
 
+from move import Move
 from piece import Piece
 from square import Square
 
@@ -10,3 +11,6 @@ class Rook(Piece):
     
     def _all_moves(self) -> Iterator[Square]:
         yield from self._traverse("n", "e", "s", "w")
+    
+    def _move_to(self, to: Square) -> Optional[Move]:
+        return self._slide_to(to, "n", "e", "s", "w")
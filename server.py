@@ -0,0 +1,322 @@
+"""Asyncio TCP server, which hosts many concurrent chess games.
+
+The protocol is line delimited JSON. Every request is an object with an "op" key and gets exactly one
+response line. An optional "id" in a request is echoed back in its response. Moves are given as strings
+like "e2e4", with an optional promotion piece letter like "e7e8q".
+
+    {"op": "new", "time": 300, "increment": 0, "delay": 0}  -> {"ok": true, "game": 1, "board": [...], ...}
+    {"op": "move", "game": 1, "move": "e2e4"}                -> {"ok": true, "game": 1, "board": [...], ...}
+    {"op": "promote", "game": 1, "piece": "queen"}           -> {"ok": true, "game": 1, "board": [...], ...}
+    {"op": "state", "game": 1}                               -> {"ok": true, "game": 1, "board": [...], ...}
+    {"op": "moves", "game": 1}                               -> {"ok": true, "moves": ["a2a3", ...], "status": "ongoing"}
+    {"op": "hint", "game": 1, "depth": 2}                    -> {"ok": true, "move": "e2e4", "score": 35, "depth": 2}
+    {"op": "subscribe", "game": 1}                           -> {"ok": true}
+    {"op": "close", "game": 1}                               -> {"ok": true}
+    {"op": "stats"}                                          -> {"ok": true, "stats": {...}, "legal_move_cache": {...}}
+
+Subscribers get an {"event": "update", "game": 1, "board": [...], ...} line after every move in the game,
+and an {"event": "timeout", "game": 1, "player": "white"} line when a clock runs out.
+Failed requests are answered with {"ok": false, "error": "..."}.
+
+Move validation runs in a thread pool, so a slow validation never blocks the event loop.
+Hints are searched in the same pool from an immutable `Position` snapshot, so they don't hold up the moves of the game.
+With `--book`, the hints for positions in the opening book come from it with a depth of 0.
+The "stats" op returns the hot path counters of `instrumentation`, which `--instrument` enables.
+Run with `python server.py`, and measure the throughput with `loadgen.py`.
+"""
+
+import argparse
+import asyncio
+import functools
+import itertools
+import json
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Set
+
+from book import OpeningBook
+from clock_manager import ClockManager
+from engine import Engine
+from game import Game
+import instrumentation
+from move import from_index, from_uci, promotion_of, to_index, to_uci
+from move_cache import LEGAL_MOVES
+from pawn import Pawn
+from player import Player
+from position import Position
+from time_control import TimeControl
+from utils import COORDS, InvalidMoveError
+
+# Subscribers whose unsent output grows over this are considered too slow and are dropped.
+MAX_SUBSCRIBER_BUFFER = 1024 * 1024
+# Deepest search a "hint" request can ask for.
+MAX_HINT_DEPTH = 4
+
+
+class RequestError(Exception):
+    pass
+
+
+class GameSession:
+    """One hosted Game and the connections subscribed to it."""
+
+    def __init__(self, game_id: int, game: Game) -> None:
+        self.id: int = game_id
+        self.game: Game = game
+        # Requests to the same Game are handled one at a time, requests to different Games concurrently.
+        self.lock: asyncio.Lock = asyncio.Lock()
+        self.subscribers: Set[asyncio.StreamWriter] = set()
+        self.last_move: Optional[str] = None
+        self.ply: int = 0
+
+    def state(self) -> Dict[str, Any]:
+        game = self.game
+        rows = []
+        for rank in "87654321":
+            row = ""
+            for file in "abcdefgh":
+                piece = game._board[file + rank].piece
+                row += str(piece) if piece else "."
+            rows.append(row)
+
+        rv = {
+            "game": self.id,
+            "board": rows,
+            "to_move": str(game.current_player).lower(),
+            "promotion": game.current_player.promotion is not None,
+            "last_move": self.last_move,
+            "ply": self.ply,
+        }
+        if game.current_player.time_control:
+            rv["clock"] = {"white": game.white.read_clock(), "black": game.black.read_clock()}
+        return rv
+
+    def play(self, text: str) -> Dict[str, Any]:
+        try:
+            move = from_uci(text)
+        except ValueError:
+            raise InvalidMoveError from None
+
+        player = self.game.current_player
+        if player.promotion:
+            raise InvalidMoveError
+        promotion = promotion_of(move)
+        if promotion and not _reaches_last_rank(self.game, move):
+            # A promotion piece on any other move is as malformed as an unknown one.
+            raise InvalidMoveError
+        player.move(COORDS[from_index(move)], COORDS[to_index(move)])
+        self.last_move = to_uci(move)
+        if player.promotion:
+            if not promotion:
+                # The promotion piece has to come in a separate "promote" request.
+                return self.state()
+            player.promote(promotion)
+        return self._next_turn()
+
+    def promote(self, piece: str) -> Dict[str, Any]:
+        self.game.current_player.promote(piece)
+        return self._next_turn()
+
+    def legal_moves(self) -> Dict[str, Any]:
+        player = self.game.current_player
+        moves = [to_uci(move) for move in player.legal_move_codes()]
+        if moves:
+            status = "ongoing"
+        elif player.is_checked():
+            status = "checkmate"
+        else:
+            status = "stalemate"
+        return {"moves": moves, "status": status}
+
+    def _next_turn(self) -> Dict[str, Any]:
+        self.game.next_player()
+        self.ply += 1
+        return self.state()
+
+
+def _reaches_last_rank(game: Game, move: int) -> bool:
+    """Return True if the move takes a Pawn to the first or the last rank."""
+    return isinstance(game._board[from_index(move)].piece, Pawn) and to_index(move) // 8 in (0, 7)
+
+
+class ChessServer:
+    def __init__(self, max_workers: Optional[int] = None, book: Optional[OpeningBook] = None) -> None:
+        self.sessions: Dict[int, GameSession] = {}
+        # Hints for positions in the opening book come from it without searching.
+        self.book: Optional[OpeningBook] = book
+        self._ids = itertools.count(1)
+        self._executor: ThreadPoolExecutor = ThreadPoolExecutor(max_workers=max_workers)
+        self.clocks: ClockManager = ClockManager()
+
+    async def start(self, host: str, port: int) -> asyncio.AbstractServer:
+        asyncio.ensure_future(self.clocks.run())
+        return await asyncio.start_server(self.handle_client, host, port)
+
+    async def handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        subscriptions: Set[int] = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                response = await self.handle_line(line, writer, subscriptions)
+                writer.write(json.dumps(response).encode() + b"\n")
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            for game_id in subscriptions:
+                session = self.sessions.get(game_id)
+                if session:
+                    session.subscribers.discard(writer)
+            writer.close()
+
+    async def handle_line(self, line: bytes, writer: Optional[asyncio.StreamWriter] = None,
+                          subscriptions: Optional[Set[int]] = None) -> Dict[str, Any]:
+        request_id = None
+        try:
+            try:
+                request = json.loads(line.decode())
+                request_id = request.get("id")
+                op = request["op"]
+            except (ValueError, KeyError, AttributeError, UnicodeDecodeError):
+                raise RequestError("malformed request") from None
+
+            if op == "new":
+                response = await self._new(request)
+            elif op == "move":
+                response = await self._update(request, lambda session: session.play(str(request.get("move"))))
+            elif op == "promote":
+                response = await self._update(request, lambda session: session.promote(request.get("piece")))
+            elif op == "state":
+                response = await self._run(self._session(request), GameSession.state)
+            elif op == "moves":
+                response = await self._run(self._session(request), GameSession.legal_moves)
+            elif op == "hint":
+                response = await self._hint(request)
+            elif op == "subscribe":
+                session = self._session(request)
+                if writer is not None:
+                    session.subscribers.add(writer)
+                    subscriptions.add(session.id)
+                response = {}
+            elif op == "stats":
+                response = {"stats": instrumentation.snapshot(), "legal_move_cache": LEGAL_MOVES.stats()}
+            elif op == "close":
+                session = self.sessions.pop(self._session(request).id)
+                session.subscribers.clear()
+                response = {}
+            else:
+                raise RequestError(f"unknown op: {op!r}")
+
+            response["ok"] = True
+        except InvalidMoveError:
+            response = {"ok": False, "error": "invalid move"}
+        except RequestError as e:
+            response = {"ok": False, "error": str(e)}
+
+        if request_id is not None:
+            response["id"] = request_id
+        return response
+
+    async def _new(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        time_control = None
+        if request.get("time"):
+            try:
+                time_control = TimeControl(float(request["time"]), float(request.get("increment", 0)),
+                                           float(request.get("delay", 0)))
+            except (TypeError, ValueError):
+                raise RequestError("invalid time control") from None
+
+        session = GameSession(next(self._ids), Game(time_control))
+        self.sessions[session.id] = session
+        return session.state()
+
+    async def _update(self, request: Dict[str, Any], func: Callable[[GameSession], Dict[str, Any]]) -> Dict[str, Any]:
+        session = self._session(request)
+        async with session.lock:
+            state = await asyncio.get_event_loop().run_in_executor(self._executor, func, session)
+            player = session.game.current_player
+            if player.time_control:
+                self.clocks.watch(player, functools.partial(self._flag_fell, session))
+        self._publish(session, dict(state, event="update"))
+        return state
+
+    async def _run(self, session: GameSession, func: Callable[[GameSession], Dict[str, Any]]) -> Dict[str, Any]:
+        async with session.lock:
+            return await asyncio.get_event_loop().run_in_executor(self._executor, func, session)
+
+    async def _hint(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        session = self._session(request)
+        try:
+            depth = int(request.get("depth", 2))
+        except (TypeError, ValueError):
+            raise RequestError("invalid depth") from None
+        if not 1 <= depth <= MAX_HINT_DEPTH:
+            raise RequestError(f"depth has to be between 1 and {MAX_HINT_DEPTH}")
+
+        # Only taking the snapshot waits for the requests in progress, the search doesn't block the game.
+        async with session.lock:
+            if session.game.current_player.promotion:
+                raise RequestError("promotion pending")
+            position = session.game.position()
+        return await asyncio.get_event_loop().run_in_executor(self._executor, _analyse, position, depth, self.book)
+
+    def _flag_fell(self, session: GameSession, player: Player) -> None:
+        if self.sessions.get(session.id) is session:
+            self._publish(session, {"event": "timeout", "game": session.id, "player": str(player).lower()})
+
+    def _session(self, request: Dict[str, Any]) -> GameSession:
+        try:
+            return self.sessions[request["game"]]
+        except (KeyError, TypeError):
+            raise RequestError("unknown game") from None
+
+    def _publish(self, session: GameSession, message: Dict[str, Any]) -> None:
+        if not session.subscribers:
+            return
+        line = json.dumps(message).encode() + b"\n"
+        for writer in list(session.subscribers):
+            if writer.transport.is_closing() or writer.transport.get_write_buffer_size() > MAX_SUBSCRIBER_BUFFER:
+                session.subscribers.discard(writer)
+                continue
+            writer.write(line)
+
+
+def _analyse(position: Position, depth: int, book: Optional[OpeningBook] = None) -> Dict[str, Any]:
+    result = Engine(book=book).search(Game.from_position(position), depth=depth)
+    return {
+        "move": to_uci(result.move) if result.move is not None else None,
+        "score": result.score,
+        "depth": result.depth,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=None, help="move validation threads")
+    parser.add_argument("--instrument", action="store_true", help="count and time the move generation hot paths")
+    parser.add_argument("--book", help="opening book for the hints, see book.py")
+    args = parser.parse_args()
+
+    if args.instrument:
+        instrumentation.enable()
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    chess_server = ChessServer(max_workers=args.workers, book=OpeningBook(args.book) if args.book else None)
+    server = loop.run_until_complete(chess_server.start(args.host, args.port))
+    print(f"Serving on {args.host}:{args.port}")
+    try:
+        loop.run_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        loop.run_until_complete(server.wait_closed())
+        loop.close()
+
+
+if __name__ == "__main__":
+    main()
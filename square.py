@@ -1,38 +1,95 @@
 import re
-from typing import Any, Dict, Optional, Pattern, TYPE_CHECKING
+from typing import Any, Dict, Optional, Pattern, Tuple, TYPE_CHECKING
 
-from color import Color
+from utils import coord_to_index
 
 if TYPE_CHECKING:
+    from board import Board
     from piece import Piece
 
 
+_DIRECTIONS: Dict[str, Tuple[int, int]] = {
+    "n": (0, 1), "e": (1, 0), "s": (0, -1), "w": (-1, 0),
+    "ne": (1, 1), "se": (1, -1), "sw": (-1, -1), "nw": (-1, 1),
+}
+
+
+def _adjacent(index: int) -> Dict[str, Optional[int]]:
+    x, y = index % 8, index // 8
+    rv = {}
+    for direction, (dx, dy) in _DIRECTIONS.items():
+        if 0 <= x + dx < 8 and 0 <= y + dy < 8:
+            rv[direction] = index + dx + 8 * dy
+        else:
+            rv[direction] = None
+    return rv
+
+
+def _rays(index: int) -> Dict[str, Tuple[int, ...]]:
+    rv = {}
+    for direction in _DIRECTIONS:
+        ray = []
+        square = ADJACENT[index][direction]
+        while square is not None:
+            ray.append(square)
+            square = ADJACENT[square][direction]
+        rv[direction] = tuple(ray)
+    return rv
+
+
+def _knight_jumps(index: int) -> Tuple[int, ...]:
+    x, y = index % 8, index // 8
+    jumps = ((1, 2), (2, 1), (2, -1), (1, -2), (-1, -2), (-2, -1), (-2, 1), (-1, 2))
+    return tuple(index + dx + 8 * dy for dx, dy in jumps if 0 <= x + dx < 8 and 0 <= y + dy < 8)
+
+
+# The board topology never changes, so it's computed once and shared by every Square of every Board.
+ADJACENT: Tuple[Dict[str, Optional[int]], ...] = tuple(_adjacent(i) for i in range(64))
+# The squares from the index to the edge of the board in each direction, nearest first.
+RAYS: Tuple[Dict[str, Tuple[int, ...]], ...] = tuple(_rays(i) for i in range(64))
+KNIGHT_JUMPS: Tuple[Tuple[int, ...], ...] = tuple(_knight_jumps(i) for i in range(64))
+
+
 class Square:
-    """Models one chess board square. A Square is also essentially a graph node."""
+    """Models one chess board square. A Square is also essentially a graph node.
+
+    The edges of the graph are not stored in the Square, they are looked up from the shared
+    `ADJACENT` table and resolved to the Squares of the Board that owns this Square.
+    """
         
     _EMPTY_BLACK: str = "\u25A0"
     _EMPTY_WHITE: str = "\u25A1"
     _PATTERN: Pattern = re.compile(r"^[a-h][1-8]$")
         
-    def __init__(self, coord: str) -> None:
+    def __init__(self, coord: str, board: Optional['Board'] = None) -> None:
         if not re.match(self._PATTERN, coord):
             raise ValueError(f"Invalid coordinate: '{coord}'")
             
         self.coord: str = coord
-        self._adjacent: Dict[str, Optional['Square']] = {}
+        self.index: int = coord_to_index(coord)  # 0-63, counting from a1 to h1 and then rank by rank up to h8.
         self._piece: Optional['Piece'] = None
-        self.ghost: Optional[Color] = None  # True if there's an virtual Pawn in the Square that can be captured en passant.
+        self.board: Optional['Board'] = board
     
+    @classmethod
+    def _new(cls, coord: str, index: int, board: 'Board') -> 'Square':
+        """Create an empty Square without validating the already known coordinate."""
+        square = cls.__new__(cls)
+        square.coord = coord
+        square.index = index
+        square._piece = None
+        square.board = board
+        return square
+
     def __eq__(self, other: Any) -> bool:
         if not isinstance(other, self.__class__):
             return NotImplemented
         return self.coord == other.coord
         
     def __getitem__(self, direction: str) -> Optional['Square']:
-        return self._adjacent[direction]
-    
-    def __setitem__(self, direction: str, val: Optional['Square']) -> None:
-        self._adjacent[direction] = val
+        index = ADJACENT[self.index][direction]
+        if index is None:
+            return None
+        return self.board[index]
         
     def __repr__(self) -> str:
         return f"{self.__class__.__name__}({self.coord!r})"
@@ -52,9 +109,17 @@ class Square:
     def piece(self, piece: 'Piece') -> None:
         """This allows the Square.piece and the corresponding Piece.square attributes to always be in sync."""
         
+        old = self._piece
         self._piece = piece
         if piece:
             piece.square = self
+        board = self.board
+        if board is not None:
+            # The position changed, so the cached position key of the Board is stale.
+            board._key = None
+            if board._accumulator is not None and piece is not old:
+                # Only the first piece of the square matters, the evaluation compares it to the final one.
+                board._accumulator.changed.setdefault(self.index, old)
     
     @property
     def file(self) -> str:
@@ -0,0 +1,638 @@
+"""Endgame tablebases for small piece sets, generated by retrograde analysis.
+
+A table holds the result of every position of one material, e.g. "KQK", "KPK" or "KBNK", with perfect play.
+Positions are indexed perfectly: the square of the white King, folded by the symmetries of the board into
+10 squares (or 4 files of 32 squares with pawns), and then the squares of the other pieces and the side to move.
+Every position is one byte:
+
+    0         a draw
+    1-254     the side to move mates (odd) or gets mated (even) in byte - 1 plies
+    255       an illegal or folded away position
+
+The generation counts the distinct successors of every position, and then walks backwards from the mates
+one ply at a time with un-moves, like in "Retrograde analysis of certain endgames" by Ken Thompson.
+Captures and promotions lead into the tables of smaller materials, which are generated first.
+Both the initial pass and the un-move generation are split between processes.
+
+The tables don't know about castling, en passant or the fifty move rule, and `Tablebases.probe` returns None
+for positions where castling or en passant is possible.
+
+    python3 tablebase.py KQK KRK KPK KBNK --directory tables
+"""
+
+import argparse
+import mmap
+import multiprocessing
+import os
+import re
+import struct
+from array import array
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Pattern, Sequence, Set, Tuple
+
+from game import Game
+from square import KNIGHT_JUMPS, RAYS
+from utils import InvalidMoveError
+
+MAX_PIECES: int = 4
+DRAW: int = 0
+ILLEGAL: int = 255
+
+_HEADER: struct.Struct = struct.Struct("<4sHH8s")
+_MAGIC: bytes = b"PYTB"
+_VERSION: int = 1
+_MATERIAL: Pattern = re.compile(r"^K[QRBNP]*K[QRBNP]*$")
+_ORDER: str = "QRBNP"
+_VALUES: Dict[str, int] = {"Q": 9, "R": 5, "B": 3, "N": 3, "P": 1}
+_LETTERS: Dict[str, str] = {"King": "K", "Queen": "Q", "Rook": "R", "Bishop": "B", "Knight": "N", "Pawn": "P"}
+_PROMOTIONS: str = "QRBN"
+# Sentinel move count of a position that can convert into a win or a draw, so it can never be lost.
+_ESCAPE: int = 255
+WHITE: int = 0
+BLACK: int = 1
+
+
+def _transform(index: int, flip_file: bool, flip_rank: bool, transpose: bool) -> int:
+    x, y = index % 8, index // 8
+    if transpose:
+        x, y = y, x
+    if flip_file:
+        x = 7 - x
+    if flip_rank:
+        y = 7 - y
+    return x + 8 * y
+
+
+# The 8 symmetries of the board without pawns, and the 2 of the left-right mirror with them.
+_SYMMETRIES: Tuple[Tuple[int, ...], ...] = tuple(
+    tuple(_transform(i, flip_file, flip_rank, transpose) for i in range(64))
+    for transpose in (False, True) for flip_rank in (False, True) for flip_file in (False, True)
+)
+_MIRRORS: Tuple[Tuple[int, ...], ...] = _SYMMETRIES[:2]
+# The white King squares left after folding: the a1-d1-d4 triangle, or the a-d files with pawns.
+_TRIANGLE: Tuple[int, ...] = (0, 1, 2, 3, 9, 10, 11, 18, 19, 27)
+_HALF: Tuple[int, ...] = tuple(x + 8 * y for y in range(8) for x in range(4))
+
+_KING_STEPS: Tuple[Tuple[int, ...], ...] = tuple(
+    tuple(ray[0] for ray in RAYS[i].values() if ray) for i in range(64)
+)
+_KNIGHT_SETS: Tuple[Set[int], ...] = tuple(set(jumps) for jumps in KNIGHT_JUMPS)
+_KING_SETS: Tuple[Set[int], ...] = tuple(set(steps) for steps in _KING_STEPS)
+_PAWN_ATTACKS: Tuple[Tuple[Set[int], ...], ...] = tuple(
+    tuple(set(ray[0] for direction, ray in RAYS[i].items() if ray and direction in diagonals) for i in range(64))
+    for diagonals in (("ne", "nw"), ("se", "sw"))
+)
+_SLIDES: Dict[str, Tuple[str, ...]] = {
+    "Q": ("n", "e", "s", "w", "ne", "se", "sw", "nw"),
+    "R": ("n", "e", "s", "w"),
+    "B": ("ne", "se", "sw", "nw"),
+}
+# The direction from the first index to the second one, for squares on the same line.
+_LINES: Tuple[Dict[int, str], ...] = tuple(
+    {square: direction for direction, ray in RAYS[i].items() for square in ray} for i in range(64)
+)
+
+
+class ProbeResult(NamedTuple):
+    wdl: int  # 1 when the side to move wins, 0 for a draw and -1 when it loses.
+    plies: Optional[int]  # Plies until mate with perfect play, None for a draw.
+
+
+def material_of(white: str, black: str) -> Tuple[str, bool]:
+    """Return the table name of the pieces like "KQ" and "K", and whether the colors are swapped in the table.
+
+    The stronger side is white in the tables, so e.g. the "K" against "KR" positions are in the "KRK" table.
+    """
+    white = "K" + "".join(sorted(white.replace("K", ""), key=_ORDER.index))
+    black = "K" + "".join(sorted(black.replace("K", ""), key=_ORDER.index))
+    if (sum(map(_VALUES.get, black[1:])), black) > (sum(map(_VALUES.get, white[1:])), white):
+        return black + white, True
+    return white + black, False
+
+
+class _Layout:
+    """The perfect index of the positions of one material."""
+
+    def __init__(self, name: str) -> None:
+        if not re.match(_MATERIAL, name) or len(name) > MAX_PIECES:
+            raise ValueError(f"Invalid material: {name!r}")
+        if material_of(*_split(name)) != (name, False):
+            raise ValueError(f"Not a table name, the stronger side comes first like in {material_of(*_split(name))[0]!r}")
+        self.name: str = name
+        white, black = _split(name)
+        # The Kings first, then the other pieces of white and black.
+        self.types: Tuple[str, ...] = ("K", "K") + tuple(white[1:]) + tuple(black[1:])
+        self.sides: Tuple[int, ...] = (WHITE, BLACK) + (WHITE,) * (len(white) - 1) + (BLACK,) * (len(black) - 1)
+        self.pawns: bool = "P" in name
+        self.king_squares: Tuple[int, ...] = _HALF if self.pawns else _TRIANGLE
+        self._king_slots: Dict[int, int] = {square: slot for slot, square in enumerate(self.king_squares)}
+        symmetries = _MIRRORS if self.pawns else _SYMMETRIES
+        # The symmetries that bring a white King on the square into the folded squares, with the slot it lands on.
+        self._symmetries: Tuple[Tuple[Tuple[Tuple[int, ...], int], ...], ...] = tuple(
+            tuple((symmetry, self._king_slots[symmetry[square]])
+                  for symmetry in symmetries if symmetry[square] in self._king_slots)
+            for square in range(64)
+        )
+        # Slices of identical pieces, whose squares are kept sorted.
+        self._runs: List[Tuple[int, int]] = []
+        start = 2
+        for i in range(3, len(self.types) + 1):
+            if i == len(self.types) or (self.types[i], self.sides[i]) != (self.types[start], self.sides[start]):
+                if i - start > 1:
+                    self._runs.append((start, i))
+                start = i
+        # The amount of indices with the same white King square.
+        self.stride: int = 64 ** (len(self.types) - 1) * 2
+        self.size: int = len(self.king_squares) * self.stride
+
+    def index(self, squares: Sequence[int], to_move: int) -> int:
+        """Return the index of the position, the smallest one of all its symmetric images."""
+        best = -1
+        for symmetry, index in self._symmetries[squares[0]]:
+            if self._runs:
+                mapped = [symmetry[square] for square in squares]
+                for start, end in self._runs:
+                    mapped[start:end] = sorted(mapped[start:end])
+                for square in mapped[1:]:
+                    index = index * 64 + square
+            else:
+                for square in squares[1:]:
+                    index = index * 64 + symmetry[square]
+            index = index * 2 + to_move
+            if best < 0 or index < best:
+                best = index
+        return best
+
+    def locate(self, pieces: Iterable[Tuple[int, str, int]], to_move: int, flipped: bool) -> int:
+        """Return the index of the position with the (side, type, square) pieces, see `material_of` for `flipped`."""
+        if flipped:
+            pieces = [(1 - side, kind, square ^ 56) for side, kind, square in pieces]
+            to_move = 1 - to_move
+        squares = [0] * len(self.types)
+        # The next slot of each kind of piece, the Kings are always in the first two.
+        slots = {(WHITE, "K"): WHITE, (BLACK, "K"): BLACK}
+        for i in range(len(self.types) - 1, 1, -1):
+            slots[(self.sides[i], self.types[i])] = i
+        for side, kind, square in pieces:
+            slot = slots[(side, kind)]
+            squares[slot] = square
+            slots[(side, kind)] = slot + 1
+        return self.index(squares, to_move)
+
+    def decode(self, index: int) -> Tuple[List[int], int]:
+        index, to_move = divmod(index, 2)
+        squares = []
+        for _ in range(len(self.types) - 1):
+            index, square = divmod(index, 64)
+            squares.append(square)
+        squares.append(self.king_squares[index])
+        squares.reverse()
+        return squares, to_move
+
+
+class Tablebase:
+    """One generated table, mapped into memory. Probing a position is a single lookup in it."""
+
+    def __init__(self, path: str) -> None:
+        self.path: str = path
+        with open(path, "rb") as f:
+            self._mmap: mmap.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, _, name = _HEADER.unpack_from(self._mmap)
+        if magic != _MAGIC or version != _VERSION:
+            self.close()
+            raise ValueError(f"Not a version {_VERSION} tablebase: {path}")
+        self.layout: _Layout = _Layout(name.rstrip(b"\0").decode())
+        self.name: str = self.layout.name
+
+    def close(self) -> None:
+        self._mmap.close()
+
+    def value(self, index: int) -> int:
+        return self._mmap[_HEADER.size + index]
+
+
+class Tablebases:
+    """The tables in a directory, opened when they are first needed."""
+
+    def __init__(self, directory: str) -> None:
+        self.directory: str = directory
+        self._tables: Dict[str, Optional[Tablebase]] = {}
+
+    def close(self) -> None:
+        for table in self._tables.values():
+            if table is not None:
+                table.close()
+        self._tables.clear()
+
+    def table(self, name: str) -> Optional[Tablebase]:
+        if name not in self._tables:
+            path = _path(self.directory, name)
+            self._tables[name] = Tablebase(path) if os.path.exists(path) else None
+        return self._tables[name]
+
+    def probe(self, game: Game) -> Optional[ProbeResult]:
+        """Return the result of the position of the Game with perfect play, None if it isn't in the tables."""
+        player = game.current_player
+        if player.promotion:
+            return None
+        pieces = []
+        unmoved = set()
+        for square in game.iter_squares():
+            piece = square.piece
+            if piece:
+                kind = _LETTERS[piece.__class__.__name__]
+                side = WHITE if piece.color == game.white.color else BLACK
+                pieces.append((side, kind, square.index))
+                if not piece.moved and kind in "KR":
+                    unmoved.add((side, kind))
+        if len(pieces) > MAX_PIECES:
+            return None
+        if any((side, "K") in unmoved and (side, "R") in unmoved for side in (WHITE, BLACK)):
+            # Castling might be possible.
+            return None
+        to_move = WHITE if player.color == game.white.color else BLACK
+        if len(pieces) == 2:
+            return ProbeResult(0, None)
+        white = "".join(kind for side, kind, _ in pieces if side == WHITE)
+        black = "".join(kind for side, kind, _ in pieces if side == BLACK)
+        if game._board.en_passant and "P" in white and "P" in black:
+            return None
+        name, flipped = material_of(white, black)
+        table = self.table(name)
+        if table is None:
+            return None
+        return _result(table.value(table.layout.locate(pieces, to_move, flipped)))
+
+    def best_move(self, game: Game) -> Optional[int]:
+        """Return a packed move that keeps the best result of the position with perfect play, see `move.pack`.
+
+        A won position is mated as fast as possible, and a lost one is defended for as long as possible.
+        Returns None when the position or some position after a move isn't in the tables.
+        """
+        best = None
+        best_key = None
+        for move in game.current_player.legal_move_codes():
+            child = game.copy()
+            child.apply_moves((move,), validate=False)
+            result = self.probe(child)
+            if result is None:
+                return None
+            # The result of the opponent: a loss of theirs in few plies is the best, a win in few plies the worst.
+            if result.wdl < 0:
+                key = (2, -result.plies)
+            elif result.wdl == 0:
+                key = (1, 0)
+            else:
+                key = (0, result.plies)
+            if best_key is None or key > best_key:
+                best, best_key = move, key
+        return best
+
+
+def generate(name: str, directory: str = ".", processes: Optional[int] = None) -> str:
+    """Generate the table of the material, and those of the smaller materials it can turn into, and return its path.
+
+    Tables that already exist in the directory are not generated again.
+    """
+    path = _path(directory, name)
+    if os.path.exists(path):
+        return path
+    layout = _Layout(name)
+    for sub in _subtables(name):
+        generate(sub, directory, processes)
+    processes = processes or os.cpu_count() or 1
+
+    result = bytearray(layout.size)
+    counts = bytearray(layout.size)
+    # The longest lost conversion of a position, which delays its loss.
+    conversion_loss = bytearray(layout.size)
+    buckets: Dict[int, array] = {}
+    with _Workers(name, directory, processes) as workers:
+        for slot, values, slot_counts, slot_losses, decided in workers.map(_initialise, range(len(layout.king_squares))):
+            start = slot * layout.stride
+            result[start:start + layout.stride] = values
+            counts[start:start + layout.stride] = slot_counts
+            conversion_loss[start:start + layout.stride] = slot_losses
+            for i in range(0, len(decided), 2):
+                buckets.setdefault(decided[i + 1], array("I")).append(decided[i])
+
+        plies = 0
+        while buckets:
+            frontier = array("I")
+            for index in buckets.pop(plies, ()):
+                if not result[index]:
+                    result[index] = plies + 1
+                    frontier.append(index)
+            if frontier and plies + 1 >= ILLEGAL:
+                raise ValueError(f"Distance to mate of {name} doesn't fit in the table")
+            chunks = [frontier[i:i + 4096] for i in range(0, len(frontier), 4096)]
+            for predecessors in workers.map(_predecessors, chunks):
+                for index in predecessors:
+                    if result[index]:
+                        continue
+                    if plies % 2 == 0:
+                        # A move into a lost position wins.
+                        buckets.setdefault(plies + 1, array("I")).append(index)
+                    elif counts[index] != _ESCAPE:
+                        counts[index] -= 1
+                        if not counts[index]:
+                            # Every move leads into a won position of the opponent, so the longest one is the best.
+                            buckets.setdefault(max(plies + 1, conversion_loss[index]), array("I")).append(index)
+            plies += 1
+
+    os.makedirs(directory, exist_ok=True)
+    temporary = path + ".tmp"
+    with open(temporary, "wb") as f:
+        f.write(_HEADER.pack(_MAGIC, _VERSION, 0, name.encode()))
+        f.write(result)
+    os.replace(temporary, path)
+    return path
+
+
+class _Workers:
+    """Maps functions over the tasks in a process pool, or in this process when there is a single process."""
+
+    def __init__(self, name: str, directory: str, processes: int) -> None:
+        self._pool = multiprocessing.Pool(processes, _start_worker, (name, directory)) if processes > 1 else None
+        if self._pool is None:
+            _start_worker(name, directory)
+
+    def __enter__(self) -> '_Workers':
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+        else:
+            _tables.close()
+
+    def map(self, func: Callable, tasks: Iterable) -> Iterator:
+        if self._pool is None:
+            return map(func, tasks)
+        return self._pool.imap(func, tasks)
+
+
+# The state of a worker process, set by `_start_worker`.
+_layout: Optional[_Layout] = None
+_tables: Optional[Tablebases] = None
+
+
+def _start_worker(name: str, directory: str) -> None:
+    global _layout, _tables
+    _layout = _Layout(name)
+    _tables = Tablebases(directory)
+
+
+def _initialise(slot: int) -> Tuple[int, bytes, bytes, bytes, array]:
+    """Return the initial state of the positions with the white King on the slot.
+
+    That is their values (only the illegal ones are known), the amounts of their distinct successors in
+    the table, their longest lost conversions, and the (index, plies) pairs of the decided positions.
+    """
+    layout = _layout
+    values = bytearray(layout.stride)
+    counts = bytearray(layout.stride)
+    losses = bytearray(layout.stride)
+    decided = array("I")
+    start = slot * layout.stride
+    for offset in range(layout.stride):
+        index = start + offset
+        values[offset], counts[offset], losses[offset], plies = _initial_state(index)
+        if plies is not None:
+            decided.extend((index, plies))
+    return slot, bytes(values), bytes(counts), bytes(losses), decided
+
+
+def _initial_state(index: int) -> Tuple[int, int, int, Optional[int]]:
+    """Return the initial value, successor count and longest lost conversion of the position,
+    and the plies to its result if that's already decided.
+    """
+    layout = _layout
+    squares, to_move = layout.decode(index)
+    if not _legal(layout, squares, to_move) or layout.index(squares, to_move) != index:
+        return ILLEGAL, 0, 0, None
+
+    children = set()
+    wins = []
+    loss = 0
+    escape = False
+    for child, captured, promotion in _moves(layout.types, layout.sides, squares, to_move):
+        if captured is None and promotion is None:
+            children.add(layout.index(child, 1 - to_move))
+            continue
+        result = _conversion(layout, child, to_move, captured, promotion)
+        if result.wdl < 0:
+            wins.append(result.plies + 1)
+        elif result.wdl > 0:
+            loss = max(loss, result.plies + 1)
+        else:
+            escape = True
+
+    if wins or escape:
+        # The position can't be lost, however its other moves turn out.
+        return DRAW, _ESCAPE, 0, min(wins) if wins else None
+    if not children:
+        if loss:
+            return DRAW, 0, loss, loss
+        if _attacked(layout.types, layout.sides, squares, squares[to_move], 1 - to_move):
+            # Checkmate.
+            return DRAW, 0, 0, 0
+        # Otherwise a stalemate, which stays a draw.
+    return DRAW, len(children), loss, None
+
+
+def _predecessors(frontier: Sequence[int]) -> array:
+    """Return the indices of the positions in the table, from which a move without a capture or a promotion
+    leads into a frontier position. A predecessor is listed once for every frontier position it leads into.
+    """
+    layout = _layout
+    rv = array("I")
+    for index in frontier:
+        squares, to_move = layout.decode(index)
+        mover = 1 - to_move
+        occupied = set(squares)
+        found = set()
+        for i, square in enumerate(squares):
+            if layout.sides[i] != mover:
+                continue
+            for fr in _unmoves(layout.types[i], mover, square, occupied):
+                before = list(squares)
+                before[i] = fr
+                found.add(layout.index(before, mover))
+        rv.extend(found)
+    return rv
+
+
+def _conversion(layout: _Layout, squares: List[int], to_move: int, captured: Optional[int],
+                promotion: Optional[Tuple[int, str]]) -> ProbeResult:
+    """Return the result of the position after a capture or a promotion, from the smaller table it's in."""
+    pieces = []
+    for i, square in enumerate(squares):
+        if i == captured:
+            continue
+        kind = promotion[1] if promotion is not None and promotion[0] == i else layout.types[i]
+        pieces.append((layout.sides[i], kind, square))
+    if len(pieces) == 2:
+        return ProbeResult(0, None)
+    white = "".join(kind for side, kind, _ in pieces if side == WHITE)
+    black = "".join(kind for side, kind, _ in pieces if side == BLACK)
+    name, flipped = material_of(white, black)
+    table = _tables.table(name)
+    return _result(table.value(table.layout.locate(pieces, 1 - to_move, flipped)))
+
+
+def _result(value: int) -> ProbeResult:
+    if value == DRAW:
+        return ProbeResult(0, None)
+    if value == ILLEGAL:
+        raise InvalidMoveError("Illegal position")
+    plies = value - 1
+    return ProbeResult(1 if plies % 2 else -1, plies)
+
+
+def _legal(layout: _Layout, squares: List[int], to_move: int) -> bool:
+    if len(set(squares)) != len(squares):
+        return False
+    for kind, square in zip(layout.types, squares):
+        if kind == "P" and not 8 <= square < 56:
+            return False
+    # The side that just moved can't be in check.
+    return not _attacked(layout.types, layout.sides, squares, squares[1 - to_move], to_move)
+
+
+def _attacked(types: Sequence[str], sides: Sequence[int], squares: Sequence[int], target: int, by: int,
+              captured: Optional[int] = None) -> bool:
+    """Return whether a piece of the side `by` attacks the target square."""
+    occupied = set(squares)
+    for i, square in enumerate(squares):
+        if sides[i] != by or i == captured:
+            continue
+        kind = types[i]
+        if kind == "K":
+            if target in _KING_SETS[square]:
+                return True
+        elif kind == "N":
+            if target in _KNIGHT_SETS[square]:
+                return True
+        elif kind == "P":
+            if target in _PAWN_ATTACKS[by][square]:
+                return True
+        else:
+            direction = _LINES[square].get(target)
+            if direction is None or direction not in _SLIDES[kind]:
+                continue
+            for between in RAYS[square][direction]:
+                if between == target:
+                    return True
+                if between in occupied:
+                    break
+    return False
+
+
+def _moves(types: Sequence[str], sides: Sequence[int], squares: List[int],
+           to_move: int) -> Iterator[Tuple[List[int], Optional[int], Optional[Tuple[int, str]]]]:
+    """Yield the squares after each legal move, the captured piece and the (piece, new type) of a promotion."""
+    owner = {square: i for i, square in enumerate(squares)}
+    for i, fr in enumerate(squares):
+        if sides[i] != to_move:
+            continue
+        for to in _targets(types[i], to_move, fr, owner):
+            captured = owner.get(to)
+            if captured is not None and sides[captured] == to_move:
+                continue
+            child = list(squares)
+            child[i] = to
+            if captured is not None:
+                # The captured piece is left out of the attack test, its square is the capturer's now.
+                child[captured] = to
+            king = child[to_move]
+            if _attacked(types, sides, child, king, 1 - to_move, captured):
+                continue
+            if types[i] == "P" and not 8 <= to < 56:
+                for kind in _PROMOTIONS:
+                    yield child, captured, (i, kind)
+            else:
+                yield child, captured, None
+
+
+def _targets(kind: str, side: int, fr: int, owner: Dict[int, int]) -> Iterator[int]:
+    """Yield the squares the piece can move to, with the own pieces on them too."""
+    if kind == "K":
+        yield from _KING_STEPS[fr]
+    elif kind == "N":
+        yield from KNIGHT_JUMPS[fr]
+    elif kind == "P":
+        step = 8 if side == WHITE else -8
+        if fr + step not in owner:
+            yield fr + step
+            if (fr // 8 == 1 if side == WHITE else fr // 8 == 6) and fr + 2 * step not in owner:
+                yield fr + 2 * step
+        for to in _PAWN_ATTACKS[side][fr]:
+            if to in owner:
+                yield to
+    else:
+        for direction in _SLIDES[kind]:
+            for to in RAYS[fr][direction]:
+                yield to
+                if to in owner:
+                    break
+
+
+def _unmoves(kind: str, side: int, to: int, occupied: Set[int]) -> Iterator[int]:
+    """Yield the squares the piece could have come from, with a move that didn't capture or promote."""
+    if kind == "P":
+        step = -8 if side == WHITE else 8
+        fr = to + step
+        if fr in occupied or not 8 <= fr < 56:
+            return
+        yield fr
+        if (to // 8 == 3 if side == WHITE else to // 8 == 4) and fr + step not in occupied:
+            yield fr + step
+    elif kind in "KN":
+        for fr in (_KING_STEPS if kind == "K" else KNIGHT_JUMPS)[to]:
+            if fr not in occupied:
+                yield fr
+    else:
+        for direction in _SLIDES[kind]:
+            for fr in RAYS[to][direction]:
+                if fr in occupied:
+                    break
+                yield fr
+
+
+def _subtables(name: str) -> List[str]:
+    """Return the tables that a capture or a promotion can lead into from the material."""
+    white, black = _split(name)
+    rv = []
+    for side, other in ((white, black), (black, white)):
+        for i in range(1, len(side)):
+            rest = side[:i] + side[i + 1:]
+            if len(rest) + len(other) > 2:
+                rv.append(material_of(rest, other)[0])
+            if side[i] == "P":
+                rv.extend(material_of(rest + kind, other)[0] for kind in _PROMOTIONS)
+    return sorted(set(rv), key=rv.index)
+
+
+def _split(name: str) -> Tuple[str, str]:
+    second = name.index("K", 1)
+    return name[:second], name[second:]
+
+
+def _path(directory: str, name: str) -> str:
+    return os.path.join(directory, name + ".tb")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Generate endgame tablebases.")
+    parser.add_argument("materials", nargs="+", help='materials like "KQK" or "KBNK", the stronger side first')
+    parser.add_argument("--directory", default="tables")
+    parser.add_argument("--processes", type=int, default=None)
+    args = parser.parse_args()
+
+    for name in args.materials:
+        print(generate(name, args.directory, args.processes))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,49 @@
 # Can't use unittest or pytest on Pythonista, because they had some import problems.
 # Thus have to do the testing as a normal python script.
 
+from array import array
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
 from contextlib import contextmanager
 from functools import wraps
 
+from archive import Archive, ArchiveWriter, build
+import benchmark
 from bishop import Bishop
-from board import Board
+import book
+from board import Board, encode_piece
+from clock_manager import ClockManager
 from color import Color
+from engine import Engine
+import features
 from game import Game
+from game_record import GameRecord
+from journal import Journal
+import instrumentation
 from king import King
 from knight import Knight
+from move_cache import LEGAL_MOVES, MoveCache
+import move
+import nnue
 from pawn import Pawn
+import pgn
+from player import Player
+from position import Position
+from position_index import PositionIndex
 from queen import Queen
 from rook import Rook
-from utils import coord_to_idx, idx_to_coord, InvalidMoveError
+from server import ChessServer
+import tablebase
+from time_control import TimeControl
+from time_manager import TimeManager
+import tournament
+from utils import coord_to_idx, coord_to_index, idx_to_coord, COORDS, InvalidMoveError
 
 
 def log(func):
@@ -74,15 +104,21 @@ def test_player_taken_pieces():
     game = Game()
     
     player = game.current_player
-    game._board["a7"].piece = None
-    game._board["b7"].piece = None
-    game._board["c7"].piece = None
-    game._board["a8"].piece = None
-    game._board["b8"].piece = None
-    game._board["h8"].piece = None
-    game._board["c8"].piece = None
+    player.move("e2", "e3")
+    player.move("d1", "h5")
+    player.move("h5", "h7")
+    player.move("h7", "h8")
+    player.move("h8", "g8")
+    player.move("g8", "f8")
+    player.move("f8", "f7")
+    player.move("f7", "e7")
     
-    assert player.taken_pieces == [Rook(Color.BLACK), Rook(Color.BLACK), Bishop(Color.BLACK), Knight(Color.BLACK), Pawn(Color.BLACK), Pawn(Color.BLACK), Pawn(Color.BLACK)]
+    assert player.taken_pieces == [Rook(Color.BLACK), Bishop(Color.BLACK), Knight(Color.BLACK), Pawn(Color.BLACK), Pawn(Color.BLACK), Pawn(Color.BLACK)]
+    assert player.opponent.taken_pieces == []
+    player.taken_pieces.clear()
+    assert len(player.taken_pieces) == 6
+    assert player.value_diff() == 14
+    assert player.opponent.value_diff() == -14
 
 
 @log
@@ -169,6 +205,7 @@ def test_correct_enpassant():
     player = game.next_player()
     player.move("b5", "c6")
     assert game._board["c5"].piece is None
+    assert player.taken_pieces == [Pawn(Color.BLACK)]
     
     # Test that can en passant to escape a check.
     game = Game()
@@ -231,6 +268,1121 @@ def test_invalid_enpassant():
         player.move("e5", "f6")
     
 
+@log
+def test_en_passant_target():
+    game = Game()
+    
+    player = game.current_player
+    player.move("e2", "e4")
+    assert game._board.en_passant is game._board["e3"]
+    assert game._board.en_passant_color == Color.WHITE
+    
+    player = game.next_player()
+    assert game._board.en_passant is game._board["e3"]
+    player.move("d7", "d6")
+    
+    player = game.next_player()
+    assert game._board.en_passant is None
+    assert game._board.en_passant_color is None
+
+
+@log
+def test_position_key():
+    game1 = Game()
+    game2 = Game()
+    assert game1.position_key() == game2.position_key()
+    
+    # Transposing into the same position gives the same key.
+    game1.current_player.move("g1", "f3")
+    game1.next_player().move("g8", "f6")
+    game1.next_player().move("b1", "c3")
+    game2.current_player.move("b1", "c3")
+    game2.next_player().move("g8", "f6")
+    game2.next_player().move("g1", "f3")
+    assert game1.position_key() == game2.position_key()
+    
+    # So is the side to move.
+    game1.next_player()
+    assert game1.position_key() != game2.position_key()
+    
+    # The en passant target is part of the position, when a Pawn can capture there.
+    game1 = Game()
+    game2 = Game()
+    game1.apply_moves(["e2e4", "a7a6", "e4e5", "d7d5"])
+    game2.apply_moves(["e2e4", "a7a6", "e4e5", "d7d6"])
+    game2.current_player.opponent.move("d6", "d5")
+    assert game1.position_key() != game2.position_key()
+    game1._board.clear_en_passant()
+    assert game1.position_key() == game2.position_key()
+    
+    # Otherwise a double move transposes into the same position as any other move order.
+    game1 = Game()
+    game2 = Game()
+    game1.apply_moves(["e2e4", "e7e5", "g1f3"])
+    game2.apply_moves(["g1f3", "e7e5", "e2e4"])
+    assert game2._board.en_passant is not None
+    assert game1.position_key() == game2.position_key()
+    
+
+@log
+def test_game_copy():
+    game = Game()
+    game.current_player.move("e2", "e4")
+    game.next_player()
+    
+    copied = game.copy()
+    assert str(copied) == str(game)
+    assert copied.position_key() == game.position_key()
+    assert copied.current_player.color == Color.BLACK
+    
+    copied.current_player.move("d7", "d5")
+    copied.next_player().move("e4", "d5")
+    assert isinstance(game._board["d7"].piece, Pawn)
+    assert game._board["d5"].piece is None
+    assert copied.white.taken_pieces == [Pawn(Color.BLACK)]
+    assert game.white.taken_pieces == []
+    assert copied._board["d5"].piece.square is copied._board["d5"]
+    assert copied._board["d5"].w is copied._board["c5"]
+
+
+@log
+def test_new_game_from_template():
+    played = Game()
+    played.current_player.move("e2", "e4")
+    played.next_player().move("d7", "d5")
+    played.next_player().move("e4", "d5")
+    
+    game = Game(TimeControl(60, 1))
+    assert str(game) == str(Board())
+    assert game.position_key() == Game().position_key() != played.position_key()
+    assert game.white.material == game.black.material == 39
+    assert game.white.taken_pieces == [] and game.white.taken_pieces is not Game().white.taken_pieces
+    assert game.white.read_clock() == game.black.read_clock() == 60
+    assert Game().white.time_control is None
+    assert game._board["e1"].piece.square is game._board["e1"]
+    assert game._board["e1"].piece is not Game()._board["e1"].piece
+    
+    game.current_player.move("e2", "e4")
+    assert isinstance(Game()._board["e2"].piece, Pawn)
+
+
+@log
+def test_index_lookup():
+    game = Game()
+    board = game._board
+    assert board[0] is board["a1"] and board[28] is board["e4"] and board[63] is board["h8"]
+    for bad in (64, -1, "i1", "a9"):
+        try:
+            board[bad]
+        except KeyError:
+            pass
+        else:
+            assert False, bad
+    
+    player = game.current_player
+    assert [move.square.coord for move in player.allowed_moves(12)] == [move.square.coord for move in player.allowed_moves("e2")]
+    player.move(12, 28)
+    assert isinstance(board["e4"].piece, Pawn) and board.en_passant is board["e3"]
+    game.next_player().move("d7", 35)
+    game.next_player().move(28, "d5")
+    assert game.white.taken_pieces == [Pawn(Color.BLACK)]
+    
+    try:
+        game.next_player().move(62, 62 + 8)
+    except InvalidMoveError:
+        pass
+    else:
+        assert False
+
+
+@log
+def test_position_snapshot():
+    game = Game()
+    board = game._board
+    # Nested iteration over the same Board.
+    assert sum(1 for _ in board for _ in board) == 64 * 64
+    assert len([square for square in board if any(square is other for other in board)]) == 64
+    
+    game.current_player.move("e2", "e4")
+    game.next_player()
+    position = game.position()
+    assert position.to_move == Color.BLACK and position.key == game.position_key()
+    assert position.piece_at("e4") == Pawn(Color.WHITE) and position.piece_at(12) is None
+    assert len(list(position.pieces())) == 32
+    assert str(position) == str(game)
+    
+    # The snapshot doesn't change with the game, and the game doesn't change with the analysis copy.
+    game.current_player.move("d7", "d5")
+    assert position.piece_at("d7") == Pawn(Color.BLACK) and position.key != game.position_key()
+    analysis = Game.from_position(position)
+    assert analysis.position() == position
+    analysis.current_player.move("e7", "e5")
+    assert isinstance(game._board["e7"].piece, Pawn)
+    
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(Engine().search(Game.from_position(position), depth=1)))
+               for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len({result.move for result in results}) == 1
+
+
+@log
+def test_legal_move_cache():
+    cache = MoveCache(maxsize=2)
+    cache.put(1, array("H", [1]))
+    cache.put(2, array("H", [2]))
+    assert cache.get(1) == array("H", [1])
+    cache.put(3, array("H", [3]))
+    # 2 was the least recently used.
+    assert cache.get(2) is None and len(cache) == 2
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+    
+    LEGAL_MOVES.clear()
+    game = Game()
+    player = game.current_player
+    assert len(player.legal_move_codes()) == 20
+    assert len(player.legal_move_codes()) == 20
+    assert [move.square.coord for move in player.allowed_moves("g1")] == ["h3", "f3"]
+    assert [move.square.coord for move in player.allowed_moves("g1")] == ["h3", "f3"]
+    assert LEGAL_MOVES.stats()["hits"] == 2 and LEGAL_MOVES.stats()["misses"] == 2
+    
+    # The same position in another Game is served from the cache, and the cached moves are on that Game's Board.
+    other = Game()
+    assert len(other.current_player.legal_move_codes()) == 20
+    assert next(other.current_player.allowed_moves("g1")).square is other._board["h3"]
+    assert LEGAL_MOVES.hits == 4
+    
+    player.move("g1", "f3")
+    assert len(list(player.allowed_moves("f3"))) == 5
+    black = game.next_player()
+    assert not list(black.allowed_moves("e8"))
+    black.move("e7", "e5")
+    assert [move.square.coord for move in black.allowed_moves("e8")] == ["e7"]
+    
+    game = Game()
+    game._board["a8"].piece = None
+    game._board["a7"].piece = None
+    player = game.current_player
+    for fr, to in (("a2", "a4"), ("a4", "a5"), ("a5", "a6"), ("a6", "a7"), ("a7", "a8")):
+        player.move(fr, to)
+    assert not any(move.from_index(code) == 56 for code in player.legal_move_codes())
+    player.promote("queen")
+    assert len([code for code in player.legal_move_codes() if move.from_index(code) == 56]) == 8
+
+
+@log
+def test_apply_moves():
+    moves = ["e2e4", "d7d5", "e4d5", "c7c5", "d5c6", "g8f6", "c6b7", "e7e6", "b7a8q", "f8e7", "g1f3", "e8g8"]
+    played = Game()
+    for uci in moves:
+        player = played.current_player
+        player.move(uci[:2], uci[2:4])
+        if player.promotion:
+            player.promote("queen")
+        played.next_player()
+    
+    for validate in (True, False, "end"):
+        game = Game()
+        game.apply_moves(moves, validate=validate)
+        assert str(game) == str(played) and game.position_key() == played.position_key()
+        assert game.current_player.color == Color.WHITE and game.started
+        assert game.white.taken_pieces == played.white.taken_pieces
+        assert game.white.material == played.white.material
+    
+    # Packed moves work too, with or without their flags.
+    game = Game()
+    game.apply_moves([move.from_uci(uci) for uci in moves[:6]], validate=False)
+    game.apply_moves([game.current_player.legal_move_code("c6b7")])
+    assert isinstance(game._board["b7"].piece, Pawn) and game.white.taken_pieces == [Pawn(Color.BLACK)] * 3
+    
+    # Moving through a piece is caught by both validating modes, but only after the legal moves before it.
+    for validate in (True, "end"):
+        game = Game()
+        with assert_raises(InvalidMoveError):
+            game.apply_moves(["e2e4", "e7e5", "d1d8"], validate=validate)
+        assert isinstance(game._board["e4"].piece, Pawn) and isinstance(game._board["d1"].piece, Queen)
+    
+    # Exposing the King is caught before the move, or right after it.
+    ignores_check = ["e2e4", "f7f6", "d1h5", "g8h6"]
+    with assert_raises(InvalidMoveError):
+        Game().apply_moves(ignores_check)
+    with assert_raises(InvalidMoveError):
+        Game().apply_moves(ignores_check, validate="end")
+    with assert_raises(InvalidMoveError):
+        Game().apply_moves(["e2e4", "e7e5", "e1e3"], validate="end")
+    # Also when the game goes on after it, and when the King castles through an attacked square.
+    for illegal in (["e2e4", "f7f6", "d1h5", "a7a6", "g1f3"], ["e2e4", "b7b6", "g1f3", "c8a6", "f1c4", "a6c4", "e1g1"]):
+        for validate in (True, "end"):
+            with assert_raises(InvalidMoveError):
+                Game().apply_moves(illegal, validate=validate)
+    with assert_raises(InvalidMoveError):
+        Game().apply_moves(["e2e4", "e7e5x"])
+    for validate in ("later", 1, 0):
+        with assert_raises(ValueError):
+            Game().apply_moves([], validate=validate)
+    
+    # The clocks switch once for the whole sequence.
+    game = Game(TimeControl(60, increment=1))
+    game.apply_moves(moves[:4])
+    assert game.white._running and not game.black._running
+    assert 59.9 < game.white.read_clock() <= 60 and game.black.read_clock() == 60
+    game.apply_moves(moves[4:6])
+    assert 60.9 < game.white.read_clock() <= 61 and game.white._running
+    
+    # Nothing made, nothing switched: no increment, and the running clock keeps running.
+    game = Game(TimeControl(60, increment=5))
+    game.apply_moves(["e2e4"])
+    game.apply_moves([])
+    with assert_raises(InvalidMoveError):
+        game.apply_moves(["e7e4", "g1f3"])
+    with assert_raises(InvalidMoveError):
+        game.apply_moves(["e7e5x"])
+    assert game.current_player is game.black and game.black._running and not game.white._running
+    assert game.white.read_clock() == 60 and 59.9 < game.black.read_clock() <= 60
+
+
+@log
+def test_game_record():
+    moves = benchmark.REPLAY_100.split()
+    record = GameRecord.from_moves(moves, interval=8)
+    assert len(record) == 100 and record.moves == moves
+    assert len(record._checkpoints) == 100 // 8 + 1
+    
+    for ply in (0, 1, 7, 8, 9, 50, 99, 100):
+        expected = Game()
+        expected.apply_moves(moves[:ply])
+        game = record.seek(ply)
+        assert str(game) == str(expected) and game.position_key() == expected.position_key(), ply
+        assert game.white.taken_pieces == expected.white.taken_pieces
+    
+    # The Games returned by seek are independent of the record.
+    game = record.seek(100)
+    game.apply_moves(["h2h3"])
+    assert record.seek(100).position_key() != game.position_key()
+    
+    with assert_raises(IndexError):
+        record.seek(101)
+    with assert_raises(InvalidMoveError):
+        record.append("a1a8")
+    assert len(record) == 100
+    record.append("h2h3")
+    assert str(record.seek(101)) == str(game)
+
+
+@log
+def test_journal():
+    def play(game, journal, fr, to, promotion=None):
+        player = game.current_player
+        player.move(fr, to)
+        journal.move(coord_to_index(fr), coord_to_index(to))
+        if promotion:
+            player.promote(promotion)
+            journal.promotion(promotion)
+        game.next_player()
+        journal.turn()
+    
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "journal")
+        game = Game(TimeControl(60, increment=2))
+        game._board["a7"].piece = None
+        journal = Journal.create(path, game, compact_every=1000)
+        for fr, to in (("a2", "a4"), ("h7", "h6"), ("a4", "a5"), ("h6", "h5"), ("a5", "a6"), ("h5", "h4"), ("a6", "a7"),
+                       ("h4", "h3")):
+            play(game, journal, fr, to)
+        play(game, journal, "a7", "b8", "knight")
+        game.current_player.stop_clock()
+        journal.clocks()
+        size = os.path.getsize(path)
+        journal.close()
+        
+        resumed, journal = Journal.resume(path)
+        assert str(resumed) == str(game) and resumed.position_key() == game.position_key()
+        assert resumed.white.taken_pieces == [Knight(Color.BLACK)] and resumed.white.material == game.white.material
+        assert resumed.white.read_clock() == game.white.read_clock()
+        assert resumed.black.read_clock() == game.black.read_clock()
+        assert resumed.current_player.color == Color.BLACK and not resumed.current_player._running
+        
+        # A record cut short by a crash is dropped, and the move before the turn change is completed.
+        journal.move(coord_to_index("b7"), coord_to_index("b6"))
+        journal.close()
+        with open(path, "ab") as f:
+            f.write(b"\x04\x10\x00garbage")
+        resumed, journal = Journal.resume(path)
+        assert isinstance(resumed._board["b6"].piece, Pawn) and resumed.current_player.color == Color.WHITE
+        assert os.path.getsize(path) == size + 9
+        
+        # Compaction leaves only a snapshot, and resuming still gives the same game.
+        resumed.current_player.move("g1", "f3")
+        journal.move(coord_to_index("g1"), coord_to_index("f3"))
+        journal.compact_every = 1
+        resumed.next_player()
+        journal.turn()
+        assert os.path.getsize(path) < size
+        journal.close()
+        again, journal = Journal.resume(path)
+        journal.close()
+        assert str(again) == str(resumed) and again.position_key() == resumed.position_key()
+        assert again.white.taken_pieces == resumed.white.taken_pieces
+        
+        # The replay doesn't run the clocks, so a clock about to run out in the snapshot can't run out
+        # while the records after it are read, and the clocks end up with the last readings in the journal.
+        game = Game(TimeControl(60))
+        journal = Journal.create(path, game, compact_every=10000)
+        play(game, journal, "e2", "e4")
+        game.black._time_left = 0.001
+        journal.compact()
+        game.black.stop_clock()
+        game.black._time_left = 0.001
+        for _ in range(2000):
+            journal.clocks()
+        journal.move(coord_to_index("e7"), coord_to_index("e5"))
+        journal.turn()
+        journal.close()
+        resumed, journal = Journal.resume(path)
+        journal.close()
+        assert isinstance(resumed._board["e5"].piece, Pawn) and resumed.current_player.color == Color.WHITE
+        assert resumed.white.read_clock() == game.white.read_clock() == 60
+        assert resumed.black.read_clock() == 0.001
+        assert not resumed.white._running and not resumed.black._running
+
+
+@log
+def test_pgn():
+    text = """[Event "Test"]
+[Result "1-0"]
+
+1. e4 e5 2. Nf3 {comment (1. d4)} Nc6 3. Bb5 a6 (3... Nf6 4. O-O (4. d3) Nxe4) 4. Ba4 Nf6 5. O-O $1 Be7 ; rest
+6. Re1 b5 7. Bb3 d6 8. c3 O-O 9. h3 Na5 10. Bc2 c5 1-0
+
+[Event "Promotion"]
+
+1. h4 g5 2. hxg5 h6 3. gxh6 Bg7 4. hxg7 Nf6 5. gxh8=N Kf8 6. Rh7 a5 7. Rxf7+ Kg8 *
+"""
+    first, second = pgn.read_games(text.splitlines())
+    assert first.headers == {"Event": "Test", "Result": "1-0"} and first.result == "1-0"
+    assert [move.to_uci(code) for code in first.packed_moves()] == benchmark.MIDDLEGAME.split()
+    assert second.result == "*" and second.moves[8] == "gxh8=N"
+    assert move.to_uci(second.packed_moves()[8]) == "g7h8n"
+    
+    game = Game()
+    game.apply_moves(["g1f3", "a7a6", "b1c3", "a6a5", "c3e4", "a5a4"])
+    with assert_raises(InvalidMoveError):
+        pgn.san_to_move(game.current_player, "Ng5")
+    assert move.to_uci(pgn.san_to_move(game.current_player, "Nfg5")) == "f3g5"
+    assert move.to_uci(pgn.san_to_move(game.current_player, "Neg5+")) == "e4g5"
+    with assert_raises(InvalidMoveError):
+        pgn.san_to_move(game.current_player, "O-O")
+    with assert_raises(InvalidMoveError):
+        pgn.san_to_move(game.current_player, "Zz9")
+
+
+@log
+def test_archive():
+    games = [
+        (benchmark.MIDDLEGAME.split(), "1-0"),
+        (benchmark.REPLAY_100.split(), "*"),
+        ([], "1/2-1/2"),
+    ]
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "games.arc")
+        with ArchiveWriter(path) as writer:
+            for moves, result in games:
+                assert writer.add([move.from_uci(uci) for uci in moves], result) == len(writer) - 1
+        
+        with Archive(path) as archive:
+            assert len(archive) == 3
+            for game_id, (moves, result) in enumerate(games):
+                assert [move.to_uci(code) for code in archive.moves(game_id)] == moves
+                assert archive.result(game_id) == result
+                for ply in (0, len(moves) // 2, len(moves)):
+                    expected = Game()
+                    expected.apply_moves(moves[:ply])
+                    assert archive.game(game_id, ply).position_key() == expected.position_key()
+            assert str(archive.game(1)) == str(archive.game(1, 100))
+            with assert_raises(IndexError):
+                archive.game(3)
+            with assert_raises(IndexError):
+                archive.game(0, 21)
+        
+        pgn_text = "1. e4 e5 2. Qh5 Nc6 3. Bc4 Nf6 4. Qxf7# 1-0\n\n1. e4 e4 *\n\n1. d4 1/2-1/2\n"
+        assert build(path, pgn.read_games(pgn_text.splitlines())) == (2, 1)
+        with Archive(path) as archive:
+            assert len(archive) == 2 and archive.result(0) == "1-0" and archive.result(1) == "1/2-1/2"
+            player = archive.game(0).current_player
+            assert player.is_checked() and not player.legal_moves()
+        
+        with open(path, "r+b") as f:
+            f.write(b"XXXX")
+        with assert_raises(ValueError):
+            Archive(path)
+
+
+@log
+def test_position_index():
+    games = [benchmark.MIDDLEGAME.split(), benchmark.REPLAY_100.split(), ["e2e4", "e7e5", "g1f3", "g8f6"]]
+    with tempfile.TemporaryDirectory() as directory:
+        archive_path = os.path.join(directory, "games.arc")
+        index_path = os.path.join(directory, "games.idx")
+        for amount in (2, 3):
+            with ArchiveWriter(archive_path) as writer:
+                for moves in games[:amount]:
+                    writer.add([move.from_uci(uci) for uci in moves])
+            with Archive(archive_path) as archive, PositionIndex(index_path, batch_size=1) as index:
+                # Only the new game is indexed on the second round.
+                assert index.update(archive) == (2 if amount == 2 else 1)
+                assert index.indexed_games == amount
+        
+        with PositionIndex(index_path) as index:
+            assert index.find(Game().position_key()) == [(0, 0), (1, 0), (2, 0)]
+            game = Game()
+            game.apply_moves(["e2e4", "e7e5", "g1f3"])
+            assert index.find(game.position_key()) == [(0, 3), (2, 3)] and index.count(game.position_key()) == 2
+            
+            # Keys of the upper half of the 64-bit range are stored as negative SQLite integers.
+            game = Game()
+            keys = []
+            for ply, uci in enumerate(games[1], 1):
+                game.apply_moves([uci])
+                keys.append(game.position_key())
+                assert dict(index.find(keys[-1]))[1] <= ply
+            assert any(key >= 1 << 63 for key in keys)
+            assert index.find(0) == []
+            with assert_raises(ValueError):
+                index.add_games([(5, [])])
+
+
+@log
+def test_opening_book():
+    def packed(ucis):
+        return [move.from_uci(uci) for uci in ucis.split()]
+    
+    games = [
+        (packed("e2e4 e7e5 g1f3"), "1-0"),
+        (packed("e2e4 c7c5 g1f3"), "0-1"),
+        (packed("e2e4 e7e5 f1c4"), "1/2-1/2"),
+        (packed("d2d4 d7d5"), "1-0"),
+        (packed(benchmark.MIDDLEGAME), "*"),
+    ]
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "book.bin")
+        written = book.build(path, games, plies=3)
+        # Merging many chunks gives the same book.
+        chunked = os.path.join(directory, "chunked.bin")
+        assert book.build(chunked, games, plies=3, chunk_size=1) == written
+        with open(path, "rb") as f, open(chunked, "rb") as g:
+            assert f.read() == g.read()
+        
+        with book.OpeningBook(path) as opening_book:
+            assert len(opening_book) == written
+            start = {move.to_uci(entry.move): entry[1:] for entry in opening_book.entries(Game().position_key())}
+            assert start == {"e2e4": (2 + 0 + 1 + 0, 4), "d2d4": (2, 1)}
+            game = Game()
+            game.apply_moves(["e2e4"])
+            replies = {move.to_uci(entry.move): entry[1:] for entry in opening_book.entries(game.position_key())}
+            assert replies == {"e7e5": (0 + 1 + 0, 3), "c7c5": (2, 1)}
+            game.apply_moves(["e7e5", "g1f3", "b8c6"])
+            assert opening_book.entries(game.position_key()) == [] and opening_book.move(game) is None
+            
+            rng = random.Random(0)
+            chosen = [move.to_uci(opening_book.choose(Game().position_key(), rng)) for _ in range(200)]
+            assert 0 < chosen.count("d2d4") < chosen.count("e2e4")
+            
+            result = Engine(book=opening_book).search(Game(), depth=3)
+            assert move.to_uci(result.move) in ("e2e4", "d2d4") and result.depth == 0
+        
+        # Weights of popular moves don't saturate at 16 bits, so their proportions are kept.
+        key = Game().position_key()
+        with open(path, "wb") as f:
+            f.write(book._HEADER.pack(book.MAGIC, book.VERSION, 0, 2))
+            f.write(book._RECORD.pack(key, move.from_uci("d2d4"), 100000, 60000))
+            f.write(book._RECORD.pack(key, move.from_uci("e2e4"), 300000, 200000))
+        with book.OpeningBook(path) as opening_book:
+            assert [entry[1:] for entry in opening_book.entries(key)] == [(100000, 60000), (300000, 200000)]
+        
+        assert book.build(path, games, plies=3, min_count=2) == 3
+        with open(path, "r+b") as f:
+            f.write(b"XXXX")
+        with assert_raises(ValueError):
+            book.OpeningBook(path)
+
+
+def endgame(pieces, to_move):
+    """A Game with only the pieces on the board, given as a coordinate to piece dict."""
+    data = bytearray(Game()._board.to_bytes())
+    data[:64] = bytes(64)
+    for coord, piece in pieces.items():
+        piece.moved = True
+        data[coord_to_index(coord)] = encode_piece(piece)
+    return Game.from_position(Position(bytes(data), to_move, 0))
+
+
+@log
+def test_tablebase():
+    assert tablebase.material_of("K", "KR") == ("KRK", True)
+    assert tablebase.material_of("KNB", "K") == ("KBNK", False)
+    for name in ("KKQ", "KQRBK", "KXK"):
+        with assert_raises(ValueError):
+            tablebase.generate(name)
+    
+    with tempfile.TemporaryDirectory() as directory:
+        path = tablebase.generate("KQK", directory, processes=1)
+        table = tablebase.Tablebase(path)
+        values = [table.value(i) for i in range(table.layout.size)]
+        table.close()
+        # The longest KQK win is a mate in 10.
+        assert max(value - 1 for value in values if value != tablebase.ILLEGAL and value % 2 == 0) == 19
+        
+        tables = tablebase.Tablebases(directory)
+        assert tables.probe(Game()) is None
+        for strong, weak, to_move in ((Color.WHITE, Color.BLACK, Color.WHITE), (Color.BLACK, Color.WHITE, Color.BLACK)):
+            pieces = {"a8": King(weak), "b6": King(strong), "h7": Queen(strong)}
+            if strong == Color.BLACK:
+                pieces = {coord[0] + str(9 - int(coord[1])): piece for coord, piece in pieces.items()}
+            game = endgame(pieces, to_move)
+            assert tables.probe(game) == tablebase.ProbeResult(1, 1)
+            game.apply_moves((tables.best_move(game),))
+            assert tables.probe(game) == tablebase.ProbeResult(-1, 0) and not game.current_player.legal_moves()
+        
+        stalemate = endgame({"a8": King(Color.BLACK), "b6": King(Color.WHITE), "c7": Queen(Color.WHITE)}, Color.BLACK)
+        assert tables.probe(stalemate) == tablebase.ProbeResult(0, None)
+        hanging = endgame({"a8": King(Color.BLACK), "h1": King(Color.WHITE), "b7": Queen(Color.WHITE)}, Color.BLACK)
+        assert tables.probe(hanging) == tablebase.ProbeResult(0, None)
+        assert move.to_uci(tables.best_move(hanging)) == "a8b7"
+        # No KRK table in the directory.
+        assert tables.probe(endgame({"a8": King(Color.BLACK), "h1": King(Color.WHITE), "b7": Rook(Color.WHITE)}, Color.BLACK)) is None
+        tables.close()
+        
+        # A capture of the Queen wins this KQKR position in 17 plies, though its other moves lose sooner,
+        # so it must never be counted down into a loss.
+        tablebase.generate("KRK", directory, processes=1)
+        tablebase._start_worker("KQKR", directory)
+        try:
+            assert tablebase._initial_state(857543) == (tablebase.DRAW, tablebase._ESCAPE, 0, 17)
+        finally:
+            tablebase._tables.close()
+
+
+@log
+def test_tablebase_kqkr():
+    # Both sides can capture into a won position in KQKR, so some positions are won by a capture
+    # even though their other moves lose. Every value has to follow from the values after each move,
+    # which are in the smaller tables after a capture.
+    with tempfile.TemporaryDirectory() as directory:
+        tablebase.generate("KQKR", directory)
+        tables = tablebase.Tablebases(directory)
+        table = tables.table("KQKR")
+        layout = table.layout
+        kinds = {"K": King, "Q": Queen, "R": Rook}
+        rng = random.Random(0)
+        checked = captures = 0
+        for index in [857543] + [rng.randrange(layout.size) for _ in range(2000)]:
+            if table.value(index) == tablebase.ILLEGAL:
+                continue
+            squares, to_move = layout.decode(index)
+            colors = (Color.WHITE, Color.BLACK)
+            pieces = {COORDS[square]: kinds[kind](colors[side]) for kind, side, square in zip(layout.types, layout.sides, squares)}
+            game = endgame(pieces, colors[to_move])
+            children = []
+            for code in game.current_player.legal_move_codes():
+                child = game.copy()
+                child.apply_moves((code,), validate=False)
+                children.append(tables.probe(child))
+                captures += game._board[move.to_index(code)].piece is not None
+            wins = [result.plies + 1 for result in children if result.wdl < 0]
+            if wins:
+                expected = tablebase.ProbeResult(1, min(wins))
+            elif any(result.wdl == 0 for result in children) or not (children or game.current_player.is_checked()):
+                expected = tablebase.ProbeResult(0, None)
+            else:
+                expected = tablebase.ProbeResult(-1, max([result.plies + 1 for result in children], default=0))
+            assert tables.probe(game) == expected, index
+            checked += 1
+        assert checked > 500 and captures > 100
+        tables.close()
+
+
+@log
+def test_features():
+    game = Game()
+    snapshots = [features.snapshot(game)]
+    game.apply_moves(["e2e4"])
+    snapshots.append(features.snapshot(game))
+    game.apply_moves(["e7e5", "e1e2"])
+    snapshots.append(features.snapshot(game))
+    assert all(len(data) == features.SNAPSHOT_SIZE for data in snapshots)
+    if features.np is None:
+        with assert_raises(ImportError):
+            features.encode(b"".join(snapshots))
+        return
+    np = features.np
+    
+    planes = features.encode(b"".join(snapshots))
+    assert planes.shape == (3, features.PLANES, 8, 8) and planes.dtype == np.uint8
+    start = planes[0]
+    assert start[0, 1].all() and start[6, 6].all() and start[0].sum() == 8 and start[:12].sum() == 32
+    assert start[5, 0, 4] == 1 and start[11, 7, 4] == 1 and start[3, 0, 0] == 1 and start[9, 7, 7] == 1
+    assert start[12].all() and start[13:17].all() and not start[17].any()
+    # After e2e4 black to move can capture en passant on e3.
+    assert not planes[1, 12].any() and planes[1, 17].sum() == 1 and planes[1, 17, 2, 4] == 1
+    # The white King has moved, so white can't castle any more.
+    assert not planes[2, 13:15].any() and planes[2, 15:17].all() and not planes[2, 17].any()
+    
+    out = np.zeros((2, features.PLANES, 8, 8), dtype=np.uint8)
+    assert features.encode(b"".join(snapshots[1:]), out=out) is out and (out == planes[1:]).all()
+    with assert_raises(ValueError):
+        features.encode(b"".join(snapshots), out=out)
+    
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "games.arc")
+        with ArchiveWriter(path) as writer:
+            writer.add([move.from_uci(uci) for uci in benchmark.REPLAY_100.split()])
+            writer.add([move.from_uci(uci) for uci in benchmark.MIDDLEGAME.split()])
+        with Archive(path) as archive:
+            snapshots = list(features.game_snapshots(archive))
+        assert len(snapshots) == 101 + 21
+        with features.ShardWriter(os.path.join(directory, "shards"), shard_size=50, batch_size=16) as shards:
+            for data in snapshots:
+                shards.add(data)
+        assert len(shards.paths) == 3
+        stored = np.concatenate([np.load(path, mmap_mode="r") for path in shards.paths])
+        assert stored.shape[0] == 122 and (stored == features.encode(b"".join(snapshots))).all()
+        
+        # Anything but a single snapshot would misalign the positions of the shard.
+        with features.ShardWriter(os.path.join(directory, "bad"), shard_size=2) as shards:
+            for data in (b"", snapshots[0] * 2, snapshots[0][:-1]):
+                with assert_raises(ValueError):
+                    shards.add(data)
+            shards.add(snapshots[0])
+        assert len(shards.paths) == 1 and np.load(shards.paths[0]).shape[0] == 1
+
+
+@log
+def test_nnue():
+    if nnue.np is None:
+        with assert_raises(ImportError):
+            nnue.Network.load("weights.npz")
+        return
+    np = nnue.np
+    
+    rng = np.random.default_rng(0)
+    network = nnue.Network(rng.integers(-200, 200, (nnue.FEATURES, 32)), rng.integers(-50, 50, 32),
+                           rng.integers(-40, 40, 64), 25, 8)
+    moves = ["e2e4", "d7d5", "e4d5", "c7c5", "d5c6", "g8f6", "c6b7", "e7e6", "b7a8", "f8e7", "g1f3", "e8g8"]
+    game = Game()
+    scores = [network.evaluate(game)]
+    snapshots = [features.snapshot(game)]
+    accumulator = game._board._accumulator
+    for uci in moves:
+        player = game.current_player
+        player.move(uci[:2], uci[2:4])
+        if player.promotion:
+            player.promote("queen")
+        game.next_player()
+        # Generating the legal moves makes and takes back every move, which mustn't change the feature layers.
+        player.legal_move_codes()
+        assert game._board._accumulator is accumulator
+        assert (accumulator.values == nnue.Accumulator(network, game._board).values).all()
+        scores.append(network.evaluate(game))
+        snapshots.append(features.snapshot(game))
+    
+    copy = game.copy()
+    copy.apply_moves(["f1e2"])
+    assert copy._board._accumulator is not accumulator and not accumulator.changed
+    assert (copy._board._accumulator.values == nnue.Accumulator(network, copy._board).values).all()
+    assert network.evaluate(game) == scores[-1]
+    
+    planes = features.encode(b"".join(snapshots))
+    assert network.evaluate_batch(planes).tolist() == scores
+    
+    # A search computes the feature layers from scratch only for its root, and doesn't attach to the Game.
+    def from_scratch(game):
+        game._board._accumulator = None
+        return network.evaluate(game)
+    attached = []
+    attach = network.attach
+    network.attach = lambda board: attached.append(board) or attach(board)
+    root = Game()
+    root.apply_moves(["e2e4", "e7e5"])
+    result = Engine(evaluate=network.evaluate).search(root, depth=3)
+    assert len(attached) == 1 and root._board._accumulator is None
+    expected = Engine(evaluate=from_scratch).search(root, depth=3)
+    assert (result.move, result.score, result.nodes) == (expected.move, expected.score, expected.nodes)
+    del network.attach
+    
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "weights.npz")
+        network.save(path)
+        loaded = nnue.Network.load(path)
+        assert loaded.evaluate(Game()) == scores[0] and loaded.evaluate(game) == scores[-1]
+        np.savez(path, feature_weights=network.feature_weights)
+        with assert_raises(ValueError):
+            nnue.Network.load(path)
+    with assert_raises(ValueError):
+        nnue.Network(network.feature_weights[:100], network.feature_bias, network.output_weights, 0, 1)
+    with assert_raises(ValueError):
+        nnue.Network(network.feature_weights * 0.5, network.feature_bias, network.output_weights, 0, 1)
+
+
+@log
+def test_game_bytes_snapshot():
+    game = Game(TimeControl(300, 2))
+    game.current_player.move("e2", "e4")
+    game.current_player.move("e4", "e5")
+    game.next_player().move("d7", "d5")
+    game.next_player().move("e5", "d6")
+    
+    restored = Game.from_bytes(game.to_bytes())
+    assert str(restored) == str(game)
+    assert restored.position_key() == game.position_key()
+    assert restored.white.taken_pieces == [Pawn(Color.BLACK)]
+    assert restored.white.value_diff() == 1
+    assert restored.white.time_control.increment == 2
+    assert restored._board["d6"].piece.moved
+    
+    game.next_player()
+    restored = Game.from_bytes(game.to_bytes())
+    assert restored.current_player.color == Color.BLACK
+    
+    with assert_raises(ValueError):
+        Game.from_bytes(b"garbage")
+    
+    data = game.to_bytes()
+    # Black hasn't taken anything, so its count of taken pieces is the last byte.
+    truncated = data[:-1] + b"\x02"
+    # White's only taken piece follows white's header.
+    invalid_code = bytearray(data)
+    invalid_code[Game._HEADER.size + Game._PLAYER.size] = 7
+    for bad in (truncated, bytes(invalid_code), data + b"\x00"):
+        with assert_raises(ValueError):
+            Game.from_bytes(bad)
+
+
+def allowed_moves_of_all_pieces(player):
+    rv = set()
+    for coord in COORDS:
+        try:
+            rv.update((coord, move.square.coord, move.castle, move.enpassant) for move in player.allowed_moves(coord))
+        except InvalidMoveError:
+            pass
+    return rv
+
+
+@log
+def test_legal_moves():
+    game = Game()
+    
+    player = game.current_player
+    assert len(player.legal_moves()) == 20
+    
+    # Pinned Bishop, castling, and en passant.
+    player.move("e2", "e4")
+    player.move("e4", "e5")
+    player.move("g1", "f3")
+    player.move("f1", "c4")
+    player.move("d2", "d3")
+    player.move("c1", "d2")
+    player = game.next_player()
+    player.move("d7", "d5")
+    player.move("c7", "c6")
+    player.move("d8", "a5")
+    player = game.next_player()
+    legal = {(fr, move.square.coord, move.castle, move.enpassant) for fr, move in player.legal_moves()}
+    assert legal == allowed_moves_of_all_pieces(player)
+    assert ("e1", "g1", True, False) in legal
+    assert ("e5", "d6", False, True) in legal
+    assert {to for fr, to, _, _ in legal if fr == "d2"} == {"c3", "b4", "a5"}
+    
+    # In check.
+    player.move("h2", "h3")
+    player = game.next_player()
+    player.move("a5", "d2")
+    player = game.next_player()
+    assert player.is_checked()
+    legal = {(fr, move.square.coord, move.castle, move.enpassant) for fr, move in player.legal_moves()}
+    assert legal == allowed_moves_of_all_pieces(player)
+    assert not any(castle for _, _, castle, _ in legal)
+
+
+@log
+def test_packed_moves():
+    game = Game()
+    
+    player = game.current_player
+    codes = player.legal_move_codes()
+    assert codes.typecode == "H" and len(codes) == 20
+    assert sorted(move.to_uci(code) for code in codes)[:3] == ["a2a3", "a2a4", "b1a3"]
+    
+    code = player.legal_move_code("e2e4")
+    assert move.from_index(code) == game._board["e2"].index
+    assert move.to_index(code) == game._board["e4"].index
+    assert move.flag_of(code) == move.PAWN_DOUBLE_MOVE
+    assert move.to_uci(code) == "e2e4"
+    unpacked = move.Move.from_int(code, game._board)
+    assert unpacked.square is game._board["e4"] and unpacked.pawn_double_move
+    assert unpacked.to_int(game._board["e2"]) == code
+    
+    with assert_raises(InvalidMoveError):
+        player.legal_move_code("e2e5")
+    with assert_raises(InvalidMoveError):
+        player.legal_move_code("nonsense")
+    
+    # Promotions are expanded to each piece.
+    game._board["a7"].piece = None
+    game._board["a8"].piece = None
+    game._board["a7"].piece = Pawn(Color.WHITE)
+    game._board["a7"].piece.moved = True
+    promotions = [code for code in player.legal_move_codes() if move.from_index(code) == game._board["a7"].index]
+    assert sorted(move.to_uci(code) for code in promotions) == ["a7a8b", "a7a8n", "a7a8q", "a7a8r", "a7b8b", "a7b8n", "a7b8q", "a7b8r"]
+    assert move.promotion_of(player.legal_move_code("a7a8q")) == "queen"
+    with assert_raises(InvalidMoveError):
+        player.legal_move_code("a7a8")
+
+
+@log
+def test_server_protocol():
+    async def scenario():
+        chess_server = ChessServer(max_workers=1)
+        
+        async def send(**request):
+            return await chess_server.handle_line(json.dumps(request).encode())
+        
+        created = await send(op="new", id="a")
+        assert created["ok"] and created["id"] == "a" and created["to_move"] == "white"
+        game_id = created["game"]
+        
+        moved = await send(op="move", game=game_id, move="e2e4")
+        assert moved["ok"] and moved["to_move"] == "black" and moved["last_move"] == "e2e4"
+        assert moved["board"][4] == "....\u2659..."
+        
+        assert (await send(op="move", game=game_id, move="e7e3")) == {"ok": False, "error": "invalid move"}
+        assert (await send(op="move", game=game_id, move="e7e5q")) == {"ok": False, "error": "invalid move"}
+        assert (await send(op="state", game=game_id))["ply"] == 1
+        assert (await send(op="move", game=game_id + 1, move="e7e5"))["error"] == "unknown game"
+        assert (await send(op="fly"))["error"] == "unknown op: 'fly'"
+        moves = (await send(op="moves", game=game_id))["moves"]
+        assert len(moves) == 20
+        hint = await send(op="hint", game=game_id, depth=1)
+        assert hint["ok"] and hint["move"] in moves and hint["depth"] == 1
+        assert (await send(op="hint", game=game_id, depth=99))["ok"] is False
+        
+        assert (await send(op="close", game=game_id))["ok"]
+        assert not chess_server.sessions
+    
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(scenario())
+    finally:
+        loop.close()
+
+
+@log
+def test_clock_manager():
+    timed_out = []
+    clocks = ClockManager()
+    
+    game = Game(TimeControl(0.05, increment=10))
+    game.current_player.move("e2", "e4")
+    player = game.next_player()
+    clocks.watch(player, timed_out.append)
+    assert clocks.next_deadline() == player.flag_deadline()
+    
+    # Stopping and restarting the clock makes the queued deadline stale.
+    other = Game(TimeControl(0.05, delay=0.01))
+    other.current_player.move("e2", "e4")
+    stopped = other.next_player()
+    clocks.watch(stopped, timed_out.append)
+    stopped.move("e7", "e5")
+    other.next_player()
+    
+    assert clocks.poll() == [] and timed_out == []
+    time.sleep(0.07)
+    assert clocks.poll() == [player] and timed_out == [player]
+    assert player.read_clock() == 0
+    assert clocks.next_deadline() is None
+    
+    with assert_raises(InvalidMoveError):
+        player.move("e7", "e5")
+    
+    # A failing callback is reported, and doesn't stop the flag-fall detection of the other clocks.
+    def failing(player):
+        raise RuntimeError("callback failed")
+    
+    async def scenario():
+        task = asyncio.ensure_future(clocks.run())
+        for delay, callback in ((0.01, failing), (0.02, timed_out.append)):
+            game = Game(TimeControl(delay))
+            game.current_player.move("e2", "e4")
+            clocks.watch(game.next_player(), callback)
+        await asyncio.sleep(0.1)
+        task.cancel()
+        return game.current_player
+    
+    timed_out.clear()
+    errors = []
+    loop = asyncio.new_event_loop()
+    loop.set_exception_handler(lambda loop, context: errors.append(context["exception"]))
+    try:
+        last = loop.run_until_complete(scenario())
+    finally:
+        loop.close()
+    assert timed_out == [last] and [str(e) for e in errors] == ["callback failed"]
+    
+    # Stopping a clock never leaves it running without a timer, which `flag_deadline` could trip over.
+    last.start_clock()
+    last.stop_clock()
+    assert last.flag_deadline() is None and not last._running
+
+
+@log
+def test_engine_finds_mate():
+    game = Game()
+    
+    player = game.current_player
+    player.move("e2", "e4")
+    player = game.next_player()
+    player.move("e7", "e5")
+    player = game.next_player()
+    player.move("d1", "h5")
+    player = game.next_player()
+    player.move("b8", "c6")
+    player = game.next_player()
+    player.move("f1", "c4")
+    player = game.next_player()
+    player.move("g8", "f6")
+    player = game.next_player()
+    
+    before = str(game)
+    result = Engine().search(game, depth=2)
+    assert move.to_uci(result.move) == "h5f7"
+    assert result.score > 0 and result.depth == 2
+    assert str(game) == before
+    
+    Engine().play(game, depth=2)
+    player = game.next_player()
+    assert player.is_checked() and not player.legal_moves()
+
+
+@log
+def test_time_manager():
+    game = Game(TimeControl(10, increment=1, delay=0.5))
+    player = game.current_player
+    
+    time_manager = TimeManager()
+    soft, hard = time_manager.budget(player)
+    assert 0.5 < soft <= hard < 10
+    
+    # Less material left means fewer moves left to budget for.
+    game._board["d1"].piece = None
+    player._material -= 9
+    assert time_manager.budget(player)[0] > soft
+    
+    # Without a time control a fixed time per move is used.
+    game = Game()
+    assert TimeManager(move_time=0.2).budget(game.current_player) == (0.2, 0.2)
+    start = time.monotonic()
+    result = Engine().search(game, TimeManager(move_time=0.2))
+    assert result.move is not None
+    assert time.monotonic() - start < 0.5
+    
+    # The clock is read at every node, so even a tiny budget isn't overrun by much.
+    start = time.monotonic()
+    Engine().search(game, TimeManager(move_time=0.01))
+    assert time.monotonic() - start < 0.1
+    
+    # The searched copies don't run the clocks, so the Game's clocks stay untouched.
+    game = Game(TimeControl(60, increment=5))
+    Engine().search(game, depth=2)
+    assert game.white.read_clock() == 60 and game.black.read_clock() == 60
+    
+    with assert_raises(ValueError):
+        Engine().search(game)
+
+
+@log
+def test_tournament_statistics():
+    assert tournament.elo(0.5) == 0
+    assert round(tournament.elo(0.75)) == 191
+    assert round(tournament.expected_score(tournament.elo(0.6)), 6) == 0.6
+    
+    stats = tournament.Stats()
+    for score in [1, 1, 0.5, 0, 1, 0.5, 1, 1] * 50:
+        stats.add(score)
+    assert (stats.wins, stats.draws, stats.losses) == (250, 100, 50)
+    elo, margin = stats.elo()
+    assert 150 < elo < 250 and 0 < margin < 50
+    assert tournament.sprt_verdict(stats, 0, 20, 0.05, 0.05) == "H1"
+    assert tournament.sprt_verdict(stats, 300, 320, 0.05, 0.05) == "H0"
+    
+    stats = tournament.Stats()
+    assert stats.score() == 0.5 and stats.variance() == 0 and stats.elo() == (0, float("inf"))
+    assert tournament.sprt_verdict(stats, 0, 20, 0.05, 0.05) is None
+    stats.add(1)
+    stats.add(0)
+    assert tournament.sprt_verdict(stats, 0, 20, 0.05, 0.05) is None
+    
+    config = tournament.EngineConfig.parse("depth=1,hard_factor=2")
+    assert config.depth == 1 and config.hard_factor == 2
+    with assert_raises(ValueError):
+        tournament.EngineConfig.parse("speed=11")
+    
+    config = tournament.EngineConfig(depth=2)
+    spec = next(tournament.schedule(1, [["f2f3", "e7e5", "g2g4"]], config, config, (60, 0, 0), max_plies=10))
+    index, score, reason = tournament.play_game(spec)
+    assert index == 0 and score == 0 and reason == "checkmate"
+
+
+@log
+def test_instrumentation():
+    original = Player.move
+    instrumentation.reset()
+    LEGAL_MOVES.clear()
+    
+    with instrumentation.enabled():
+        assert instrumentation.is_enabled()
+        game = Game()
+        game.current_player.move("e2", "e4")
+        list(game.current_player.allowed_moves("d1"))
+        stats = instrumentation.snapshot()
+    
+    assert not instrumentation.is_enabled()
+    assert Player.move is original
+    assert stats["Player.move"]["calls"] == 1
+    assert stats["Player._legal_move"]["calls"] == 1
+    assert stats["Player.allowed_moves"]["calls"] == 1
+    assert stats["Player.is_checked"]["calls"] >= 1
+    assert stats["Player.move"]["seconds"] >= stats["Player._legal_move"]["seconds"] > 0
+    assert stats["Player._opens_check"]["calls"] == 1 + 4
+    assert "Player.move" in instrumentation.report()
+    
+    # Nothing is counted when disabled.
+    Game().current_player.move("e2", "e4")
+    assert instrumentation.snapshot() == stats
+    instrumentation.reset()
+    assert instrumentation.snapshot()["Player.move"] == {"calls": 0, "seconds": 0.0}
+
+
+@log
+def test_benchmark_compare():
+    game = benchmark.replay(benchmark.REPLAY_100)
+    assert len(game.current_player.taken_pieces) + len(game.current_player.opponent.taken_pieces) == 12
+    
+    def result(median, stdev):
+        return {"results": {"scenario": {"median": median, "stdev": stdev}}}
+    
+    _, regressed = benchmark.compare(result(1.0, 0.01), result(1.04, 0.01), threshold=0.05)
+    assert not regressed
+    _, regressed = benchmark.compare(result(1.0, 0.01), result(1.2, 0.01), threshold=0.05)
+    assert regressed
+    # The same slowdown is within the noise of a noisy measurement.
+    lines, regressed = benchmark.compare(result(1.0, 0.1), result(1.2, 0.1), threshold=0.05)
+    assert not regressed and "same" in lines[1]
+    lines, regressed = benchmark.compare({"results": {}}, result(1.0, 0.0))
+    assert not regressed and "new" in lines[1]
+
+
 @log
 def test_pawn_promotion():
     game = Game()
@@ -253,8 +1405,10 @@ def test_pawn_promotion():
     with assert_raises(InvalidMoveError):
         player = game.next_player()
     
+    value_diff = player.value_diff()
     player.promote("queen")    
     assert not player.promotion
+    assert player.value_diff() == value_diff + 8
     assert isinstance(game._board["a8"].piece, Queen)
     
 
@@ -366,8 +1520,38 @@ test_knight_allowed_moves()
 test_king_allowed_moves()
 test_correct_enpassant()
 test_invalid_enpassant()
+test_en_passant_target()
+test_position_key()
+test_game_copy()
+test_new_game_from_template()
+test_index_lookup()
+test_position_snapshot()
+test_legal_move_cache()
+test_apply_moves()
+test_game_record()
+test_journal()
+test_pgn()
+test_archive()
+test_position_index()
+test_opening_book()
+test_tablebase()
+test_features()
+test_nnue()
+test_game_bytes_snapshot()
+test_legal_moves()
+test_packed_moves()
+test_server_protocol()
+test_clock_manager()
+test_engine_finds_mate()
+test_time_manager()
+test_tournament_statistics()
+test_instrumentation()
+test_benchmark_compare()
 test_pawn_promotion()
 test_castling()
 test_king_check()
+if "--slow" in sys.argv:
+    # Generating the KQKR table takes minutes.
+    test_tablebase_kqkr()
 
 print("All tests passed.")
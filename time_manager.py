@@ -0,0 +1,69 @@
+"""Thinking time budgeting for computer players."""
+
+import time
+from typing import Optional, Tuple
+
+from player import Player
+
+
+class TimeManager:
+    """Turns a Player's clock into soft and hard deadlines for one move.
+
+    The soft deadline is when the search shouldn't start a new iteration anymore,
+    the hard deadline is when a running search has to stop.
+    """
+
+    # Moves expected to remain when the board is empty, and how many more one point of material adds.
+    _MIN_MOVES_LEFT: int = 10
+    _MOVES_PER_MATERIAL: float = 0.5
+
+    def __init__(self, move_time: Optional[float] = None, safety_margin: float = 0.05,
+                 hard_factor: float = 3.0, max_fraction: float = 0.3) -> None:
+        """
+        move_time: Fixed time per move, which is used when the Player has no time control.
+        safety_margin: Seconds of the clock never used, to cover move and process scheduling overhead.
+        hard_factor: How many times the soft budget the hard budget can be in difficult positions.
+        max_fraction: The largest fraction of the remaining clock that one move can use.
+        """
+        self.move_time: Optional[float] = move_time
+        self.safety_margin: float = safety_margin
+        self.hard_factor: float = hard_factor
+        self.max_fraction: float = max_fraction
+
+        self.soft_deadline: Optional[float] = None
+        self.hard_deadline: Optional[float] = None
+        self.started: float = 0
+
+    def budget(self, player: Player) -> Tuple[float, float]:
+        """Return the soft and hard time budgets in seconds for the Player's next move."""
+        time_control = player.time_control
+        if not time_control:
+            if self.move_time is None:
+                return float("inf"), float("inf")
+            return self.move_time, self.move_time
+
+        # Time used during the delay doesn't come off the clock, so it's always free to use.
+        usable = max(0.0, player.read_clock() - self.safety_margin)
+        moves_left = self._MIN_MOVES_LEFT + (player.material + player.opponent.material) * self._MOVES_PER_MATERIAL
+
+        hard = usable * self.max_fraction + time_control.delay
+        soft = usable / moves_left + time_control.increment * 0.75 + time_control.delay
+        soft = min(soft, hard)
+        hard = min(hard, soft * self.hard_factor)
+        return soft, hard
+
+    def start(self, player: Player) -> None:
+        """Start timing a new move of the Player."""
+        soft, hard = self.budget(player)
+        self.started = time.monotonic()
+        self.soft_deadline = self.started + soft
+        self.hard_deadline = self.started + hard
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    def can_start_iteration(self) -> bool:
+        return time.monotonic() < self.soft_deadline
+
+    def out_of_time(self) -> bool:
+        return time.monotonic() >= self.hard_deadline
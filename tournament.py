@@ -0,0 +1,340 @@
+"""Self-play tournament runner for comparing two engine setups.
+
+Plays games between engine setups A and B from a set of opening positions, each opening with both colors,
+in parallel processes. Games are played on `TimeControl` clocks and adjudicated here: mate, stalemate,
+threefold repetition, the 50-move rule, insufficient material, and a ply limit.
+Reports the Elo difference of A over B, a sequential probability ratio test (SPRT) verdict and the throughput.
+
+Setups are given as comma separated `key=value` pairs of `EngineConfig` arguments, e.g.
+`python tournament.py --a depth=3 --b depth=2 --games 200 --time 20 --increment 0.2`.
+The evaluation function can be any importable function, e.g. `--a evaluate=my_eval:evaluate`.
+"""
+
+import argparse
+import importlib
+import math
+import multiprocessing
+import time
+from collections import Counter
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from color import Color
+from engine import Engine
+from game import Game
+from move import promotion_of, to_index
+from pawn import Pawn
+from time_control import TimeControl
+from time_manager import TimeManager
+from utils import InvalidMoveError
+
+DEFAULT_OPENINGS: Tuple[str, ...] = (
+    "e2e4 e7e5",
+    "e2e4 c7c5",
+    "e2e4 e7e6",
+    "e2e4 c7c6",
+    "d2d4 d7d5",
+    "d2d4 g8f6 c2c4 e7e6",
+    "c2c4 e7e5",
+    "g1f3 d7d5",
+)
+
+
+class EngineConfig:
+    # Could be Python 3.7 @dataclass
+
+    def __init__(self, depth: Optional[int] = None, move_time: Optional[float] = None,
+                 safety_margin: float = 0.05, hard_factor: float = 3.0, max_fraction: float = 0.3,
+                 evaluate: str = "engine:evaluate") -> None:
+        self.depth: Optional[int] = depth
+        self.move_time: Optional[float] = move_time
+        self.safety_margin: float = safety_margin
+        self.hard_factor: float = hard_factor
+        self.max_fraction: float = max_fraction
+        self.evaluate: str = evaluate  # "module:function"
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({', '.join(f'{k}={v!r}' for k, v in vars(self).items())})"
+
+    @classmethod
+    def parse(cls, text: str) -> 'EngineConfig':
+        """Parse e.g. "depth=3,hard_factor=2" into a config."""
+        types = {"depth": int, "move_time": float, "safety_margin": float,
+                 "hard_factor": float, "max_fraction": float, "evaluate": str}
+        kwargs: Dict[str, Any] = {}
+        for item in filter(None, text.split(",")):
+            key, _, value = item.partition("=")
+            key = key.strip()
+            if key not in types:
+                raise ValueError(f"Unknown engine option: '{key}'")
+            kwargs[key] = types[key](value.strip())
+        return cls(**kwargs)
+
+    def engine(self) -> Engine:
+        module, _, function = self.evaluate.partition(":")
+        return Engine(evaluate=getattr(importlib.import_module(module), function))
+
+    def time_manager(self) -> TimeManager:
+        return TimeManager(self.move_time, self.safety_margin, self.hard_factor, self.max_fraction)
+
+
+class GameSpec:
+    # Could be Python 3.7 @dataclass
+
+    def __init__(self, index: int, opening: Sequence[str], a_is_white: bool, a: EngineConfig, b: EngineConfig,
+                 time_control: Tuple[float, float, float], max_plies: int) -> None:
+        self.index: int = index
+        self.opening: Sequence[str] = opening
+        self.a_is_white: bool = a_is_white
+        self.a: EngineConfig = a
+        self.b: EngineConfig = b
+        self.time_control: Tuple[float, float, float] = time_control
+        self.max_plies: int = max_plies
+
+
+def play_game(spec: GameSpec) -> Tuple[int, float, str]:
+    """Play one game and return its index, the score of setup A, and why the game ended."""
+    game = Game(TimeControl(*spec.time_control))
+    white, black = (spec.a, spec.b) if spec.a_is_white else (spec.b, spec.a)
+    setups = {Color.WHITE: (white, white.engine()), Color.BLACK: (black, black.engine())}
+
+    game.apply_moves(spec.opening)
+
+    seen: Counter = Counter()
+    quiet_plies = 0
+    plies = len(spec.opening)
+    while True:
+        player = game.current_player
+        seen[game.position_key()] += 1
+        if not player.legal_moves():
+            if player.is_checked():
+                winner, reason = player.opponent.color, "checkmate"
+            else:
+                winner, reason = None, "stalemate"
+            break
+        if seen[game.position_key()] >= 3:
+            winner, reason = None, "repetition"
+            break
+        if quiet_plies >= 100:
+            winner, reason = None, "50-move rule"
+            break
+        if _insufficient_material(game):
+            winner, reason = None, "insufficient material"
+            break
+        if plies >= spec.max_plies:
+            winner, reason = None, "ply limit"
+            break
+
+        config, engine = setups[player.color]
+        opponent_material = player.opponent.material
+        try:
+            result = engine.play(game, config.time_manager(), config.depth)
+        except InvalidMoveError:
+            # The clock ran out before the move could be made.
+            winner, reason = player.opponent.color, "time"
+            break
+
+        moved = game._board[to_index(result.move)].piece
+        if isinstance(moved, Pawn) or promotion_of(result.move) or player.opponent.material != opponent_material:
+            quiet_plies = 0
+        else:
+            quiet_plies += 1
+        game.next_player()
+        plies += 1
+
+    if winner is None:
+        score = 0.5
+    else:
+        score = 1.0 if (winner == Color.WHITE) == spec.a_is_white else 0.0
+    return spec.index, score, reason
+
+
+def _insufficient_material(game: Game) -> bool:
+    # Only kings, and at most one minor piece on the board.
+    if game.white.material + game.black.material > 3:
+        return False
+    return not any(isinstance(square.piece, Pawn) for square in game.iter_squares())
+
+
+def elo(score: float) -> float:
+    """Return the Elo difference matching the expected score."""
+    if score <= 0:
+        return -math.inf
+    if score >= 1:
+        return math.inf
+    return -400 * math.log10(1 / score - 1)
+
+
+def expected_score(elo_diff: float) -> float:
+    return 1 / (1 + 10 ** (-elo_diff / 400))
+
+
+class Stats:
+    """Win, draw and loss counts of setup A, and the statistics over them."""
+
+    def __init__(self) -> None:
+        self.wins: int = 0
+        self.draws: int = 0
+        self.losses: int = 0
+
+    def add(self, score: float) -> None:
+        if score == 1:
+            self.wins += 1
+        elif score == 0:
+            self.losses += 1
+        else:
+            self.draws += 1
+
+    @property
+    def games(self) -> int:
+        return self.wins + self.draws + self.losses
+
+    def score(self) -> float:
+        """The average score of A, 0.5 before any game has finished."""
+        if not self.games:
+            return 0.5
+        return (self.wins + 0.5 * self.draws) / self.games
+
+    def variance(self) -> float:
+        """Variance of the score of one game."""
+        if not self.games:
+            return 0.0
+        s = self.score()
+        return (self.wins * (1 - s) ** 2 + self.draws * (0.5 - s) ** 2 + self.losses * s ** 2) / self.games
+
+    def elo(self) -> Tuple[float, float]:
+        """Return the Elo difference and its 95% confidence margin, an infinite one before any game has finished."""
+        if not self.games:
+            return 0.0, math.inf
+        score = self.score()
+        margin = 1.96 * math.sqrt(self.variance() / self.games)
+        low, high = elo(max(score - margin, 1e-9)), elo(min(score + margin, 1 - 1e-9))
+        return elo(score), (high - low) / 2
+
+    def llr(self, elo0: float, elo1: float) -> float:
+        """Return the log-likelihood ratio of H1 (A is elo1 stronger) over H0 (A is elo0 stronger).
+
+        Uses the normal approximation of the trinomial game outcome model.
+        """
+        if not self.games:
+            return 0.0
+        variance = self.variance()
+        if variance == 0:
+            return 0.0
+        s0, s1 = expected_score(elo0), expected_score(elo1)
+        return self.games * (s1 - s0) * (2 * self.score() - s0 - s1) / (2 * variance)
+
+
+def sprt_bounds(alpha: float, beta: float) -> Tuple[float, float]:
+    return math.log(beta / (1 - alpha)), math.log((1 - beta) / alpha)
+
+
+def sprt_verdict(stats: Stats, elo0: float, elo1: float, alpha: float, beta: float) -> Optional[str]:
+    """Return "H1" if A is shown to be elo1 stronger, "H0" if it's shown to be at most elo0 stronger, else None."""
+    lower, upper = sprt_bounds(alpha, beta)
+    llr = stats.llr(elo0, elo1)
+    if llr >= upper:
+        return "H1"
+    if llr <= lower:
+        return "H0"
+    return None
+
+
+def schedule(games: int, openings: Sequence[Sequence[str]], a: EngineConfig, b: EngineConfig,
+             time_control: Tuple[float, float, float], max_plies: int) -> Iterator[GameSpec]:
+    """Play every opening twice in a row, so that both setups get both colors."""
+    for i in range(games):
+        yield GameSpec(i, openings[(i // 2) % len(openings)], i % 2 == 0, a, b, time_control, max_plies)
+
+
+def run(specs: List[GameSpec], processes: int, sprt: Optional[Tuple[float, float, float, float]] = None,
+        report_every: int = 10) -> Dict[str, Any]:
+    stats = Stats()
+    reasons: Counter = Counter()
+    verdict = None
+    start = time.monotonic()
+
+    pool = multiprocessing.Pool(processes)
+    try:
+        for _, score, reason in pool.imap_unordered(play_game, specs):
+            stats.add(score)
+            reasons[reason] += 1
+            if report_every and stats.games % report_every == 0:
+                print(_summary(stats, time.monotonic() - start, sprt))
+            if sprt:
+                verdict = sprt_verdict(stats, *sprt)
+                if verdict:
+                    break
+    finally:
+        pool.terminate()
+        pool.join()
+
+    elapsed = time.monotonic() - start
+    elo_diff, margin = stats.elo()
+    return {
+        "games": stats.games,
+        "wins": stats.wins,
+        "draws": stats.draws,
+        "losses": stats.losses,
+        "elo": elo_diff,
+        "elo_margin": margin,
+        "llr": stats.llr(*sprt[:2]) if sprt else None,
+        "verdict": verdict,
+        "reasons": dict(reasons),
+        "seconds": elapsed,
+        "games_per_hour": stats.games / elapsed * 3600,
+        "summary": _summary(stats, elapsed, sprt),
+    }
+
+
+def _summary(stats: Stats, elapsed: float, sprt: Optional[Tuple[float, float, float, float]]) -> str:
+    elo_diff, margin = stats.elo()
+    rv = (f"Games {stats.games}: +{stats.wins} ={stats.draws} -{stats.losses}, "
+          f"score {stats.score():.3f}, Elo {elo_diff:+.1f} +/- {margin:.1f}, "
+          f"{stats.games / elapsed * 3600:.0f} games/hour")
+    if sprt:
+        lower, upper = sprt_bounds(*sprt[2:])
+        rv += f", LLR {stats.llr(*sprt[:2]):.2f} ({lower:.2f}, {upper:.2f})"
+    return rv
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Self-play tournament between two engine setups.")
+    parser.add_argument("--a", default="", help="setup A, e.g. depth=3")
+    parser.add_argument("--b", default="", help="setup B, e.g. depth=2")
+    parser.add_argument("--games", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=multiprocessing.cpu_count())
+    parser.add_argument("--time", type=float, default=10, help="seconds per game per side")
+    parser.add_argument("--increment", type=float, default=0.1)
+    parser.add_argument("--delay", type=float, default=0)
+    parser.add_argument("--max-plies", type=int, default=300)
+    parser.add_argument("--openings", help="file with one opening per line as space separated moves like e2e4")
+    parser.add_argument("--elo0", type=float, default=0)
+    parser.add_argument("--elo1", type=float, default=20)
+    parser.add_argument("--alpha", type=float, default=0.05)
+    parser.add_argument("--beta", type=float, default=0.05)
+    parser.add_argument("--no-sprt", action="store_true", help="always play all the games")
+    args = parser.parse_args()
+
+    if args.openings:
+        with open(args.openings) as f:
+            openings = [line.split() for line in f if line.strip()]
+    else:
+        openings = [opening.split() for opening in DEFAULT_OPENINGS]
+
+    a, b = EngineConfig.parse(args.a), EngineConfig.parse(args.b)
+    sprt = None if args.no_sprt else (args.elo0, args.elo1, args.alpha, args.beta)
+    specs = list(schedule(args.games, openings, a, b, (args.time, args.increment, args.delay), args.max_plies))
+
+    print(f"A: {a}\nB: {b}")
+    result = run(specs, args.concurrency, sprt)
+    print(result["summary"])
+    print(f"Endings: {result['reasons']}")
+    if sprt:
+        verdict = {"H1": f"A is stronger by at least {args.elo1} Elo",
+                   "H0": f"A is not stronger by more than {args.elo0} Elo",
+                   None: "inconclusive"}[result["verdict"]]
+        print(f"SPRT: {verdict}")
+
+
+if __name__ == "__main__":
+    main()
@@ -16,3 +16,12 @@ def idx_to_coord(x: int, y: int) -> str:
     file = chr(x + 97)
     rank = str(y + 1)
     return file + rank
+
+
+def coord_to_index(coord: str) -> int:
+    """Return the 0-63 index of the coordinate, counting from a1 to h1 and then rank by rank up to h8."""
+    x, y = coord_to_idx(coord)
+    return x + 8 * y
+
+
+COORDS: Tuple[str, ...] = tuple(idx_to_coord(i % 8, i // 8) for i in range(64))
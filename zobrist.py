@@ -0,0 +1,28 @@
+"""Zobrist hashing keys, used to identify chess positions with a single 64-bit integer.
+
+The keys come from a fixed seed, so position keys stay the same across processes and runs,
+and can thus be stored on disk.
+"""
+
+import random
+from typing import Dict, Tuple
+
+from color import Color
+
+_rng = random.Random(0x70C4E55)
+
+PIECE_NAMES: Tuple[str, ...] = ("Pawn", "Knight", "Bishop", "Rook", "Queen", "King")
+
+# Indexed as PIECE_SQUARE[piece_name, color][square_index].
+PIECE_SQUARE: Dict[Tuple[str, Color], Tuple[int, ...]] = {
+    (name, color): tuple(_rng.getrandbits(64) for _ in range(64))
+    for name in PIECE_NAMES
+    for color in Color
+}
+
+# White east, white west, black east, black west.
+CASTLING: Tuple[int, ...] = tuple(_rng.getrandbits(64) for _ in range(4))
+
+EN_PASSANT: Tuple[int, ...] = tuple(_rng.getrandbits(64) for _ in range(64))
+
+BLACK_TO_MOVE: int = _rng.getrandbits(64)